@@ -0,0 +1,157 @@
+import logging
+from collections import Counter
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Iterator
+from sqlalchemy import insert, tuple_
+from app import db
+from models import AlarmEvent, AlarmStatsMinute
+import data_versions
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Columns identifying an alarm occurrence, backed by a unique index
+DEDUP_KEY = ('alarm_id', 'event_time')
+
+def chunked(items: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Split a (possibly streaming) sequence of alarms into lists of at most `size` items."""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def get_upsert_insert():
+    """
+    Return the insert() construct supporting ON CONFLICT for the current database.
+
+    Returns:
+        The PostgreSQL or SQLite insert function, or None on other databases
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        dialect_insert = None
+    return dialect_insert
+
+def _to_row(alarm: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a normalised EDS alarm to an alarm_event row."""
+    return {
+        'alarm_id': alarm['id'],
+        'description': alarm['description'],
+        'source': alarm['source'],
+        'event_time': alarm['timestamp'],
+        'severity': alarm['severity'],
+        'status': alarm['status'],
+        'raw_data': alarm,
+    }
+
+def _insert_ignoring_duplicates(rows: List[Dict[str, Any]]) -> List[Any]:
+    """
+    Insert rows in one batched statement, skipping rows whose key already exists.
+
+    Uses INSERT ... ON CONFLICT DO NOTHING RETURNING on PostgreSQL and SQLite,
+    and a key lookup followed by a plain bulk insert on other databases.
+
+    Returns:
+        (id, alarm_id, event_time) of the rows that were actually inserted
+    """
+    table = AlarmEvent.__table__
+    dialect_insert = get_upsert_insert()
+
+    if dialect_insert is not None:
+        stmt = dialect_insert(table).on_conflict_do_nothing(
+            index_elements=list(DEDUP_KEY)
+        ).returning(table.c.id, table.c.alarm_id, table.c.event_time)
+        return db.session.execute(stmt, rows).all()
+
+    keys = [(row['alarm_id'], row['event_time']) for row in rows]
+    existing = set(db.session.execute(
+        db.select(table.c.alarm_id, table.c.event_time).where(
+            tuple_(table.c.alarm_id, table.c.event_time).in_(keys)
+        )
+    ).all())
+    rows = [row for row in rows if (row['alarm_id'], row['event_time']) not in existing]
+    if not rows:
+        return []
+    return db.session.execute(
+        insert(table).returning(table.c.id, table.c.alarm_id, table.c.event_time), rows
+    ).all()
+
+def _count_in_rollup(alarms: List[Dict[str, Any]]) -> None:
+    """Add newly stored alarms to the per-minute statistics, one upsert per batch."""
+    counts = Counter(
+        (alarm['timestamp'].replace(second=0, microsecond=0), alarm['severity'], alarm['status'], alarm['source'][:100])
+        for alarm in alarms
+    )
+    if not counts:
+        return
+
+    table = AlarmStatsMinute.__table__
+    rows = [
+        {'bucket': bucket, 'severity': severity, 'status': status, 'source': source, 'count': count}
+        # Sorted so concurrent upserts lock the rows in the same order
+        for (bucket, severity, status, source), count in sorted(counts.items())
+    ]
+    dialect_insert = get_upsert_insert()
+
+    if dialect_insert is not None:
+        stmt = dialect_insert(table)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['bucket', 'severity', 'status', 'source'],
+            set_={'count': table.c.count + stmt.excluded.count}
+        ), rows)
+        return
+
+    for row in rows:
+        updated = db.session.execute(
+            db.update(table).where(
+                table.c.bucket == row['bucket'],
+                table.c.severity == row['severity'],
+                table.c.status == row['status'],
+                table.c.source == row['source']
+            ).values(count=table.c.count + row['count'])
+        )
+        if not updated.rowcount:
+            db.session.execute(insert(table), [row])
+
+def ingest_alarms(alarms: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Store a batch of alarms from the EDS API, ignoring ones already stored.
+
+    The caller owns the transaction and must commit.
+
+    Args:
+        alarms: Normalised alarm events as returned by eds_api
+
+    Returns:
+        The alarms that were not stored before, in input order, each with
+        'event_id' set to the new alarm_event row id; they are also counted
+        in the per-minute statistics
+    """
+    # Drop duplicates within the batch itself, keeping the first occurrence
+    unique = {}
+    for alarm in alarms:
+        unique.setdefault((alarm['id'], alarm['timestamp']), alarm)
+
+    if not unique:
+        return []
+
+    inserted = _insert_ignoring_duplicates([_to_row(alarm) for alarm in unique.values()])
+    inserted_ids = {(alarm_id, event_time): event_id for event_id, alarm_id, event_time in inserted}
+
+    new_alarms = []
+    for key, alarm in unique.items():
+        if key in inserted_ids:
+            new_alarms.append(dict(alarm, event_id=inserted_ids[key]))
+
+    _count_in_rollup(new_alarms)
+    if new_alarms:
+        data_versions.bump(data_versions.ALARMS)
+
+    logger.info(f"Ingested {len(alarms)} alarms: {len(new_alarms)} new, {len(alarms) - len(new_alarms)} already stored")
+    return new_alarms
@@ -0,0 +1,321 @@
+"""
+Monthly partitioning, retention and archival of the alarm history.
+
+On PostgreSQL alarm_event is range partitioned on event_time, one partition
+per month (alarm_event_y2026m10) plus a default partition for events outside
+them. Queries over recent alarms only touch the newest partitions, and
+expiring a month is a DETACH/DROP of its partition instead of a large DELETE.
+Every expiring month is first exported to a gzipped CSV file.
+
+Other databases keep a plain table; retention there archives and deletes the
+expired rows month by month.
+"""
+import csv
+import datetime
+import gzip
+import json
+import logging
+import os
+import re
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+from app import db
+from config import Config
+from models import AlarmEvent, AlarmStatsMinute
+import data_versions
+import alarm_trace
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'alarm_event'
+DEFAULT_PARTITION = 'alarm_event_default'
+PARTITION_PATTERN = re.compile(r'^alarm_event_y(\d{4})m(\d{2})$')
+
+def month_start(value: datetime.datetime) -> datetime.datetime:
+    """First moment of the month containing a timestamp."""
+    return datetime.datetime(value.year, value.month, 1)
+
+def add_months(month: datetime.datetime, months: int) -> datetime.datetime:
+    """Start of the month `months` after (or before) the given month start."""
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: datetime.datetime) -> str:
+    return f"alarm_event_y{month.year:04d}m{month.month:02d}"
+
+def detached_name(month: datetime.datetime) -> str:
+    """Name a detached partition is renamed to, freeing the month's name in case it is created again."""
+    return f"{partition_name(month)}_detached_{datetime.datetime.utcnow():%Y%m%d%H%M%S}"
+
+def is_partitioned() -> bool:
+    """Whether alarm_event is a partitioned PostgreSQL table."""
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    with db.engine.connect() as connection:
+        return connection.execute(
+            text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {'name': PARENT_TABLE}
+        ).scalar() == 'p'
+
+def list_partitions(connection=None) -> List[datetime.datetime]:
+    """Months that have a partition, oldest first (the default partition is not included)."""
+    query = text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(:name)"
+    )
+    if connection is None:
+        with db.engine.connect() as connection:
+            names = connection.execute(query, {'name': PARENT_TABLE}).scalars().all()
+    else:
+        names = connection.execute(query, {'name': PARENT_TABLE}).scalars().all()
+
+    months = []
+    for name in names:
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            months.append(datetime.datetime(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+def _create_partition(connection, month: datetime.datetime) -> None:
+    """
+    Create the partition for one month.
+
+    Rows for that month that already landed in the default partition are
+    moved into the new partition, which PostgreSQL requires before the
+    partition can exist.
+    """
+    name = partition_name(month)
+    bounds = {'start': month, 'end': add_months(month, 1)}
+    create = text(
+        f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+    )
+
+    in_default = connection.execute(text(
+        f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE event_time >= :start AND event_time < :end LIMIT 1"
+    ), bounds).first()
+    if in_default is None:
+        connection.execute(create)
+        return
+
+    connection.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    connection.execute(create)
+    moved = connection.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE event_time >= :start AND event_time < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    connection.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    logger.info(f"Moved {moved.rowcount} alarm events from the default partition to {name}")
+
+def ensure_partitions(start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None) -> List[str]:
+    """
+    Create any missing monthly partitions for a range.
+
+    Args:
+        start: Start of the range (default: as far back as polling backfills)
+        end: End of the range (default: PARTITION_MONTHS_AHEAD months ahead)
+
+    Returns:
+        Names of the partitions created
+    """
+    if not is_partitioned():
+        return []
+
+    now = datetime.datetime.now()
+    month = month_start(start or now - datetime.timedelta(days=Config.BACKFILL_MAX_DAYS))
+    last = month_start(end or add_months(month_start(now), Config.PARTITION_MONTHS_AHEAD))
+    existing = set(list_partitions())
+
+    created = []
+    while month <= last:
+        if month not in existing:
+            # One short transaction per partition keeps the lock on alarm_event brief
+            with db.engine.begin() as connection:
+                _create_partition(connection, month)
+            created.append(partition_name(month))
+            logger.info(f"Created alarm event partition {partition_name(month)}")
+        month = add_months(month, 1)
+    return created
+
+def convert_to_partitioned(keep_old: bool = False) -> bool:
+    """
+    Turn a plain alarm_event table into a partitioned one and copy its rows over.
+
+    Runs in one transaction holding an exclusive lock on alarm_event, so
+    polling and the web views wait until the copy is done.
+
+    Args:
+        keep_old: Keep the original table as alarm_event_unpartitioned
+
+    Returns:
+        False if alarm_event was already partitioned
+
+    Raises:
+        RuntimeError: If the database is not PostgreSQL
+    """
+    if db.engine.dialect.name != 'postgresql':
+        raise RuntimeError("Partitioning needs PostgreSQL")
+    if is_partitioned():
+        return False
+
+    old_table = f"{PARENT_TABLE}_unpartitioned"
+    with db.engine.begin() as connection:
+        connection.execute(text(f"LOCK TABLE {PARENT_TABLE} IN ACCESS EXCLUSIVE MODE"))
+        sequence = connection.execute(text(f"SELECT pg_get_serial_sequence('{PARENT_TABLE}', 'id')")).scalar()
+
+        # Free the table, primary key and index names for the new table
+        connection.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {old_table}"))
+        index_names = connection.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :name"
+        ), {'name': old_table}).scalars().all()
+        for index_name in index_names:
+            connection.execute(text(f"ALTER INDEX {index_name} RENAME TO {index_name[:50]}_unpartitioned"))
+
+        # The primary key has to include the partition key
+        connection.execute(text(
+            f"CREATE TABLE {PARENT_TABLE} (LIKE {old_table} INCLUDING DEFAULTS) PARTITION BY RANGE (event_time)"
+        ))
+        connection.execute(text(f"ALTER TABLE {PARENT_TABLE} ADD CONSTRAINT {PARENT_TABLE}_pkey PRIMARY KEY (id, event_time)"))
+        for index in AlarmEvent.__table__.indexes:
+            index.create(connection)
+        if sequence:
+            connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT_TABLE}.id"))
+
+        # A partition for every month that has alarms and for the range polling writes to
+        connection.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+        months = set(connection.execute(text(
+            f"SELECT DISTINCT date_trunc('month', event_time) FROM {old_table}"
+        )).scalars())
+        now = datetime.datetime.now()
+        month = month_start(now - datetime.timedelta(days=Config.BACKFILL_MAX_DAYS))
+        while month <= add_months(month_start(now), Config.PARTITION_MONTHS_AHEAD):
+            months.add(month)
+            month = add_months(month, 1)
+        for month in sorted(months):
+            _create_partition(connection, month)
+
+        copied = connection.execute(text(f"INSERT INTO {PARENT_TABLE} SELECT * FROM {old_table}"))
+        if not keep_old:
+            connection.execute(text(f"DROP TABLE {old_table}"))
+
+    logger.info(f"Converted {PARENT_TABLE} to monthly partitions, {copied.rowcount} rows copied")
+    return True
+
+def _archive_path(month: datetime.datetime) -> str:
+    """Archive file for a month; a month archived again (late rows) gets a numbered file."""
+    base = os.path.join(Config.ALARM_ARCHIVE_DIR, partition_name(month))
+    path, number = f"{base}.csv.gz", 1
+    while os.path.exists(path):
+        number += 1
+        path = f"{base}.{number}.csv.gz"
+    return path
+
+def _archive_partition(month: datetime.datetime) -> Tuple[str, int]:
+    """Export a partition with COPY to a gzipped CSV file; returns the file and the rows written."""
+    path = _archive_path(month)
+    os.makedirs(Config.ALARM_ARCHIVE_DIR, exist_ok=True)
+
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM {partition_name(month)}")
+        expected = cursor.fetchone()[0]
+        with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+            cursor.copy_expert(
+                f"COPY (SELECT * FROM {partition_name(month)} ORDER BY event_time, id) TO STDOUT WITH (FORMAT csv, HEADER)", f
+            )
+        written = cursor.rowcount
+        connection.rollback()
+    finally:
+        connection.close()
+
+    if written != expected:
+        raise RuntimeError(f"Archive of {partition_name(month)} has {written} rows, expected {expected}")
+    os.replace(path + '.tmp', path)
+    return path, written
+
+def _archive_rows(month: datetime.datetime, before: datetime.datetime) -> Tuple[str, int]:
+    """Export the alarm events of one month before a cutoff to a gzipped CSV file; returns the file and the rows written."""
+    path = _archive_path(month)
+    os.makedirs(Config.ALARM_ARCHIVE_DIR, exist_ok=True)
+    table = AlarmEvent.__table__
+
+    rows = db.session.execute(
+        db.select(table).where(
+            table.c.event_time >= month, table.c.event_time < min(add_months(month, 1), before)
+        ).order_by(table.c.event_time, table.c.id).execution_options(yield_per=1000)
+    )
+    written = 0
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(rows.keys())
+        for row in rows:
+            # raw_data comes back as a dict; write it as JSON like COPY does
+            writer.writerow([json.dumps(value) if isinstance(value, dict) else value for value in row])
+            written += 1
+
+    os.replace(path + '.tmp', path)
+    return path, written
+
+def apply_retention(now: Optional[datetime.datetime] = None) -> List[str]:
+    """
+    Archive and remove the months older than ALARM_RETENTION_MONTHS.
+
+    A month is removed only after its archive file was written completely.
+    Partitions are dropped, or only detached with ALARM_RETENTION_ACTION set
+    to 'detach' and renamed to alarm_event_yYYYYmMM_detached_<time>; anything older left in the default partition, or in a plain
+    table, is archived and deleted by month. The per-minute statistics and
+    latency traces of the removed months are deleted too.
+
+    Returns:
+        Archive files written
+    """
+    if Config.ALARM_RETENTION_MONTHS <= 0:
+        return []
+
+    cutoff = add_months(month_start(now or datetime.datetime.now()), -Config.ALARM_RETENTION_MONTHS)
+    archived = []
+
+    if is_partitioned():
+        for month in list_partitions():
+            if add_months(month, 1) > cutoff:
+                break
+            path, rows = _archive_partition(month)
+            name = partition_name(month)
+            with db.engine.begin() as connection:
+                connection.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+                if Config.ALARM_RETENTION_ACTION == 'detach':
+                    # A backfill into the month would otherwise collide with it
+                    name = detached_name(month)
+                    connection.execute(text(f"ALTER TABLE {partition_name(month)} RENAME TO {name}"))
+                else:
+                    connection.execute(text(f"DROP TABLE {name}"))
+            archived.append(path)
+            logger.info(f"Archived {rows} alarm events to {path} and removed partition {partition_name(month)}"
+                        + (f", kept as {name}" if Config.ALARM_RETENTION_ACTION == 'detach' else ""))
+
+    while True:
+        oldest = db.session.query(db.func.min(AlarmEvent.event_time)).filter(AlarmEvent.event_time < cutoff).scalar()
+        if oldest is None:
+            break
+        month = month_start(oldest)
+        path, rows = _archive_rows(month, cutoff)
+        AlarmEvent.query.filter(
+            AlarmEvent.event_time >= month, AlarmEvent.event_time < min(add_months(month, 1), cutoff)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        archived.append(path)
+        logger.info(f"Archived and deleted {rows} alarm events from {month:%Y-%m} to {path}")
+
+    AlarmStatsMinute.query.filter(AlarmStatsMinute.bucket < cutoff).delete(synchronize_session=False)
+    alarm_trace.delete_before(cutoff)
+    if archived:
+        data_versions.bump(data_versions.ALARMS)
+    db.session.commit()
+    return archived
+
+def run_maintenance() -> None:
+    """Create upcoming partitions and apply the retention policy."""
+    ensure_partitions()
+    apply_retention()
@@ -0,0 +1,142 @@
+"""
+Alarm queries used by the web routes.
+
+Kept in one place so the routes and benchmark_queries.py run the same SQL.
+Every list is ordered newest first on (event_time, id), which the indexes on
+alarm_event are built for.
+"""
+import base64
+import binascii
+import datetime
+import re
+from typing import List, Optional, Tuple
+from sqlalchemy import tuple_
+from app import db
+from models import AlarmEvent
+
+# Newest first, with the row id as tie-breaker for alarms with the same time
+NEWEST_FIRST = (AlarmEvent.event_time.desc(), AlarmEvent.id.desc())
+
+# Dotted path of a field in the raw EDS event, e.g. metadata.location
+RAW_FIELD_PATH = re.compile(r'^\w+(\.\w+)*$')
+
+def recent_active_alarms(limit: int = 5):
+    """Active alarms for the dashboard."""
+    return AlarmEvent.query.filter(AlarmEvent.status == 'ACTIVE').order_by(*NEWEST_FIRST).limit(limit)
+
+def alarms_by_status(status: str):
+    """Alarms for the alarm list, with status 'ALL' for every status."""
+    query = AlarmEvent.query
+    if status != 'ALL':
+        query = query.filter(AlarmEvent.status == status)
+    return query.order_by(*NEWEST_FIRST)
+
+def alarms_since(since: datetime.datetime, limit: Optional[int] = None):
+    """Alarms at or after a point in time, for the recent alarms API."""
+    return AlarmEvent.query.filter(AlarmEvent.event_time >= since).order_by(*NEWEST_FIRST).limit(limit)
+
+def raw_field(path: str):
+    """
+    Text value of a field of the raw EDS event (PostgreSQL only).
+
+    The expression is the one the RAW_DATA_INDEX_KEYS indexes are built on
+    (see db_migrations.add_raw_data_key_indexes), so filters on listed keys
+    use their index.
+    """
+    return db.func.jsonb_extract_path_text(AlarmEvent.raw_data, 'raw_data', *path.split('.'))
+
+def encode_cursor(alarm: AlarmEvent) -> str:
+    """Opaque page cursor for an alarm's position in the (event_time, id) order."""
+    return base64.urlsafe_b64encode(f"{alarm.event_time.isoformat()}|{alarm.id}".encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    """
+    Decode a page cursor from encode_cursor().
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        event_time, alarm_id = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split('|')
+        return datetime.datetime.fromisoformat(event_time), int(alarm_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f"Invalid page cursor: {cursor}")
+
+class KeysetPage:
+    """One page of alarms with the cursors of the neighbouring pages."""
+
+    def __init__(self, items: List[AlarmEvent], next_cursor: Optional[str], prev_cursor: Optional[str]):
+        self.items = items
+        self.next_cursor = next_cursor  # Older alarms, None on the last page
+        self.prev_cursor = prev_cursor  # Newer alarms, None on the first page
+
+def page_query(query, per_page: int, after: Optional[str] = None, before: Optional[str] = None):
+    """
+    Build the query for one keyset page, fetching one extra row to detect more pages.
+
+    Rows come newest first, or oldest first when paging backwards with `before`.
+
+    Raises:
+        ValueError: If a cursor is malformed
+    """
+    position = tuple_(AlarmEvent.event_time, AlarmEvent.id)
+    query = query.order_by(None)
+
+    if before:
+        # Walk towards newer alarms; the caller restores newest-first order
+        query = query.filter(position > decode_cursor(before)).order_by(
+            AlarmEvent.event_time.asc(), AlarmEvent.id.asc()
+        )
+    else:
+        if after:
+            query = query.filter(position < decode_cursor(after))
+        query = query.order_by(*NEWEST_FIRST)
+    return query.limit(per_page + 1)
+
+def keyset_page(query, per_page: int, after: Optional[str] = None, before: Optional[str] = None) -> KeysetPage:
+    """
+    Fetch a page of a newest-first alarm query by position instead of OFFSET.
+
+    The page continues from a cursor with an index range on (event_time, id),
+    so every page costs the same however deep it is, and alarms arriving
+    meanwhile do not shift the pages.
+
+    Args:
+        query: Filtered alarm query, e.g. alarms_by_status()
+        per_page: Alarms per page
+        after: Cursor of the last alarm of the previous page: return older alarms
+        before: Cursor of the first alarm of the next page: return newer alarms
+
+    Raises:
+        ValueError: If a cursor is malformed
+    """
+    rows = page_query(query, per_page, after, before).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if before:
+        items = list(reversed(rows))
+        has_newer, has_older = more, True
+    else:
+        items = rows
+        has_newer, has_older = after is not None, more
+
+    return KeysetPage(
+        items,
+        encode_cursor(items[-1]) if items and has_older else None,
+        encode_cursor(items[0]) if items and has_newer else None
+    )
+
+def estimate_count(query) -> Optional[int]:
+    """
+    Estimate the rows of a query from the planner statistics, without counting.
+
+    Returns:
+        The PostgreSQL planner's row estimate, or None on other databases
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return None
+
+    compiled = query.order_by(None).statement.compile(dialect=db.engine.dialect)
+    plan = db.session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,37 @@
+"""
+State to reset when alarms are cleared.
+
+Used by the /api/alarms/clear route and by clear_alarms.py, so both leave
+the system alarms and the poll cursor consistent with the alarm history.
+"""
+import logging
+from datetime import datetime, timedelta
+from app import db
+from models import AlarmEvent, SystemAlarmState
+import alarm_stream
+import data_versions
+import poll_cursor
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# How far back polling re-reads EDS after a clear
+RESCAN_HOURS = 24
+
+def reset_after_clear() -> None:
+    """
+    Drop the system alarms with their state and move the poll cursor back.
+
+    A SystemAlarmState left ACTIVE would keep pointing at its stored alarm,
+    so the next outage of that system alarm would only update a row that
+    is gone. Commits, then tells the open live pages to reload.
+    """
+    AlarmEvent.query.filter(AlarmEvent.alarm_id.like('SYSTEM-%')).delete(synchronize_session=False)
+    SystemAlarmState.query.delete()
+    data_versions.bump(data_versions.ALARMS)
+    db.session.commit()
+
+    poll_cursor.reset_cursor(datetime.now() - timedelta(hours=RESCAN_HOURS))
+    db.session.commit()
+    logger.info(f"System alarms reset, polling re-reads the last {RESCAN_HOURS} hours")
+    alarm_stream.publish(alarm_stream.EVENT_CLEARED, {})
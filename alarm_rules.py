@@ -0,0 +1,337 @@
+"""
+Data-driven classification of EDS events.
+
+Rules in the alarm_rule table decide which events are stored as alarms, with
+which severity, and whether contacts are notified. The enabled rules are
+compiled once into a RuleMatcher and cached until they change, so
+classifying an event costs a few dict lookups and bit operations instead of
+re-evaluating every rule.
+"""
+import json
+import logging
+import re
+import threading
+from typing import Iterable, List, Dict, Any, Optional, Tuple, Pattern
+from app import db
+from models import AlarmRule
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+ACTION_ALARM = 'ALARM'
+ACTION_IGNORE = 'IGNORE'
+
+# Equivalent of the filter that used to be hardcoded: store alarm-type events
+# and HIGH/CRITICAL events, and notify about the HIGH/CRITICAL ones
+DEFAULT_RULES = [
+    {'name': 'High priority events', 'position': 10, 'priorities': 'HIGH,CRITICAL',
+     'action': ACTION_ALARM, 'notify': True},
+    {'name': 'Alarm events', 'position': 20, 'type_pattern': 'alarm',
+     'action': ACTION_ALARM, 'notify': False},
+]
+
+def split_values(values: Optional[str]) -> List[str]:
+    """Split a comma-separated rule field into lower-case values."""
+    return [value.strip().lower() for value in (values or '').split(',') if value.strip()]
+
+def parse_metadata(metadata_match: Optional[str]) -> Dict[str, str]:
+    """
+    Parse a rule's metadata condition.
+
+    Raises:
+        ValueError: If it is not a JSON object
+    """
+    if not metadata_match:
+        return {}
+    metadata = json.loads(metadata_match)
+    if not isinstance(metadata, dict):
+        raise ValueError("Metadata must be a JSON object")
+    return {str(key): str(value).lower() for key, value in metadata.items()}
+
+def metadata_value(event: Dict[str, Any], key: str) -> Any:
+    """
+    Value of a rule's metadata key in a raw EDS event.
+
+    A dotted key is a path from the top of the event, as in
+    RAW_DATA_INDEX_KEYS (e.g. metadata.location); a plain key is a field of
+    the event, or of its 'metadata' object when the event has no such field.
+
+    Returns:
+        The value, or '' if the event does not have it
+    """
+    if '.' not in key:
+        if key in event:
+            return event[key]
+        return (event.get('metadata') or {}).get(key, '')
+    value: Any = event
+    for part in key.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return ''
+        value = value[part]
+    return value
+
+PATTERN_FIELDS = ('type_pattern', 'description_pattern')
+
+def combine_patterns(patterns: Iterable[str]) -> Pattern:
+    """
+    Join the patterns of one field into a single regex, as RuleMatcher does.
+
+    Raises:
+        re.error: If they cannot be combined
+    """
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), re.IGNORECASE)
+
+def check_pattern(pattern: str) -> None:
+    """
+    Check that a pattern compiles on its own and inside a combined regex.
+
+    Global inline flags such as (?i) are only valid at the start of the
+    combined regex, and a group name may occur only once in it, so both are
+    rejected; scoped flags such as (?i:pump) are fine.
+
+    Raises:
+        re.error or ValueError: If the pattern cannot be used
+    """
+    if re.compile(pattern).groupindex:
+        raise ValueError("named groups are not supported, use (?:...)")
+    combine_patterns(['', pattern])
+
+def check_rule(rule: AlarmRule) -> None:
+    """
+    Check that a rule can be compiled on its own.
+
+    Raises:
+        ValueError: With a message suitable for showing to the user
+    """
+    if rule.action not in (ACTION_ALARM, ACTION_IGNORE):
+        raise ValueError(f"Unknown action {rule.action}")
+    for field in PATTERN_FIELDS:
+        try:
+            re.compile(getattr(rule, field) or '')
+        except re.error as e:
+            raise ValueError(f"Invalid {field.replace('_', ' ')}: {e}")
+
+def validate_rule(rule: AlarmRule, enabled_rules: Iterable[AlarmRule] = ()) -> None:
+    """
+    Check that a rule can be compiled, also together with the other enabled rules.
+
+    Args:
+        rule: The new or re-enabled rule
+        enabled_rules: The enabled rules it will be compiled with
+
+    Raises:
+        ValueError: With a message suitable for showing to the user
+    """
+    check_rule(rule)
+    others = [other for other in enabled_rules if other is not rule]
+    for field in PATTERN_FIELDS:
+        pattern = getattr(rule, field)
+        if not pattern:
+            continue
+        label = field.replace('_', ' ')
+        try:
+            check_pattern(pattern)
+        except (re.error, ValueError) as e:
+            raise ValueError(f"Invalid {label}: {e}")
+        try:
+            combine_patterns([getattr(other, field) for other in others if getattr(other, field)] + [pattern])
+        except re.error as e:
+            raise ValueError(f"Invalid {label}: conflicts with the enabled rules ({e})")
+    try:
+        parse_metadata(rule.metadata_match)
+    except ValueError as e:
+        raise ValueError(f"Invalid metadata: {e}")
+
+class RuleResult:
+    """What a matching rule does with an event."""
+    __slots__ = ('rule_id', 'name', 'action', 'severity', 'notify')
+
+    def __init__(self, rule: AlarmRule):
+        self.rule_id = rule.id
+        self.name = rule.name
+        self.action = rule.action
+        self.severity = rule.severity.upper() if rule.severity else None
+        self.notify = bool(rule.notify)
+
+class _ExactField:
+    """Rules with a set of accepted values for one field, indexed by value."""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.any_mask = 0
+
+    def add(self, bit: int, values: List[str]) -> None:
+        if not values:
+            self.any_mask |= bit
+        for value in values:
+            self.index[value] = self.index.get(value, 0) | bit
+
+    def lookup(self, value: Any) -> int:
+        """Bit mask of the rules accepting a value."""
+        return self.any_mask | self.index.get(str(value).lower(), 0)
+
+class _PatternField:
+    """Rules with a regex for one field, prefiltered by one combined regex."""
+
+    def __init__(self):
+        self.patterns: Dict[int, Pattern] = {}
+        self.pattern_mask = 0
+        self.combined: Optional[Pattern] = None
+
+    def add(self, bit: int, pattern: Optional[str]) -> None:
+        if pattern:
+            self.patterns[bit] = re.compile(pattern, re.IGNORECASE)
+            self.pattern_mask |= bit
+
+    def compile(self) -> None:
+        if not self.patterns:
+            return
+        try:
+            self.combined = combine_patterns(regex.pattern for regex in self.patterns.values())
+        except re.error as e:
+            # Rules saved before validation covered the combined regex; each
+            # pattern is then checked on its own, which is slower but correct
+            logger.warning(f"Alarm rule patterns cannot be combined ({e}), checking them one by one")
+            self.combined = None
+
+    def prefilter(self, value: str) -> int:
+        """Bit mask of the rules that may still match: all of them unless no pattern matches at all."""
+        if self.combined is None or self.combined.search(value):
+            return -1
+        return ~self.pattern_mask
+
+    def matches(self, bit: int, value: str) -> bool:
+        regex = self.patterns.get(bit)
+        return regex is None or regex.search(value) is not None
+
+class RuleMatcher:
+    """
+    Enabled alarm rules compiled for fast evaluation.
+
+    Each rule is one bit, in evaluation order. Exact conditions (source,
+    priority, metadata) are dict lookups returning the mask of rules that
+    accept the value; regex conditions are first screened with one combined
+    regex per field. Only the candidates left are checked individually, in
+    order, until the first full match.
+    """
+
+    def __init__(self, rules: List[AlarmRule]):
+        self.results: List[RuleResult] = []
+        self._sources = _ExactField()
+        self._priorities = _ExactField()
+        self._metadata: Dict[str, _ExactField] = {}
+        self._types = _PatternField()
+        self._descriptions = _PatternField()
+
+        compiled = []
+        for rule in rules:
+            try:
+                check_rule(rule)
+                compiled.append((rule, parse_metadata(rule.metadata_match)))
+            except ValueError as e:
+                logger.error(f"Skipping alarm rule {rule.id} ({rule.name}): {e}")
+
+        for rule, metadata in compiled:
+            for key in metadata:
+                self._metadata.setdefault(key, _ExactField())
+
+        for index, (rule, metadata) in enumerate(compiled):
+            bit = 1 << index
+            self.results.append(RuleResult(rule))
+            self._sources.add(bit, split_values(rule.sources))
+            self._priorities.add(bit, split_values(rule.priorities))
+            self._types.add(bit, rule.type_pattern)
+            self._descriptions.add(bit, rule.description_pattern)
+            for key, field in self._metadata.items():
+                field.add(bit, [metadata[key]] if key in metadata else [])
+
+        self._types.compile()
+        self._descriptions.compile()
+
+    def match(self, event: Dict[str, Any]) -> Optional[RuleResult]:
+        """
+        Find the first rule matching a raw EDS event.
+
+        Returns:
+            The rule's result, or None if no rule matches
+        """
+        candidates = self._sources.lookup(event.get('source', '')) & self._priorities.lookup(event.get('priority', ''))
+        for key, field in self._metadata.items():
+            if not candidates:
+                return None
+            candidates &= field.lookup(metadata_value(event, key))
+        if not candidates:
+            return None
+
+        event_type = str(event.get('type', ''))
+        description = str(event.get('description', ''))
+        candidates &= self._types.prefilter(event_type) & self._descriptions.prefilter(description)
+
+        while candidates:
+            bit = candidates & -candidates
+            if self._types.matches(bit, event_type) and self._descriptions.matches(bit, description):
+                return self.results[bit.bit_length() - 1]
+            candidates ^= bit
+        return None
+
+    def classify(self, alarms: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Apply the rules to a batch of normalised events.
+
+        Events that match no rule or an IGNORE rule are dropped. The others get
+        the rule's severity, if it has one, and 'notify' set from the rule.
+
+        Args:
+            alarms: Events as returned by eds_api, with the raw event in 'raw_data'
+
+        Returns:
+            The events to store as alarms, in input order
+        """
+        kept = []
+        for alarm in alarms:
+            result = self.match(alarm['raw_data'])
+            if result is None or result.action == ACTION_IGNORE:
+                continue
+            if result.severity:
+                alarm['severity'] = result.severity
+            alarm['notify'] = result.notify
+            kept.append(alarm)
+        return kept
+
+_cache_lock = threading.Lock()
+_cache: Optional[Tuple[Tuple[Any, ...], RuleMatcher]] = None
+
+def _rules_version() -> Tuple[Any, ...]:
+    """Cheap fingerprint of the rule table that changes whenever a rule is added, edited or deleted."""
+    return tuple(db.session.query(
+        db.func.count(AlarmRule.id), db.func.max(AlarmRule.id), db.func.max(AlarmRule.updated_at)
+    ).one())
+
+def get_matcher() -> RuleMatcher:
+    """
+    Get the compiled matcher for the current rules.
+
+    The matcher is rebuilt only when the rule table has changed, which is
+    checked with one aggregate query, so edits made by another worker or
+    process are picked up on the next poll.
+    """
+    global _cache
+    version = _rules_version()
+
+    with _cache_lock:
+        if _cache is not None and _cache[0] == version:
+            return _cache[1]
+
+    rules = AlarmRule.query.filter_by(enabled=True).order_by(AlarmRule.position, AlarmRule.id).all()
+    matcher = RuleMatcher(rules)
+    logger.info(f"Compiled {len(matcher.results)} alarm rules")
+
+    with _cache_lock:
+        _cache = (version, matcher)
+    return matcher
+
+def invalidate() -> None:
+    """Drop the compiled matcher, e.g. right after the rules were edited."""
+    global _cache
+    with _cache_lock:
+        _cache = None
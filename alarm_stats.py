@@ -0,0 +1,118 @@
+"""
+Alarm statistics for the dashboard.
+
+Reads the per-minute rollup that ingestion maintains (see
+alarm_ingest._count_in_rollup), so the cost depends on the number of minutes
+and combinations in the range, not on the number of alarms. Whatever
+changes the status of stored alarms has to move their counts as well, see
+clear_all().
+"""
+import datetime
+import logging
+from typing import Dict, Any, Tuple
+from sqlalchemy import literal, select, text
+from app import db
+from models import AlarmStatsMinute, SystemAlarmState
+from alarm_ingest import get_upsert_insert
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Number of sources listed in the statistics
+TOP_SOURCES = 5
+
+def _system_alarm_counts(since: datetime.datetime) -> Dict[Tuple[str, str], int]:
+    """Count the system alarms seen in the range by severity and status, once per alarm ID."""
+    rows = db.session.query(
+        SystemAlarmState.severity, SystemAlarmState.status, db.func.count(SystemAlarmState.id)
+    ).filter(
+        SystemAlarmState.last_seen >= since
+    ).group_by(SystemAlarmState.severity, SystemAlarmState.status).all()
+    return {(severity, status): count for severity, status, count in rows}
+
+def get_stats(since: datetime.datetime) -> Dict[str, Any]:
+    """
+    Summarise the alarms since a point in time.
+
+    Args:
+        since: Start of the range (event time)
+
+    Returns:
+        Dict with the total, counts by severity and by status, and the
+        sources with the most alarms
+    """
+    total = db.func.sum(AlarmStatsMinute.count)
+    in_range = AlarmStatsMinute.bucket >= since.replace(second=0, microsecond=0)
+
+    counts = _system_alarm_counts(since)
+    for severity, status, count in db.session.query(
+        AlarmStatsMinute.severity, AlarmStatsMinute.status, total
+    ).filter(in_range).group_by(AlarmStatsMinute.severity, AlarmStatsMinute.status):
+        counts[(severity, status)] = counts.get((severity, status), 0) + int(count)
+
+    by_severity: Dict[str, int] = {}
+    by_status: Dict[str, int] = {}
+    for (severity, status), count in counts.items():
+        by_severity[severity] = by_severity.get(severity, 0) + count
+        by_status[status] = by_status.get(status, 0) + count
+
+    top_sources = db.session.query(AlarmStatsMinute.source, total).filter(in_range).group_by(
+        AlarmStatsMinute.source
+    ).order_by(total.desc()).limit(TOP_SOURCES).all()
+
+    return {
+        'since': since.isoformat(),
+        'total': sum(by_severity.values()),
+        'by_severity': by_severity,
+        'by_status': by_status,
+        'top_sources': [{'source': source, 'count': int(count)} for source, count in top_sources],
+    }
+
+def clear_all() -> None:
+    """
+    Move the counts of all alarms that are not CLEARED to CLEARED.
+
+    Call in the transaction that sets every stored alarm to CLEARED; the
+    caller commits. Works on the rollup rows only, without reading alarm_event.
+    """
+    table = AlarmStatsMinute.__table__
+    not_cleared = table.c.status != 'CLEARED'
+    dialect_insert = get_upsert_insert()
+    if dialect_insert is None:
+        # Recount from the alarms, which the caller already cleared
+        rebuild_rollup()
+        return
+
+    merged = select(
+        table.c.bucket, table.c.severity, literal('CLEARED'), table.c.source, db.func.sum(table.c.count)
+    ).where(not_cleared).group_by(table.c.bucket, table.c.severity, table.c.source)
+    stmt = dialect_insert(table).from_select(['bucket', 'severity', 'status', 'source', 'count'], merged)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['bucket', 'severity', 'status', 'source'],
+        set_={'count': table.c.count + stmt.excluded.count}
+    ))
+    db.session.execute(db.delete(table).where(not_cleared))
+
+def rebuild_rollup() -> int:
+    """
+    Recompute the per-minute rollup from the stored alarms.
+
+    Used to fill the rollup for alarms stored before it existed and after
+    alarms were deleted in bulk. The caller commits.
+
+    Returns:
+        Number of rollup rows written
+    """
+    if db.session.get_bind().dialect.name == 'sqlite':
+        minute = "strftime('%Y-%m-%d %H:%M:00.000000', event_time)"
+    else:
+        minute = "date_trunc('minute', event_time)"
+
+    db.session.query(AlarmStatsMinute).delete()
+    result = db.session.execute(text(
+        "INSERT INTO alarm_stats_minute (bucket, severity, status, source, count) "
+        f"SELECT {minute}, severity, status, source, COUNT(*) FROM alarm_event "
+        f"WHERE alarm_id NOT LIKE 'SYSTEM-%' GROUP BY {minute}, severity, status, source"
+    ))
+    logger.info(f"Rebuilt alarm statistics: {result.rowcount} rows")
+    return result.rowcount
@@ -0,0 +1,235 @@
+"""
+Live alarm updates for the browser, sent as Server-Sent Events.
+
+check_alarms and the alarm/status changes publish small events (new alarms,
+a status snapshot, alarms cleared) and /api/stream passes them on to every
+open page, so a page shows a new alarm as soon as it is stored without
+polling the database.
+
+Each process keeps the latest events in a Broadcaster. On PostgreSQL events
+are published with NOTIFY and every process with open streams LISTENs, so
+a page receives the alarms stored by any gunicorn worker. Elsewhere events
+only reach pages served by the same process.
+"""
+import json
+import logging
+import select
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import text
+from app import db
+from config import Config
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'alarm_stream'
+
+# NOTIFY payloads must stay below 8000 bytes
+MAX_NOTIFY_PAYLOAD = 7000
+
+EVENT_ALARMS = 'alarms'  # {"alarms": [alarm, ...]} newly stored alarms
+EVENT_STATUS = 'status'  # Connection status snapshot, as /api/status
+EVENT_CLEARED = 'cleared'  # Alarms were cleared: {"alarm_id": ...} for one system alarm, {} for all
+EVENT_RESYNC = 'resync'  # Events were missed; reload the data
+
+class Broadcaster:
+    """
+    Thread-safe buffer of the latest events with blocking reads for the streams.
+
+    Event IDs are "<instance>:<sequence>", so a reconnecting browser sending
+    Last-Event-ID resumes where it left off if the events are still buffered
+    in this process, and gets a resync event otherwise.
+    """
+
+    def __init__(self, buffer_size: int):
+        self.instance = uuid.uuid4().hex[:8]
+        self._condition = threading.Condition()
+        self._events = deque(maxlen=buffer_size)
+        self._sequence = 0
+
+    def publish(self, event: str, data: Dict[str, Any]) -> None:
+        """Add an event and wake up the waiting streams."""
+        with self._condition:
+            self._sequence += 1
+            self._events.append((self._sequence, event, json.dumps(data)))
+            self._condition.notify_all()
+
+    def resume_position(self, last_event_id: Optional[str]) -> Tuple[int, bool]:
+        """
+        Sequence to continue after for a Last-Event-ID.
+
+        Returns:
+            (sequence, complete): complete is False if events after
+            last_event_id are no longer buffered here; the client then
+            reloads its data and continues from the newest event
+        """
+        with self._condition:
+            current = self._sequence
+            oldest = self._events[0][0] if self._events else current + 1
+
+        if not last_event_id:
+            return current, True
+        instance, _, sequence = last_event_id.partition(':')
+        if instance != self.instance or not sequence.isdigit() or int(sequence) > current:
+            return current, False
+        if int(sequence) + 1 < oldest:
+            return current, False
+        return int(sequence), True
+
+    def wait(self, after: int, timeout: float) -> List[Tuple[int, str, str]]:
+        """Events after a sequence number, waiting up to `timeout` seconds for one to arrive."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._sequence > after, timeout)
+            return [entry for entry in self._events if entry[0] > after]
+
+broadcaster = Broadcaster(Config.STREAM_BUFFER_SIZE)
+
+_listener_lock = threading.Lock()
+_listener: Optional[threading.Thread] = None
+
+def _use_notify() -> bool:
+    if Config.STREAM_BACKEND == 'local':
+        return False
+    return db.engine.dialect.name == 'postgresql'
+
+def _notify_payloads(event: str, data: Dict[str, Any]) -> Iterator[str]:
+    """Encode an event as NOTIFY payloads, splitting long alarm lists over several."""
+    payload = json.dumps({'event': event, 'data': data})
+    if len(payload) <= MAX_NOTIFY_PAYLOAD or event != EVENT_ALARMS:
+        yield payload
+        return
+
+    chunk: List[Dict[str, Any]] = []
+    size = 0
+    for alarm in data['alarms']:
+        alarm_size = len(json.dumps(alarm)) + 2
+        if chunk and size + alarm_size > MAX_NOTIFY_PAYLOAD:
+            yield json.dumps({'event': event, 'data': {'alarms': chunk}})
+            chunk, size = [], 0
+        chunk.append(alarm)
+        size += alarm_size
+    if chunk:
+        yield json.dumps({'event': event, 'data': {'alarms': chunk}})
+
+def publish(event: str, data: Dict[str, Any]) -> None:
+    """
+    Publish an event to the open streams of all processes (PostgreSQL) or of this process.
+
+    Call after the data the event describes is committed. Publishing
+    never fails the caller; errors are logged.
+    """
+    try:
+        if not _use_notify():
+            broadcaster.publish(event, data)
+            return
+
+        with db.engine.begin() as connection:
+            for payload in _notify_payloads(event, data):
+                connection.execute(text("SELECT pg_notify(:channel, :payload)"), {'channel': CHANNEL, 'payload': payload})
+    except Exception as e:
+        logger.error(f"Error publishing {event} event: {str(e)}")
+
+def publish_alarms(alarms: List[Dict[str, Any]]) -> None:
+    """Publish newly stored alarms (dicts as returned by the alarm API); too many become a resync."""
+    if not alarms:
+        return
+    if len(alarms) > Config.STREAM_MAX_ALARMS:
+        publish(EVENT_RESYNC, {'reason': f"{len(alarms)} new alarms"})
+    else:
+        publish(EVENT_ALARMS, {'alarms': alarms})
+
+def _listen(engine) -> None:
+    """LISTEN for events from all processes and add them to this process's broadcaster; reconnects on errors."""
+    failed = False
+    while True:
+        connection = None
+        try:
+            pooled = engine.raw_connection()
+            connection = pooled.driver_connection
+            # Keep the connection out of the pool: it stays in LISTEN mode
+            pooled.detach()
+            connection.autocommit = True
+            connection.cursor().execute(f"LISTEN {CHANNEL}")
+            logger.info(f"Listening for alarm stream events on {CHANNEL}")
+            if failed:
+                # Events may have been missed while disconnected
+                broadcaster.publish(EVENT_RESYNC, {'reason': 'listener reconnected'})
+                failed = False
+
+            while True:
+                if select.select([connection], [], [], Config.STREAM_HEARTBEAT_SECONDS) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    message = json.loads(notify.payload)
+                    broadcaster.publish(message['event'], message['data'])
+        except Exception as e:
+            logger.error(f"Alarm stream listener failed, reconnecting: {str(e)}")
+            failed = True
+            time.sleep(5)
+        finally:
+            if connection is not None:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+
+def _ensure_listener() -> None:
+    """Start the LISTEN thread of this process on first use."""
+    global _listener
+    if not _use_notify():
+        return
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=_listen, args=(db.engine,), name='alarm-stream-listener', daemon=True)
+            _listener.start()
+
+def _format(event: str, data: str, event_id: Optional[str] = None) -> str:
+    lines = [f"id: {event_id}"] if event_id else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return "\n".join(lines) + "\n\n"
+
+def stream(last_event_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Start the Server-Sent Events of one client.
+
+    A comment line is sent every STREAM_HEARTBEAT_SECONDS to keep proxies
+    from closing the connection. The stream ends after STREAM_MAX_SECONDS,
+    so a connection does not hold a sync worker for good; the browser
+    reconnects with Last-Event-ID and continues where it left off.
+
+    Args:
+        last_event_id: Last-Event-ID header of a reconnecting browser
+
+    Returns:
+        Generator of the event stream text; it needs no app context
+    """
+    # Needs the app context, which is gone once the response streams
+    _ensure_listener()
+    return _events(last_event_id)
+
+def _events(last_event_id: Optional[str]) -> Iterator[str]:
+    position, complete = broadcaster.resume_position(last_event_id)
+    # Browsers reconnect after this many milliseconds
+    yield f"retry: {Config.STREAM_RETRY_MS}\n\n"
+    if not complete:
+        yield _format(EVENT_RESYNC, json.dumps({'reason': 'missed events'}))
+
+    deadline = time.monotonic() + Config.STREAM_MAX_SECONDS
+    while time.monotonic() < deadline:
+        events = broadcaster.wait(position, min(Config.STREAM_HEARTBEAT_SECONDS, deadline - time.monotonic()))
+        if not events:
+            yield ": keepalive\n\n"
+            continue
+        if events[0][0] > position + 1:
+            # This client fell behind by more than the buffer
+            yield _format(EVENT_RESYNC, json.dumps({'reason': 'missed events'}))
+        for sequence, event, data in events:
+            yield _format(event, data, f"{broadcaster.instance}:{sequence}")
+            position = sequence
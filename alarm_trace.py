@@ -0,0 +1,156 @@
+"""
+End-to-end latency traces of polled alarms.
+
+For every alarm stored by the regular poll, one alarm_trace row records
+when EDS says it happened, when the monitor received it, when its
+notification was queued and when the alarm was committed. The outbox
+worker adds when Twilio accepted the SMS to the first recipient, with its
+message SID. The report gives percentiles of each hop over a time window,
+showing which stage to scale.
+
+Backfilled alarms are not traced: they are late by design. All times are
+UTC.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+from app import db
+from config import Config
+from models import AlarmTrace, NotificationOutbox
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Hops between consecutive trace timestamps, in the order an alarm passes them
+HOPS = (
+    ('eds', 'event_at', 'fetched_at'),  # Poll interval plus EDS delay
+    ('ingest', 'fetched_at', 'enqueued_at'),  # Classify, store and queue the notification
+    ('commit', 'enqueued_at', 'committed_at'),  # Rest of the poll's transaction
+    ('delivery', 'committed_at', 'accepted_at'),  # Digest window, outbox and Twilio
+    ('total', 'event_at', 'accepted_at'),
+)
+
+PERCENTILES = (50, 95, 99)
+
+def utc(local_time: datetime) -> datetime:
+    """Convert a naive local time (as EDS event times are stored) to naive UTC."""
+    return local_time.astimezone(timezone.utc).replace(tzinfo=None)
+
+def collect(traces: List[Dict[str, Any]], alarms: List[Dict[str, Any]], fetched_at: datetime) -> None:
+    """
+    Start traces for newly stored alarms.
+
+    Args:
+        traces: List the traces of this poll are collected in
+        alarms: New alarms as returned by ingest_alarms
+        fetched_at: When the batch was received from EDS (UTC)
+    """
+    if not Config.ALARM_TRACE_ENABLED:
+        return
+    for alarm in alarms:
+        traces.append({
+            'alarm_event_id': alarm['event_id'],
+            'severity': alarm['severity'],
+            'event_at': utc(alarm['timestamp']),
+            'fetched_at': fetched_at,
+            'notify': bool(alarm.get('notify')),
+        })
+
+def record(traces: List[Dict[str, Any]], enqueued_at: Optional[datetime],
+           outbox: Optional[NotificationOutbox]) -> None:
+    """
+    Store the traces of a poll; call just before its commit.
+
+    Args:
+        traces: Traces from collect()
+        enqueued_at: When the poll's notifications were queued, None if none were
+        outbox: The first recipient's outbox entry for them
+    """
+    if not traces:
+        return
+    if outbox is not None and outbox.id is None:
+        db.session.flush()
+
+    committed_at = datetime.utcnow()
+    rows = []
+    for trace in traces:
+        notified = trace['notify'] and outbox is not None
+        rows.append({
+            'alarm_event_id': trace['alarm_event_id'],
+            'severity': trace['severity'],
+            'event_at': trace['event_at'],
+            'fetched_at': trace['fetched_at'],
+            'enqueued_at': enqueued_at if notified else None,
+            'committed_at': committed_at,
+            'outbox_id': outbox.id if notified else None,
+        })
+    db.session.execute(db.insert(AlarmTrace), rows)
+
+def mark_accepted(entries: Sequence[NotificationOutbox]) -> None:
+    """Record that Twilio accepted these sent outbox entries, for the traces following them; the caller commits."""
+    rows = [
+        {'entry_id': entry.id, 'accepted_at': entry.sent_at, 'message_sid': entry.message_sid}
+        for entry in entries if entry.message_sid
+    ]
+    if not rows:
+        return
+    # Core statement: one executemany, not an ORM bulk update by primary key
+    table = AlarmTrace.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.outbox_id == db.bindparam('entry_id'), table.c.accepted_at.is_(None))
+        .values(accepted_at=db.bindparam('accepted_at'), message_sid=db.bindparam('message_sid')),
+        rows
+    )
+
+def _percentile(values: List[float], percentile: int) -> float:
+    """Nearest-rank percentile of sorted values."""
+    rank = max(1, -(-percentile * len(values) // 100))
+    return values[rank - 1]
+
+def latency_report(since: datetime, until: Optional[datetime] = None, severity: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Percentiles of each hop for the alarms that happened in a time window.
+
+    Args:
+        since: Start of the window (UTC, by EDS event time)
+        until: End of the window (UTC), now if None
+        severity: Only alarms of this severity, e.g. 'CRITICAL'
+
+    Returns:
+        {'since', 'until', 'severity', 'alarms', 'hops': {hop: {'count', 'p50',
+        'p95', 'p99', 'max'}}} with latencies in seconds; a hop only counts
+        alarms that have both of its timestamps
+    """
+    until = until or datetime.utcnow()
+    query = db.select(*(getattr(AlarmTrace, column) for column in
+                        ('event_at', 'fetched_at', 'enqueued_at', 'committed_at', 'accepted_at'))).where(
+        AlarmTrace.event_at >= since, AlarmTrace.event_at < until
+    )
+    if severity:
+        query = query.where(AlarmTrace.severity == severity.upper())
+    rows = db.session.execute(query).mappings().all()
+
+    hops = {}
+    for name, start, end in HOPS:
+        values = sorted(
+            (row[end] - row[start]).total_seconds()
+            for row in rows if row[start] is not None and row[end] is not None
+        )
+        hop = {'count': len(values)}
+        for percentile in PERCENTILES:
+            hop[f"p{percentile}"] = round(_percentile(values, percentile), 3) if values else None
+        hop['max'] = round(values[-1], 3) if values else None
+        hops[name] = hop
+
+    return {
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'severity': severity.upper() if severity else None,
+        'alarms': len(rows),
+        'hops': hops,
+    }
+
+def delete_before(cutoff: datetime) -> int:
+    """Delete the traces of alarms before a local time, e.g. with the alarm history; the caller commits."""
+    return AlarmTrace.query.filter(AlarmTrace.event_at < utc(cutoff)).delete(synchronize_session=False)
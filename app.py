@@ -32,9 +32,12 @@ db.init_app(app)
 # Initialize database within app context
 with app.app_context():
     # Import models
-    from models import ApiCredential, ContactNumber, AlarmEvent  # noqa: F401
+    from models import ApiCredential, ContactNumber, AlarmEvent, SystemAlarmState, AlarmStatsMinute, PollCursor, NotificationOutbox, AlarmRule, DataVersion, SchedulerLease, AlarmTrace  # noqa: F401
     
-    # Create tables
-    db.create_all()
+    # Create and upgrade tables, unless gunicorn's master already did
+    # before starting the workers (see gunicorn.conf.py)
+    if os.environ.get("RUN_MIGRATIONS", "True") == "True":
+        from db_migrations import migrate
+        migrate()
     
     logger.info("Database initialized")
@@ -0,0 +1,49 @@
+import argparse
+from datetime import datetime, timedelta
+from app import app, db
+from models import ApiCredential
+import eds_api
+import eds_backfill
+import poll_cursor
+import alarm_rules
+import alarm_partitions
+
+def backfill_alarm_events(start, end, resume):
+    with app.app_context():
+        try:
+            eds_creds = ApiCredential.query.filter_by(api_type='eds').first()
+            if not eds_creds:
+                print("No EDS API credentials found")
+                return
+
+            if resume:
+                # Continue after the last window a previous run completed; with
+                # no previous run there is nothing to skip
+                cursor = poll_cursor.find_cursor(eds_backfill.BACKFILL_CURSOR)
+                last_timestamp = cursor.last_timestamp if cursor else None
+                if last_timestamp and last_timestamp > start:
+                    start = last_timestamp + timedelta(seconds=1)
+            poll_cursor.reset_cursor(start - timedelta(seconds=1), eds_backfill.BACKFILL_CURSOR)
+            db.session.commit()
+
+            # Older months get their own partitions instead of the default one
+            alarm_partitions.ensure_partitions(start, end)
+            matcher = alarm_rules.get_matcher()
+            session = eds_api.get_session(eds_creds.api_url, eds_creds.username, eds_creds.api_key)
+            new_count = eds_backfill.backfill(session, start, end, eds_backfill.BACKFILL_CURSOR, matcher)
+            print(f"Successfully backfilled alarm events from {start} to {end}: {new_count} new")
+        except Exception as e:
+            print(f"Error backfilling alarm events: {e}")
+            db.session.rollback()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load EDS alarm history into the database without sending notifications")
+    parser.add_argument("--days", type=float, default=1, help="how far back to start, in days (default: 1)")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="start of the range (ISO format), overrides --days")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="end of the range (ISO format, default: now)")
+    parser.add_argument("--resume", action="store_true", help="continue after the last window a previous run completed")
+    args = parser.parse_args()
+
+    end = args.end or datetime.now()
+    start = args.start or end - timedelta(days=args.days)
+    backfill_alarm_events(start, end, args.resume)
@@ -0,0 +1,294 @@
+"""
+End-to-end throughput benchmark of the alarm pipeline.
+
+Starts the mock EDS API (run_test_server.py) and the mock Twilio API
+(mock_twilio_api.py) as separate processes, so their work is not measured,
+and points the monitor at them. For every combination of alarm rate and
+contact count it lets the mock EDS generate events at that rate and drives
+the real check_alarms and outbox drain once per interval. Each poll records
+the alarms stored, the SMS sent, wall and CPU time, the time per stage and
+the resident memory; each scenario reports alarms/sec ingested and SMS/sec
+sent. The results are written to a JSON file so releases can be compared,
+and --baseline prints the change against an earlier results file.
+
+Every scenario replaces the EDS and Twilio credentials, contacts, alarms and
+outbox, so run it against a scratch database:
+
+    DATABASE_URL=sqlite:////tmp/pipeline_benchmark.db python benchmark_pipeline.py --rates 1,10,100 --contacts 1,10
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+# The benchmark drives the pipeline itself: importing main must not start
+# the scheduler, whose jobs would poll and send on their own
+os.environ["SCHEDULER_ENABLED"] = "False"
+
+import requests
+from prometheus_client import REGISTRY
+from app import app, db
+from config import Config
+from models import (
+    AlarmEvent, AlarmStatsMinute, AlarmTrace, ApiCredential, ContactNumber, NotificationOutbox, SystemAlarmState
+)
+import main
+import metrics
+import notification_outbox
+import notification_service
+import poll_cursor
+
+TWILIO_ACCOUNT = 'ACbenchmark'
+TWILIO_TOKEN = 'benchmark'
+TWILIO_FROM = '+15550000000'
+
+STAGES = (metrics.STAGE_LOGIN, metrics.STAGE_READ, metrics.STAGE_NORMALISE,
+          metrics.STAGE_INSERT, metrics.STAGE_COMMIT, metrics.STAGE_NOTIFY)
+
+def rss_mb():
+    """Resident memory of this process in MiB (the peak where /proc is not available)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def stage_seconds():
+    """Total time recorded per alarm check stage so far."""
+    return {name: REGISTRY.get_sample_value('alarm_check_stage_seconds_sum', {'stage': name}) or 0.0
+            for name in STAGES}
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def start_mock(script, port, options):
+    """Start a mock server script on a port and wait until it answers."""
+    process = subprocess.Popen(
+        [sys.executable, script, '--port', str(port), '--quiet', *options],
+        cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{script} exited with status {process.returncode}")
+        try:
+            requests.get(f"{url}/mock/stats", timeout=1)
+            return process, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{script} did not start on port {port}")
+
+def mock_request(url, path, settings=None):
+    """GET a mock's /mock/ endpoint, or POST settings to it."""
+    if settings is None:
+        response = requests.get(f"{url}/mock/{path}", timeout=5)
+    else:
+        response = requests.post(f"{url}/mock/{path}", json=settings, timeout=5)
+    response.raise_for_status()
+    return response.json()
+
+def reset(eds_url, contacts):
+    """Empty the pipeline tables and set up credentials and contacts for a scenario."""
+    # Core deletes: nothing loaded by the previous scenario is kept or synchronised
+    db.session.expunge_all()
+    for model in (AlarmTrace, NotificationOutbox, AlarmEvent, AlarmStatsMinute, SystemAlarmState,
+                  ContactNumber, ApiCredential):
+        db.session.execute(model.__table__.delete())
+    db.session.add(ApiCredential(api_type='eds', api_url=eds_url, username='benchmark', api_key='benchmark'))
+    db.session.add(ApiCredential(api_type='twilio', username=TWILIO_ACCOUNT, api_key=TWILIO_TOKEN, api_secret=TWILIO_FROM))
+    db.session.add_all(ContactNumber(name=f'Benchmark {i}', phone_number=f'+1555{i:07d}') for i in range(contacts))
+    # Start from now: only events generated at the scenario's rate are read
+    poll_cursor.reset_cursor(datetime.datetime.now())
+    db.session.commit()
+
+def drain():
+    """Send everything due in the outbox. Returns (sent, failed)."""
+    sent = failed = 0
+    while True:
+        before = db.session.query(db.func.count(NotificationOutbox.id)).filter(NotificationOutbox.status == 'SENT').scalar()
+        processed = notification_outbox.drain_outbox(TWILIO_ACCOUNT, TWILIO_TOKEN, TWILIO_FROM)
+        if not processed:
+            return sent, failed
+        after = db.session.query(db.func.count(NotificationOutbox.id)).filter(NotificationOutbox.status == 'SENT').scalar()
+        sent += after - before
+        failed += processed - (after - before)
+
+def run_poll(eds_url):
+    """Run one alarm check and drain the outbox, measuring both."""
+    events_before = mock_request(eds_url, 'stats')['counts'].get('events_returned', 0)
+    stages_before = stage_seconds()
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    with metrics.alarm_check():
+        outcome, severities = main.check_alarms()
+    check_seconds = time.perf_counter() - started
+    check_cpu = time.process_time() - cpu_started
+    stages_after = stage_seconds()
+
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    sent, failed = drain()
+    drain_seconds = time.perf_counter() - started
+
+    return {
+        'outcome': outcome,
+        'events_read': mock_request(eds_url, 'stats')['counts'].get('events_returned', 0) - events_before,
+        'alarms_stored': sum(severities.values()),
+        'check_seconds': round(check_seconds, 4),
+        'check_cpu_seconds': round(check_cpu, 4),
+        'stage_seconds': {name: round(stages_after[name] - stages_before[name], 4) for name in STAGES},
+        'sms_sent': sent,
+        'sms_failed': failed,
+        'drain_seconds': round(drain_seconds, 4),
+        'drain_cpu_seconds': round(time.process_time() - cpu_started, 4),
+        'rss_mb': round(rss_mb(), 1),
+    }
+
+def summarize(polls):
+    """Throughput and per-poll resource use of a scenario."""
+    check_seconds = sum(poll['check_seconds'] for poll in polls)
+    drain_seconds = sum(poll['drain_seconds'] for poll in polls)
+    alarms = sum(poll['alarms_stored'] for poll in polls)
+    sent = sum(poll['sms_sent'] for poll in polls)
+    return {
+        'events_read': sum(poll['events_read'] for poll in polls),
+        'alarms_stored': alarms,
+        'alarms_per_second': round(alarms / check_seconds, 1) if check_seconds else None,
+        'sms_sent': sent,
+        'sms_failed': sum(poll['sms_failed'] for poll in polls),
+        'sms_per_second': round(sent / drain_seconds, 1) if drain_seconds else None,
+        'failed_polls': sum(1 for poll in polls if poll['outcome'] != 'ok'),
+        'check_seconds_p50': round(statistics.median(poll['check_seconds'] for poll in polls), 4),
+        'check_seconds_max': max(poll['check_seconds'] for poll in polls),
+        'cpu_seconds_per_poll': round(statistics.mean(poll['check_cpu_seconds'] + poll['drain_cpu_seconds'] for poll in polls), 4),
+        'rss_mb_max': max(poll['rss_mb'] for poll in polls),
+        'rss_mb_growth': round(polls[-1]['rss_mb'] - polls[0]['rss_mb'], 1),
+    }
+
+def print_baseline_comparison(results, baseline_file):
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    previous = {(scenario['rate'], scenario['contacts']): scenario['summary'] for scenario in baseline['scenarios']}
+    print(f"Compared with {baseline_file} (commit {baseline.get('git_commit')}):")
+    for scenario in results['scenarios']:
+        before = previous.get((scenario['rate'], scenario['contacts']))
+        if before is None:
+            continue
+        changes = []
+        for key in ('alarms_per_second', 'sms_per_second', 'cpu_seconds_per_poll', 'rss_mb_max'):
+            old, new = before.get(key), scenario['summary'].get(key)
+            if old and new is not None:
+                changes.append(f"{key} {old} -> {new} ({(new - old) / old:+.0%})")
+        print(f"  rate {scenario['rate']:g}/s, {scenario['contacts']} contacts: {'; '.join(changes)}")
+
+def run_benchmark(args):
+    processes = []
+    with app.app_context():
+        try:
+            existing = ApiCredential.query.filter_by(api_type='eds').first()
+            if existing and not any(host in existing.api_url for host in ('127.0.0.1', 'localhost')):
+                print(f"The database is set up for EDS at {existing.api_url}; run the benchmark against a scratch database")
+                return False
+
+            process, eds_url = start_mock('run_test_server.py', args.eds_port, [
+                '--events', '0', '--events-per-read', '0', '--seed', str(args.seed),
+                '--latency-ms', str(args.eds_latency_ms),
+            ])
+            processes.append(process)
+            process, twilio_url = start_mock('mock_twilio_api.py', args.twilio_port, [
+                '--seed', str(args.seed), '--latency-ms', str(args.twilio_latency_ms),
+                '--error-rate', str(args.twilio_error_rate),
+                '--too-many-requests-rate', str(args.twilio_429_rate),
+            ])
+            processes.append(process)
+
+            Config.TWILIO_API_URL = twilio_url
+            notification_service._clients.clear()
+            # One digest per contact and poll, none held back
+            Config.DIGEST_WINDOW_SECONDS = 0
+            Config.SMS_RATE_LIMIT_PER_HOUR = 0
+
+            results = {
+                'started_at': datetime.datetime.now().isoformat(),
+                'git_commit': git_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'database': db.engine.dialect.name,
+                'settings': vars(args),
+                'scenarios': [],
+            }
+            print(f"{'rate/s':>8}{'contacts':>10}{'events':>10}{'alarms':>10}{'alarms/s':>10}"
+                  f"{'sms':>8}{'sms/s':>8}{'cpu/poll':>10}{'rss MiB':>10}")
+            for rate in args.rates:
+                for contacts in args.contacts:
+                    reset(eds_url, contacts)
+                    mock_request(eds_url, 'config', {'rate': rate})
+                    polls = []
+                    for _ in range(args.polls):
+                        time.sleep(args.interval)
+                        polls.append(run_poll(eds_url))
+                    summary = summarize(polls)
+                    results['scenarios'].append({'rate': rate, 'contacts': contacts, 'summary': summary, 'polls': polls})
+                    print(f"{rate:>8g}{contacts:>10}{summary['events_read']:>10}{summary['alarms_stored']:>10}"
+                          f"{summary['alarms_per_second'] or '-':>10}{summary['sms_sent']:>8}{summary['sms_per_second'] or '-':>8}"
+                          f"{summary['cpu_seconds_per_poll']:>10}{summary['rss_mb_max']:>10}")
+            mock_request(eds_url, 'config', {'rate': 0})
+            results['twilio'] = mock_request(twilio_url, 'stats')['counts']
+
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2, default=str)
+            print(f"Results written to {args.output}")
+            if args.baseline:
+                print_baseline_comparison(results, args.baseline)
+            return True
+        except Exception as e:
+            print(f"Error running benchmark: {e}")
+            db.session.rollback()
+            return False
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+def number_list(value, cast):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure alarm and SMS throughput of the pipeline against the mock EDS and Twilio APIs")
+    parser.add_argument("--rates", type=lambda value: number_list(value, float), default=[1, 10, 100],
+                        help="comma-separated EDS event rates per second (default: 1,10,100)")
+    parser.add_argument("--contacts", type=lambda value: number_list(value, int), default=[1, 10, 50],
+                        help="comma-separated contact counts (default: 1,10,50)")
+    parser.add_argument("--polls", type=int, default=5, help="polls per scenario (default: 5)")
+    parser.add_argument("--interval", type=float, default=5, help="seconds between polls (default: 5)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed of the mocks (default: 1)")
+    parser.add_argument("--eds-port", type=int, default=3101, help="port for the mock EDS API (default: 3101)")
+    parser.add_argument("--eds-latency-ms", type=float, default=0, help="delay of every mock EDS request")
+    parser.add_argument("--twilio-port", type=int, default=3102, help="port for the mock Twilio API (default: 3102)")
+    parser.add_argument("--twilio-latency-ms", type=float, default=0, help="delay of every mock Twilio request")
+    parser.add_argument("--twilio-error-rate", type=float, default=0, help="share of SMS sends failing with 5xx")
+    parser.add_argument("--twilio-429-rate", type=float, default=0, help="share of SMS sends failing with 429")
+    parser.add_argument("--baseline", help="earlier results file to compare with")
+    parser.add_argument("--verbose", action="store_true", help="keep the monitor's log output")
+    parser.add_argument("--output", default=f"pipeline_benchmark_{datetime.datetime.now():%Y%m%d_%H%M%S}.json",
+                        help="JSON file for the results")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    if not run_benchmark(args):
+        raise SystemExit(1)
@@ -0,0 +1,188 @@
+"""
+Query plan benchmark for the alarm_event access paths.
+
+Seeds N synthetic alarm events (alarm IDs starting with BENCH-), runs the
+query behind each route with EXPLAIN ANALYZE on PostgreSQL (EXPLAIN QUERY PLAN
+and wall-clock timing on SQLite), and writes the plans and timings to a JSON
+file so runs before and after a change can be compared. The seeded rows are
+removed again unless --keep is given.
+
+Run it against a scratch database:
+
+    DATABASE_URL=postgresql://... python benchmark_queries.py --rows 1000000
+"""
+import argparse
+import datetime
+import json
+import random
+import time
+from sqlalchemy import insert, text
+from app import app, db
+from models import AlarmEvent
+import alarm_queries
+
+BENCH_PREFIX = 'BENCH-'
+
+SEVERITIES = ['CRITICAL', 'HIGH', 'MEDIUM', 'LOW']
+SEVERITY_WEIGHTS = [1, 4, 10, 20]
+STATUSES = ['ACTIVE', 'ACKNOWLEDGED', 'CLEARED']
+STATUS_WEIGHTS = [2, 3, 95]
+
+def seed(rows, days, sources, batch_size=10000):
+    """Insert synthetic alarm events spread over the last `days` days."""
+    now = datetime.datetime.now().replace(microsecond=0)
+    span = int(days * 86400)
+    table = AlarmEvent.__table__
+
+    for offset in range(0, rows, batch_size):
+        count = min(batch_size, rows - offset)
+        severities = random.choices(SEVERITIES, SEVERITY_WEIGHTS, k=count)
+        statuses = random.choices(STATUSES, STATUS_WEIGHTS, k=count)
+        db.session.execute(insert(table), [
+            {
+                'alarm_id': f'{BENCH_PREFIX}{offset + i}',
+                'description': f'Benchmark alarm {offset + i}',
+                'source': f'Source {random.randrange(sources)}',
+                'event_time': now - datetime.timedelta(seconds=random.randrange(span)),
+                'severity': severities[i],
+                'status': statuses[i],
+                'raw_data': {},
+            }
+            for i in range(count)
+        ])
+        db.session.commit()
+        print(f"Seeded {offset + count}/{rows} rows", end='\r', flush=True)
+    print()
+
+def cleanup():
+    result = db.session.execute(
+        db.delete(AlarmEvent).where(AlarmEvent.alarm_id.like(f'{BENCH_PREFIX}%'))
+    )
+    db.session.commit()
+    print(f"Removed {result.rowcount} seeded rows")
+
+def analyze():
+    """Refresh the planner statistics after seeding."""
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text("ANALYZE alarm_event"))
+    else:
+        db.session.execute(text("ANALYZE"))
+    db.session.commit()
+
+def _deep_keyset_page(status, page):
+    """Keyset query for a deep page of the alarm list, continuing after the alarm at that depth."""
+    query = alarm_queries.alarms_by_status(status)
+    last = query.offset(20 * (page - 1) - 1).first()
+    after = alarm_queries.encode_cursor(last) if last else None
+    return alarm_queries.page_query(query, 20, after).statement
+
+def route_queries():
+    """(name, statement) for the query behind each route and background job."""
+    now = datetime.datetime.now()
+    return [
+        ('index: recent active alarms', alarm_queries.recent_active_alarms(5).statement),
+        ('alarms: ACTIVE, first page', alarm_queries.alarms_by_status('ACTIVE').limit(20).statement),
+        ('alarms: CLEARED, first page', alarm_queries.alarms_by_status('CLEARED').limit(20).statement),
+        ('alarms: ALL, page 500 (offset)', alarm_queries.alarms_by_status('ALL').limit(20).offset(20 * 499).statement),
+        ('alarms: ALL, page 500 (keyset)', _deep_keyset_page('ALL', 500)),
+        ('alarms: CLEARED, page 500 (keyset)', _deep_keyset_page('CLEARED', 500)),
+        ('alarms: ACTIVE, count', db.select(db.func.count()).select_from(
+            alarm_queries.alarms_by_status('ACTIVE').order_by(None).subquery())),
+        ('api recent: last 24 hours', alarm_queries.alarms_since(now - datetime.timedelta(hours=24)).statement),
+        ('clear: system alarms', db.select(AlarmEvent.id).where(AlarmEvent.alarm_id.like('SYSTEM-%'))),
+        ('poll cursor: newest EDS alarm', db.select(db.func.max(AlarmEvent.event_time)).where(
+            ~AlarmEvent.alarm_id.like('SYSTEM-%'))),
+        ('ingest: dedup key lookup', db.select(AlarmEvent.id).where(
+            AlarmEvent.alarm_id == f'{BENCH_PREFIX}1', AlarmEvent.event_time == now)),
+    ]
+
+def _driver_sql(statement):
+    """Compile a statement to SQL and parameters in the form the DB driver expects."""
+    compiled = statement.compile(dialect=db.engine.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    return str(compiled), params
+
+def _plan_nodes(plan):
+    """Yield every node of a PostgreSQL JSON plan."""
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _plan_nodes(child)
+
+def explain(statement, repeat):
+    """Plan and time one statement; the fastest of `repeat` runs is reported."""
+    sql, params = _driver_sql(statement)
+    connection = db.session.connection()
+
+    if db.engine.dialect.name == 'postgresql':
+        runs = []
+        for _ in range(repeat):
+            result = connection.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params).scalar()
+            runs.append(result[0] if isinstance(result, list) else json.loads(result)[0])
+        best = min(runs, key=lambda run: run['Execution Time'])
+        nodes = list(_plan_nodes(best['Plan']))
+        return {
+            'execution_ms': best['Execution Time'],
+            'planning_ms': best['Planning Time'],
+            'scans': sorted({f"{node['Node Type']} on {node.get('Index Name') or node.get('Relation Name')}"
+                             for node in nodes if 'Scan' in node['Node Type']}),
+            'sequential_scan': any(node['Node Type'] == 'Seq Scan' for node in nodes),
+            'plan': best['Plan'],
+        }
+
+    plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params)]
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        connection.exec_driver_sql(sql, params).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'execution_ms': min(timings),
+        'scans': plan,
+        'sequential_scan': any(step.startswith('SCAN') and 'USING' not in step for step in plan),
+    }
+
+def run_benchmark(rows, days, sources, repeat, keep, output):
+    with app.app_context():
+        try:
+            if rows:
+                seed(rows, days, sources)
+                analyze()
+
+            results = {
+                'database': db.engine.dialect.name,
+                'table_rows': db.session.query(db.func.count(AlarmEvent.id)).scalar(),
+                'seeded_rows': rows,
+                'started_at': datetime.datetime.now().isoformat(),
+                'queries': {},
+            }
+            for name, statement in route_queries():
+                result = explain(statement, repeat)
+                results['queries'][name] = result
+                marker = '  SEQ SCAN' if result['sequential_scan'] else ''
+                print(f"{name:<36} {result['execution_ms']:>10.3f} ms  {'; '.join(result['scans'])}{marker}")
+            db.session.rollback()
+
+            with open(output, 'w') as f:
+                json.dump(results, f, indent=2, default=str)
+            print(f"Results written to {output}")
+        except Exception as e:
+            print(f"Error running benchmark: {e}")
+            db.session.rollback()
+        finally:
+            if rows and not keep:
+                cleanup()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed alarm events and record query plans and timings for each route")
+    parser.add_argument("--rows", type=int, default=100000, help="synthetic alarm events to seed, 0 to use the table as is (default: 100000)")
+    parser.add_argument("--days", type=float, default=90, help="spread the seeded events over this many days (default: 90)")
+    parser.add_argument("--sources", type=int, default=2000, help="number of distinct sources (default: 2000)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query; the fastest is reported (default: 5)")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows for later runs (reuse them with --rows 0)")
+    parser.add_argument("--output", default=f"query_benchmark_{datetime.datetime.now():%Y%m%d_%H%M%S}.json",
+                        help="JSON file for the results")
+    args = parser.parse_args()
+
+    run_benchmark(args.rows, args.days, args.sources, args.repeat, args.keep, args.output)
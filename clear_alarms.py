@@ -1,13 +1,20 @@
 
 from app import app, db
-from models import AlarmEvent
+from models import AlarmEvent, AlarmStatsMinute, AlarmTrace
+import alarm_reset
+import data_versions
 
 def clear_alarm_events():
     with app.app_context():
         try:
-            # Delete all alarm events
+            # Delete all alarm events, their statistics and latency traces
             AlarmEvent.query.delete()
+            AlarmStatsMinute.query.delete()
+            AlarmTrace.query.delete()
+            data_versions.bump(data_versions.ALARMS)
             db.session.commit()
+            # Also drops the system alarm states and re-reads recent EDS history
+            alarm_reset.reset_after_clear()
             print("Successfully cleared all alarm events from database")
         except Exception as e:
             print(f"Error clearing alarm events: {e}")
@@ -0,0 +1,25 @@
+import argparse
+from app import app, db
+import db_migrations
+
+def compact_raw_data():
+    with app.app_context():
+        try:
+            if db_migrations.convert_raw_data_to_jsonb():
+                # The RAW_DATA_INDEX_KEYS indexes need the JSONB column
+                db_migrations.add_raw_data_key_indexes()
+                print("Converted alarm_event.raw_data to JSONB")
+            else:
+                print("alarm_event.raw_data is already JSONB")
+        except Exception as e:
+            print(f"Error converting alarm_event.raw_data: {e}")
+            db.session.rollback()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert the raw events of the alarm history to JSONB (PostgreSQL); "
+                    "the table is locked while it is rewritten, so run it in a maintenance window"
+    )
+    parser.parse_args()
+
+    compact_raw_data()
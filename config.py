@@ -16,10 +16,116 @@ class Config:
     # Default alarm check interval (in seconds)
     ALARM_CHECK_INTERVAL = int(os.environ.get("ALARM_CHECK_INTERVAL", "60"))
     
+    # Adaptive check interval (in seconds, see poll_schedule): back off while
+    # EDS fails, up to POLL_BACKOFF_MAX, randomising up to POLL_BACKOFF_JITTER
+    # of each delay; after POLL_BREAKER_THRESHOLD failures in a row only try
+    # once per POLL_BREAKER_COOLDOWN. After new alarms of POLL_BURST_SEVERITIES
+    # check every POLL_BURST_INTERVAL for POLL_BURST_SECONDS
+    POLL_BACKOFF_MAX = int(os.environ.get("POLL_BACKOFF_MAX", "600"))
+    POLL_BACKOFF_JITTER = float(os.environ.get("POLL_BACKOFF_JITTER", "0.5"))
+    POLL_BREAKER_THRESHOLD = int(os.environ.get("POLL_BREAKER_THRESHOLD", "5"))
+    POLL_BREAKER_COOLDOWN = int(os.environ.get("POLL_BREAKER_COOLDOWN", "900"))
+    POLL_BURST_INTERVAL = int(os.environ.get("POLL_BURST_INTERVAL", "15"))
+    POLL_BURST_SECONDS = int(os.environ.get("POLL_BURST_SECONDS", "300"))
+    POLL_BURST_SEVERITIES = [severity.strip() for severity in os.environ.get("POLL_BURST_SEVERITIES", "HIGH,CRITICAL").split(",") if severity.strip()]
+    
+    # Number of alarms parsed from the EDS response and inserted per batch
+    INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "500"))
+    
+    # Backfill: when polling is further behind than the threshold (or has no
+    # position yet, in which case it starts BACKFILL_MAX_DAYS back), history is
+    # read in windows of BACKFILL_WINDOW_SECONDS, several at a time
+    BACKFILL_THRESHOLD_SECONDS = int(os.environ.get("BACKFILL_THRESHOLD_SECONDS", "3600"))
+    BACKFILL_WINDOW_SECONDS = int(os.environ.get("BACKFILL_WINDOW_SECONDS", "3600"))
+    BACKFILL_MAX_WORKERS = int(os.environ.get("BACKFILL_MAX_WORKERS", "4"))
+    BACKFILL_MAX_DAYS = int(os.environ.get("BACKFILL_MAX_DAYS", "7"))
+    
+    # Page size for EDS events requests (0 = no paging, one request per range)
+    EDS_PAGE_SIZE = int(os.environ.get("EDS_PAGE_SIZE", "0"))
+    
+    # Record every EDS events response, raw and with timing, to gzip NDJSON
+    # segments in this directory for replay_traffic.py (empty = off)
+    EDS_RECORD_DIR = os.environ.get("EDS_RECORD_DIR", "")
+    EDS_RECORD_SEGMENT_SECONDS = int(os.environ.get("EDS_RECORD_SEGMENT_SECONDS", "3600"))
+    
+    # Alarm history: PostgreSQL partitions are created this many months ahead;
+    # months older than ALARM_RETENTION_MONTHS (0 = keep everything) are
+    # exported to gzipped CSV in ALARM_ARCHIVE_DIR and then dropped, or only
+    # detached from alarm_event (and renamed, see alarm_partitions.detached_name)
+    # with ALARM_RETENTION_ACTION=detach
+    PARTITION_MONTHS_AHEAD = int(os.environ.get("PARTITION_MONTHS_AHEAD", "2"))
+    ALARM_RETENTION_MONTHS = int(os.environ.get("ALARM_RETENTION_MONTHS", "0"))
+    ALARM_RETENTION_ACTION = os.environ.get("ALARM_RETENTION_ACTION", "drop")
+    ALARM_ARCHIVE_DIR = os.environ.get("ALARM_ARCHIVE_DIR", "archive")
+    
+    # Fields of the raw EDS event to index on PostgreSQL, comma-separated dotted
+    # paths such as "metadata.location"; the alarms API can filter on them
+    RAW_DATA_INDEX_KEYS = [key.strip() for key in os.environ.get("RAW_DATA_INDEX_KEYS", "").split(",") if key.strip()]
+    
+    # Live updates (/api/stream): 'auto' fans events out to all workers with
+    # PostgreSQL LISTEN/NOTIFY when available, 'local' keeps them in-process.
+    # Streams send a heartbeat every STREAM_HEARTBEAT_SECONDS and end after
+    # STREAM_MAX_SECONDS (browsers reconnect and resume from the last
+    # STREAM_BUFFER_SIZE events); more than STREAM_MAX_ALARMS new alarms at
+    # once are sent as a signal to reload instead
+    STREAM_BACKEND = os.environ.get("STREAM_BACKEND", "auto")
+    STREAM_HEARTBEAT_SECONDS = int(os.environ.get("STREAM_HEARTBEAT_SECONDS", "15"))
+    STREAM_MAX_SECONDS = int(os.environ.get("STREAM_MAX_SECONDS", "300"))
+    STREAM_RETRY_MS = int(os.environ.get("STREAM_RETRY_MS", "3000"))
+    STREAM_BUFFER_SIZE = int(os.environ.get("STREAM_BUFFER_SIZE", "500"))
+    STREAM_MAX_ALARMS = int(os.environ.get("STREAM_MAX_ALARMS", "100"))
+    
+    # Conditional GET for the polled read APIs: responses covering the last
+    # N hours stay valid for RESPONSE_CACHE_SECONDS without a write, and each
+    # process keeps the last RESPONSE_CACHE_SIZE response bodies
+    RESPONSE_CACHE_SECONDS = int(os.environ.get("RESPONSE_CACHE_SECONDS", "60"))
+    RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "256"))
+    
+    # Background connection status probe interval and how long a result stays valid (in seconds)
+    STATUS_CHECK_INTERVAL = int(os.environ.get("STATUS_CHECK_INTERVAL", "30"))
+    STATUS_CACHE_TTL = int(os.environ.get("STATUS_CACHE_TTL", "120"))
+    
     # Twilio defaults
     TWILIO_ACCOUNT_SID = os.environ.get("TWILIO_ACCOUNT_SID", "")
     TWILIO_AUTH_TOKEN = os.environ.get("TWILIO_AUTH_TOKEN", "")
     TWILIO_PHONE_NUMBER = os.environ.get("TWILIO_PHONE_NUMBER", "")
+    # Base URL of the Twilio REST API; empty for the real one, e.g. http://localhost:3002 for mock_twilio_api.py
+    TWILIO_API_URL = os.environ.get("TWILIO_API_URL", "")
+    
+    # Number of SMS messages sent in parallel
+    NOTIFICATION_MAX_WORKERS = int(os.environ.get("NOTIFICATION_MAX_WORKERS", "8"))
+    
+    # Only the process holding the scheduler lease runs the polling,
+    # notification and maintenance jobs. The leader renews it every
+    # LEADER_RENEW_INTERVAL seconds; when it stops, another process takes
+    # over once LEADER_LEASE_SECONDS have passed. Disable for a single process
+    LEADER_ELECTION = os.environ.get("LEADER_ELECTION", "True") == "True"
+    # Tools that import main to drive its functions themselves (benchmarks,
+    # replays) turn the scheduler off, so it never polls or sends on its own
+    SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "True") == "True"
+    LEADER_LEASE_SECONDS = int(os.environ.get("LEADER_LEASE_SECONDS", "45"))
+    LEADER_RENEW_INTERVAL = int(os.environ.get("LEADER_RENEW_INTERVAL", "15"))
+    
+    # Notification outbox worker: how often it runs, how much it sends per run,
+    # and how failed sends are retried (delays in seconds, doubling per attempt)
+    OUTBOX_DRAIN_INTERVAL = int(os.environ.get("OUTBOX_DRAIN_INTERVAL", "5"))
+    OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "100"))
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "6"))
+    OUTBOX_RETRY_BASE = int(os.environ.get("OUTBOX_RETRY_BASE", "30"))
+    OUTBOX_RETRY_MAX = int(os.environ.get("OUTBOX_RETRY_MAX", "3600"))
+    
+    # Record when each polled alarm was fetched, committed, queued and sent
+    # (alarm_trace), for the latency report at /api/latency
+    ALARM_TRACE_ENABLED = os.environ.get("ALARM_TRACE_ENABLED", "True") == "True"
+    
+    # Alarm digests: alarms arriving within the window are summarised in one SMS
+    # per contact (0 = one digest per poll), capped at SMS_MAX_LENGTH characters
+    DIGEST_WINDOW_SECONDS = int(os.environ.get("DIGEST_WINDOW_SECONDS", "0"))
+    DIGEST_TOP_DESCRIPTIONS = int(os.environ.get("DIGEST_TOP_DESCRIPTIONS", "3"))
+    SMS_MAX_LENGTH = int(os.environ.get("SMS_MAX_LENGTH", "320"))
+    
+    # Maximum SMS messages per contact per hour (0 = no limit); extra alarms wait and are folded into the next digest
+    SMS_RATE_LIMIT_PER_HOUR = int(os.environ.get("SMS_RATE_LIMIT_PER_HOUR", "20"))
     
     # EDS API defaults
     EDS_API_URL = os.environ.get("EDS_API_URL", "")
@@ -0,0 +1,130 @@
+"""
+Change versions of the data behind the read APIs, and conditional GET on top of them.
+
+Every write to a table the dashboard polls bumps that table's counter in
+data_version, in the writer's transaction. A cached endpoint derives its
+ETag from the counters (plus the request arguments), so a repeated poll
+costs one primary key lookup: 304 if the browser has the current version,
+otherwise the response body this process already built for that version,
+and only then a query.
+"""
+import functools
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+from flask import current_app, request
+from sqlalchemy.exc import IntegrityError
+from app import db
+from config import Config
+from models import AlarmEvent, ContactNumber, DataVersion
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+ALARMS = AlarmEvent.__tablename__
+CONTACTS = ContactNumber.__tablename__
+
+# Response bodies by ETag, most recently used last
+_responses: "OrderedDict[str, tuple]" = OrderedDict()
+_responses_lock = threading.Lock()
+
+def bump(*tables: str) -> None:
+    """
+    Record a change to tables; the caller commits with its own changes.
+
+    Args:
+        tables: Table names, e.g. ALARMS
+    """
+    for table in tables:
+        updated = db.session.execute(
+            db.update(DataVersion).where(DataVersion.table_name == table).values(version=DataVersion.version + 1)
+        )
+        if updated.rowcount:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.add(DataVersion(table_name=table, version=1))
+        except IntegrityError:
+            # Another worker created it first
+            db.session.execute(
+                db.update(DataVersion).where(DataVersion.table_name == table).values(version=DataVersion.version + 1)
+            )
+
+def get_versions(tables: Sequence[str]) -> Dict[str, int]:
+    """Current version of each table (0 if never changed)."""
+    rows = db.session.execute(
+        db.select(DataVersion.table_name, DataVersion.version).where(DataVersion.table_name.in_(tables))
+    ).all()
+    versions = {table: 0 for table in tables}
+    versions.update(dict(rows))
+    return versions
+
+def _etag(versions: Dict[str, int], window: Optional[int]) -> str:
+    key = [request.path, sorted(request.args.items(multi=True)), sorted(versions.items()), window]
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+def _remember(etag: str, body: bytes, mimetype: str) -> None:
+    with _responses_lock:
+        _responses[etag] = (body, mimetype)
+        _responses.move_to_end(etag)
+        while len(_responses) > Config.RESPONSE_CACHE_SIZE:
+            _responses.popitem(last=False)
+
+def _cached(etag: str) -> Optional[tuple]:
+    with _responses_lock:
+        entry = _responses.get(etag)
+        if entry is not None:
+            _responses.move_to_end(etag)
+        return entry
+
+def cached_response(*tables: str, window: Optional[int] = None):
+    """
+    Decorate a GET endpoint whose response only depends on its arguments and these tables.
+
+    Args:
+        tables: Tables the response is built from
+        window: For responses relative to the current time (e.g. the last 24
+            hours): seconds a response stays valid without a write
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = get_versions(tables)
+            # Release the read transaction before a possibly long response
+            db.session.commit()
+            etag = _etag(versions, int(time.time() // window) if window else None)
+
+            if etag in request.if_none_match:
+                response = current_app.response_class(status=304)
+            else:
+                entry = _cached(etag)
+                if entry is not None:
+                    response = current_app.response_class(entry[0], mimetype=entry[1])
+                else:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    _remember(etag, response.get_data(), response.mimetype)
+
+            response.set_etag(etag)
+            # Browsers revalidate every time, which is a version check here
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+def conditional(response):
+    """
+    Add an ETag computed from the body of a cheap response and answer 304 if the browser has it.
+
+    For responses that are not built from the database, e.g. the status snapshot.
+    """
+    response = current_app.make_response(response)
+    if response.status_code == 200:
+        response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+        response.headers['Cache-Control'] = 'no-cache'
+        response.make_conditional(request)
+    return response
@@ -0,0 +1,331 @@
+"""
+Idempotent schema upgrades for existing databases.
+
+db.create_all() only creates missing tables, so changes to tables that
+already exist (new indexes, constraints, columns) are applied here. Every
+step checks the current schema first and is safe to run on every start.
+On PostgreSQL one process at a time runs them, see migration_lock().
+"""
+import logging
+import zlib
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from sqlalchemy import inspect, text
+from app import db
+from config import Config
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Key of the PostgreSQL advisory lock held while the schema is upgraded
+MIGRATION_LOCK_KEY = 0x45445331
+
+@contextmanager
+def migration_lock() -> Iterator[None]:
+    """
+    Hold a PostgreSQL advisory lock while creating and upgrading the schema.
+
+    Every process (workers, CLI tools) upgrades the schema when it starts;
+    with the lock the others wait and then find it up to date instead of
+    running the same ALTERs and index builds concurrently. SQLite
+    serialises writers itself.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        yield
+        return
+
+    # A connection of its own: the lock is held across the migrations' transactions
+    with db.engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+        connection.commit()
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
+            connection.commit()
+
+def _index_names(table_name: str) -> set:
+    """Return the names of the indexes that exist on a table."""
+    return {index['name'] for index in inspect(db.engine).get_indexes(table_name)}
+
+def _column_names(table_name: str) -> set:
+    """Return the names of the columns of a table."""
+    return {column['name'] for column in inspect(db.engine).get_columns(table_name)}
+
+def _is_partitioned(table_name: str) -> bool:
+    """Whether a PostgreSQL table is partitioned (its indexes cannot be built CONCURRENTLY)."""
+    with db.engine.connect() as connection:
+        return connection.execute(
+            text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {'name': table_name}
+        ).scalar() == 'p'
+
+def _add_column(table_name: str, column_name: str, column_type: str) -> None:
+    """Add a nullable column to an existing table if it is missing."""
+    if column_name in _column_names(table_name):
+        return
+
+    with db.engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+    logger.info(f"Added column {table_name}.{column_name}")
+
+def _create_index(index_name: str, table_name: str, columns: str, where: Optional[str] = None) -> None:
+    """
+    Create an index on an existing table if it is missing.
+
+    On PostgreSQL the index is built CONCURRENTLY, so ingestion and the web
+    views keep working while a large table is indexed.
+
+    Args:
+        index_name: Name of the index
+        table_name: Table to index
+        columns: Column list as SQL, e.g. "status, event_time DESC"
+        where: Condition for a partial index, as SQL
+    """
+    if index_name in _index_names(table_name):
+        return
+
+    condition = f" WHERE {where}" if where else ""
+    if db.engine.dialect.name == 'postgresql' and not _is_partitioned(table_name):
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {table_name} ({columns}){condition}"
+            ))
+    else:
+        with db.engine.begin() as connection:
+            connection.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns}){condition}"))
+    logger.info(f"Added index {index_name}")
+
+def add_alarm_event_unique_key() -> None:
+    """Remove duplicate (alarm_id, event_time) rows and add the unique key used for dedup."""
+    if 'uq_alarm_event_alarm_id_event_time' in _index_names('alarm_event'):
+        return
+
+    with db.engine.begin() as connection:
+        result = connection.execute(text(
+            "DELETE FROM alarm_event WHERE id NOT IN "
+            "(SELECT MIN(id) FROM alarm_event GROUP BY alarm_id, event_time)"
+        ))
+        logger.info(f"Removed {result.rowcount} duplicate alarm events")
+        connection.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_alarm_event_alarm_id_event_time "
+            "ON alarm_event (alarm_id, event_time)"
+        ))
+    logger.info("Added unique key on alarm_event (alarm_id, event_time)")
+
+def add_notification_digest_support() -> None:
+    """Add the digest payload column and the per-recipient rate cap index to the outbox."""
+    _add_column('notification_outbox', 'digest_payload', 'TEXT')
+    _create_index('ix_notification_outbox_to_number_sent_at', 'notification_outbox', 'to_number, sent_at')
+
+def add_default_alarm_rules() -> None:
+    """Seed the alarm rules that reproduce the former hardcoded alarm filter when there are none."""
+    from models import AlarmRule
+    from alarm_rules import DEFAULT_RULES
+
+    if db.session.query(AlarmRule.id).first() is not None:
+        return
+
+    for rule in DEFAULT_RULES:
+        db.session.add(AlarmRule(**rule))
+    db.session.commit()
+    logger.info(f"Added {len(DEFAULT_RULES)} default alarm rules")
+
+def add_alarm_stats_rollup() -> None:
+    """Fill the per-minute alarm statistics from the alarms stored before the rollup existed."""
+    from models import AlarmEvent, AlarmStatsMinute
+    from alarm_stats import rebuild_rollup
+
+    if db.session.query(AlarmStatsMinute.id).first() is not None:
+        return
+    if db.session.query(AlarmEvent.id).filter(~AlarmEvent.alarm_id.like('SYSTEM-%')).first() is None:
+        return
+
+    rebuild_rollup()
+    db.session.commit()
+
+def add_system_alarm_state() -> None:
+    """
+    Build the system alarm states from the stored system alarm events.
+
+    Before the state table existed every failed poll stored another system
+    alarm event; only the latest one per alarm ID is kept, as the alarm
+    lists used to show, and the others are counted in the state.
+    """
+    from models import AlarmEvent, SystemAlarmState
+
+    if db.session.query(SystemAlarmState.id).first() is not None:
+        return
+
+    summaries = db.session.query(
+        AlarmEvent.alarm_id,
+        db.func.min(AlarmEvent.event_time),
+        db.func.max(AlarmEvent.event_time),
+        db.func.count(AlarmEvent.id)
+    ).filter(AlarmEvent.alarm_id.like('SYSTEM-%')).group_by(AlarmEvent.alarm_id).all()
+
+    for alarm_id, first_seen, last_seen, count in summaries:
+        latest = AlarmEvent.query.filter_by(alarm_id=alarm_id).order_by(
+            AlarmEvent.event_time.desc(), AlarmEvent.id.desc()
+        ).first()
+        db.session.add(SystemAlarmState(
+            alarm_id=alarm_id,
+            description=latest.description,
+            severity=latest.severity,
+            status=latest.status,
+            first_seen=first_seen,
+            last_seen=last_seen,
+            occurrence_count=count,
+            event_id=latest.id
+        ))
+        AlarmEvent.query.filter(
+            AlarmEvent.alarm_id == alarm_id, AlarmEvent.id != latest.id
+        ).delete(synchronize_session=False)
+        logger.info(f"Collapsed {count} {alarm_id} alarm events into its system alarm state")
+
+    db.session.commit()
+
+def add_alarm_event_access_indexes() -> None:
+    """Add the indexes behind the alarm lists: by status, active alarms only, and alarm ID prefixes."""
+    _create_index('ix_alarm_event_status_event_time', 'alarm_event', 'status, event_time DESC, id DESC')
+    _create_index('ix_alarm_event_active_event_time', 'alarm_event', 'event_time DESC, id DESC', where="status = 'ACTIVE'")
+    if db.engine.dialect.name == 'postgresql':
+        _create_index('ix_alarm_event_alarm_id_pattern', 'alarm_event', 'alarm_id text_pattern_ops')
+
+def add_alarm_event_partitioning() -> None:
+    """
+    Partition alarm_event by month on PostgreSQL and create the upcoming partitions.
+
+    Only an empty table is converted automatically; converting one with
+    history copies every row under an exclusive lock, so that is left to
+    `python manage_partitions.py convert`.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+
+    import alarm_partitions
+    from models import AlarmEvent
+
+    if not alarm_partitions.is_partitioned():
+        has_rows = db.session.query(AlarmEvent.id).first() is not None
+        # Release this session's lock on alarm_event before converting it
+        db.session.rollback()
+        if has_rows:
+            logger.warning("alarm_event is not partitioned; run `python manage_partitions.py convert` in a maintenance window")
+            return
+        alarm_partitions.convert_to_partitioned()
+
+    alarm_partitions.ensure_partitions()
+
+def _raw_data_type() -> Optional[str]:
+    """Return the PostgreSQL data type of alarm_event.raw_data."""
+    with db.engine.connect() as connection:
+        return connection.execute(text(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = 'alarm_event' AND column_name = 'raw_data'"
+        )).scalar()
+
+def convert_raw_data_to_jsonb() -> bool:
+    """
+    Convert alarm_event.raw_data from JSON text to JSONB on PostgreSQL.
+
+    Rewrites the whole table holding an exclusive lock on alarm_event, so
+    polling and the web views wait until it is done.
+
+    Returns:
+        False if raw_data was already JSONB
+
+    Raises:
+        RuntimeError: If the database is not PostgreSQL
+    """
+    if db.engine.dialect.name != 'postgresql':
+        raise RuntimeError("JSONB needs PostgreSQL")
+    if _raw_data_type() != 'text':
+        return False
+
+    with db.engine.begin() as connection:
+        connection.execute(text("ALTER TABLE alarm_event ALTER COLUMN raw_data TYPE jsonb USING raw_data::jsonb"))
+    logger.info("Converted alarm_event.raw_data to JSONB")
+    return True
+
+def compact_alarm_raw_data(batch_size: int = 1000) -> None:
+    """
+    Store alarm_event.raw_data compactly: as JSONB on PostgreSQL, as zlib-compressed bytes on SQLite.
+
+    On PostgreSQL only an empty table is converted automatically; converting
+    one with history rewrites it under an exclusive lock, so that is left to
+    `python compact_raw_data.py`. SQLite rows are converted in place in
+    batches; SQLite keeps the column's declared type, which does not
+    restrict what it stores.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        if _raw_data_type() != 'text':
+            return
+
+        from models import AlarmEvent
+
+        has_rows = db.session.query(AlarmEvent.id).first() is not None
+        # Release this session's lock on alarm_event before converting it
+        db.session.rollback()
+        if has_rows:
+            logger.warning("alarm_event.raw_data is stored as text; run `python compact_raw_data.py` in a maintenance window")
+            return
+        convert_raw_data_to_jsonb()
+    elif dialect == 'sqlite':
+        converted = 0
+        while True:
+            rows = db.session.execute(text(
+                "SELECT id, raw_data FROM alarm_event WHERE typeof(raw_data) = 'text' LIMIT :limit"
+            ), {'limit': batch_size}).all()
+            if not rows:
+                break
+            db.session.execute(text("UPDATE alarm_event SET raw_data = :raw_data WHERE id = :id"), [
+                {'id': row_id, 'raw_data': zlib.compress(raw_data.encode('utf-8'))} for row_id, raw_data in rows
+            ])
+            db.session.commit()
+            converted += len(rows)
+        if converted:
+            logger.info(f"Compressed raw_data of {converted} alarm events")
+
+def add_raw_data_key_indexes() -> None:
+    """Index the raw event fields listed in RAW_DATA_INDEX_KEYS (PostgreSQL only)."""
+    if db.engine.dialect.name != 'postgresql':
+        return
+
+    import alarm_queries
+
+    if Config.RAW_DATA_INDEX_KEYS and _raw_data_type() == 'text':
+        logger.warning("Not indexing RAW_DATA_INDEX_KEYS until alarm_event.raw_data is converted to JSONB")
+        return
+
+    for path in Config.RAW_DATA_INDEX_KEYS:
+        if not alarm_queries.RAW_FIELD_PATH.match(path):
+            logger.warning(f"Ignoring invalid RAW_DATA_INDEX_KEYS entry: {path}")
+            continue
+        index_name = f"ix_alarm_event_raw_{path.replace('.', '_')}"[:63]
+        keys = ", ".join(f"'{key}'" for key in ['raw_data'] + path.split('.'))
+        _create_index(index_name, 'alarm_event', f"jsonb_extract_path_text(raw_data, {keys})")
+
+# Applied in order on every start
+MIGRATIONS = [
+    add_alarm_event_unique_key,
+    add_notification_digest_support,
+    add_default_alarm_rules,
+    add_alarm_stats_rollup,
+    add_system_alarm_state,
+    add_alarm_event_access_indexes,
+    add_alarm_event_partitioning,
+    compact_alarm_raw_data,
+    add_raw_data_key_indexes,
+]
+
+def run_migrations() -> None:
+    """Apply all schema upgrades that the database does not have yet."""
+    for migration in MIGRATIONS:
+        migration()
+
+def migrate() -> None:
+    """Create missing tables and upgrade existing ones, one process at a time."""
+    with migration_lock():
+        db.create_all()
+        run_migrations()
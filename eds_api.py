@@ -1,9 +1,17 @@
 import logging
 import requests
 import json
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Any, Union
+from itertools import islice
+from typing import Callable, List, Dict, Iterable, Iterator, Optional, Any, Tuple, Union
+from requests.adapters import HTTPAdapter
+from json_stream import iter_array_items
+import eds_recorder
+import metrics
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -12,6 +20,40 @@ class EDSApiError(Exception):
     """Exception raised for errors in the EDS API interactions."""
     pass
 
+class EDSConnectionError(EDSApiError):
+    """Exception raised when the EDS API cannot be reached or refuses to log us in."""
+    pass
+
+def _timed(path: str, send: Callable[[], requests.Response]) -> requests.Response:
+    """Send a request, recording it in the metrics by endpoint and status."""
+    endpoint = path.split('/api/v1/', 1)[-1]
+    started = time.perf_counter()
+    try:
+        response = send()
+    except requests.RequestException:
+        metrics.observe_eds_request(endpoint, 'error', time.perf_counter() - started)
+        raise
+    metrics.observe_eds_request(endpoint, str(response.status_code), time.perf_counter() - started)
+    return response
+
+def _timed_chunks(chunks: Iterator[bytes], timings: Dict[str, float]) -> Iterator[bytes]:
+    """Pass on the chunks of a response body, adding the time spent waiting for them to timings['read']."""
+    while True:
+        started = time.perf_counter()
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            timings['read'] += time.perf_counter() - started
+        yield chunk
+
+def normalize_base_url(base_url: str) -> str:
+    """Make sure the base URL has a scheme and no trailing slash."""
+    if base_url and not base_url.startswith(('http://', 'https://')):
+        base_url = f"https://{base_url}"
+    return (base_url or '').rstrip('/')
+
 def login(base_url: str, username: str, password: str) -> str:
     """
     Authenticate with the EDS API and get a session token.
@@ -28,18 +70,14 @@ def login(base_url: str, username: str, password: str) -> str:
         EDSApiError: If authentication fails
     """
     try:
-        # Make sure base_url is properly formatted
-        if base_url and not base_url.startswith(('http://', 'https://')):
-            base_url = f"https://{base_url}"
-            
-        url = f"{base_url}/api/v1/login"
+        url = f"{normalize_base_url(base_url)}/api/v1/login"
         payload = {
             "username": username,
             "password": password,
             "type": "alarm-monitor"
         }
         
-        response = requests.post(url, json=payload, timeout=2)
+        response = _timed(url, lambda: requests.post(url, json=payload, timeout=2))
         
         if response.status_code != 200:
             logger.error(f"EDS API login failed: {response.status_code} -     {response.text}")
@@ -68,6 +106,9 @@ def check_connection(base_url: str, username: str, password: str) -> bool:
     """
     Check if we can connect to the EDS API.
     
+    Uses the shared session for these credentials, so once it is logged in
+    this costs a single ping.
+    
     Args:
         base_url: Base URL of the EDS API
         username: EDS API username
@@ -77,24 +118,7 @@ def check_connection(base_url: str, username: str, password: str) -> bool:
         True if connection is successful, False otherwise
     """
     try:
-        # Try to authenticate
-        session_id = login(base_url, username, password)
-        
-        # Ping to verify session
-        url = f"{base_url}/api/v1/ping"
-        headers = {
-            "Authorization": f"Bearer {session_id}"
-        }
-        
-        response = requests.get(url, headers=headers, timeout=2)
-        
-        if response.status_code == 200:
-            # Logout to clean up
-            logout(base_url, session_id)
-            return True
-        
-        return False
-        
+        return get_session(base_url, username, password).ping()
     except Exception as e:
         logger.error(f"Error checking EDS API connection: {str(e)}")
         return False
@@ -111,12 +135,12 @@ def logout(base_url: str, session_id: str) -> bool:
         True if logout was successful, False otherwise
     """
     try:
-        url = f"{base_url}/api/v1/logout"
+        url = f"{normalize_base_url(base_url)}/api/v1/logout"
         headers = {
             "Authorization": f"Bearer {session_id}"
         }
         
-        response = requests.post(url, headers=headers, timeout=2)
+        response = _timed(url, lambda: requests.post(url, headers=headers, timeout=2))
         
         if response.status_code == 200:
             return True
@@ -128,105 +152,456 @@ def logout(base_url: str, session_id: str) -> bool:
         logger.error(f"Error during EDS API logout: {str(e)}")
         return False
 
-def get_alarm_events(
-    base_url: str, 
-    username: str, 
-    password: str, 
-    since_timestamp: Optional[datetime] = None
-) -> List[Dict[str, Any]]:
+def normalize_event(event: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Get alarm events from the EDS API.
-    
+    Convert a raw EDS event into an alarm event.
+
+    Every event is converted; which ones are stored as alarms is decided by
+    the alarm rules (see alarm_rules), which look at the raw event.
+
     Args:
-        base_url: Base URL of the EDS API
-        username: EDS API username
-        password: EDS API password
-        since_timestamp: Get alarms after this timestamp
-        
+        event: Event as returned by /api/v1/events/read
+
     Returns:
-        List of alarm events
-        
-    Raises:
-        EDSApiError: If events retrieval fails
+        The alarm event, with the raw event under 'raw_data'
     """
-    try:
-        # Make sure base_url is properly formatted
-        if base_url and not base_url.startswith(('http://', 'https://')):
-            base_url = f"https://{base_url}"
-            
-        # Authenticate first
-        session_id = login(base_url, username, password)
-        
-        # Prepare request to fetch events
-        url = f"{base_url}/api/v1/events/read"
-        headers = {
-            "Authorization": f"Bearer {session_id}",
-            "Content-Type": "application/json"
+    return {
+        'id': event.get('id', ''),
+        'description': event.get('description', 'Unknown alarm'),
+        'source': event.get('source', 'Unknown'),
+        'timestamp': datetime.fromtimestamp(event.get('timestamp', 0)),
+        'severity': event.get('priority', 'MEDIUM').upper(),
+        'status': event.get('status', 'ACTIVE').upper(),
+        'raw_data': event
+    }
+
+def time_windows(start: datetime, end: datetime, window: timedelta) -> List[Tuple[datetime, datetime]]:
+    """
+    Split a time range into consecutive windows.
+
+    Args:
+        start: Start of the range
+        end: End of the range
+        window: Length of each window (the last one may be shorter)
+
+    Returns:
+        (window start, window end) pairs covering the range, oldest first
+    """
+    windows = []
+    while start < end:
+        windows.append((start, min(start + window, end)))
+        start += window
+    return windows
+
+class EdsSession:
+    """
+    Long-lived client for the EDS API.
+
+    Keeps one keep-alive HTTP connection pool and caches the EDS session id
+    until the server-reported expiry. A new login only happens when the cached
+    session has expired or a request is rejected with 401, so a regular poll
+    costs a single round trip.
+    """
+
+    # Log in again this many seconds before the server-reported expiry
+    EXPIRY_MARGIN = 30
+
+    def __init__(self, base_url: str, username: str, password: str, pool_size: int = 4):
+        self.base_url = normalize_base_url(base_url)
+        self.username = username
+        self.password = password
+
+        self._http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._http.mount('http://', adapter)
+        self._http.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._session_id: Optional[str] = None
+        self._expires_at: Optional[float] = None
+
+    def _login(self) -> None:
+        """Create a new EDS session. Must be called with the lock held."""
+        payload = {
+            "username": self.username,
+            "password": self.password,
+            "type": "alarm-monitor"
         }
-        
+
+        url = f"{self.base_url}/api/v1/login"
+        started = time.perf_counter()
+        try:
+            response = _timed(url, lambda: self._http.post(url, json=payload, timeout=2))
+        except requests.RequestException as e:
+            logger.error(f"EDS API request error during login: {str(e)}")
+            raise EDSConnectionError(f"Request error: {str(e)}")
+
+        if response.status_code != 200:
+            logger.error(f"EDS API login failed: {response.status_code} - {response.text}")
+            raise EDSConnectionError(f"Login failed with status code {response.status_code}")
+
+        try:
+            data = response.json()
+        except ValueError as e:
+            logger.error(f"EDS API JSON decode error during login: {str(e)}")
+            raise EDSConnectionError(f"JSON decode error: {str(e)}")
+
+        session_id = data.get('sessionId')
+        if not session_id:
+            logger.error(f"EDS API login failed: No session ID returned - {response.text}")
+            raise EDSConnectionError("Login failed: No session ID returned")
+
+        metrics.add_stage(metrics.STAGE_LOGIN, time.perf_counter() - started)
+        expires = data.get('expires')
+        self._session_id = session_id
+        self._expires_at = float(expires) - self.EXPIRY_MARGIN if expires else None
+        logger.info(f"Logged in to EDS API at {self.base_url}")
+
+    def _get_session_id(self) -> str:
+        """Return a valid session id, logging in if there is none or it has expired."""
+        with self._lock:
+            if self._session_id and (self._expires_at is None or time.time() < self._expires_at):
+                return self._session_id
+            self._login()
+            return self._session_id
+
+    def _invalidate(self, session_id: str) -> None:
+        """Forget a session id the server has rejected (unless another thread already replaced it)."""
+        with self._lock:
+            if self._session_id == session_id:
+                self._session_id = None
+                self._expires_at = None
+
+    def request(self, method: str, path: str, timeout: float = 5, **kwargs) -> requests.Response:
+        """
+        Send an authenticated request, re-authenticating once on 401.
+
+        Args:
+            method: HTTP method
+            path: API path, e.g. "/api/v1/ping"
+            timeout: Request timeout in seconds
+            **kwargs: Passed through to requests
+
+        Returns:
+            The HTTP response
+
+        Raises:
+            EDSConnectionError: If the API cannot be reached or login fails
+        """
+        url = f"{self.base_url}{path}"
+
+        for attempt in range(2):
+            session_id = self._get_session_id()
+            headers = {"Authorization": f"Bearer {session_id}"}
+
+            try:
+                response = _timed(path, lambda: self._http.request(method, url, headers=headers, timeout=timeout, **kwargs))
+            except requests.RequestException as e:
+                logger.error(f"EDS API request error for {path}: {str(e)}")
+                raise EDSConnectionError(f"Request error: {str(e)}")
+
+            if response.status_code != 401:
+                return response
+
+            logger.info(f"EDS API session rejected for {path}, logging in again")
+            response.close()
+            self._invalidate(session_id)
+
+        return response
+
+    def ping(self) -> bool:
+        """
+        Verify the session with the EDS API.
+
+        Returns:
+            True if the API answered the ping, False otherwise
+        """
+        try:
+            response = self.request('GET', '/api/v1/ping', timeout=2)
+            return response.status_code == 200
+        except EDSApiError as e:
+            logger.error(f"Error checking EDS API connection: {str(e)}")
+            return False
+
+    def _request_events(
+        self,
+        since_timestamp: Optional[datetime] = None,
+        until_timestamp: Optional[datetime] = None,
+        page: Optional[int] = None,
+        page_size: Optional[int] = None
+    ) -> Tuple[requests.Response, Optional[eds_recorder.Recording]]:
+        """Send an events read request and check its status, leaving the body unread; returns the response and its recording."""
         # Prepare payload with filters
         payload = {
             "filters": []
         }
-        
+
         # Add timestamp filter if provided
         if since_timestamp:
             timestamp_unix = int(since_timestamp.timestamp())
             logger.info(f"Checking for alarms since timestamp: {since_timestamp} (Unix: {timestamp_unix})")
+            ts_filter = {
+                "from": timestamp_unix
+            }
+            if until_timestamp:
+                ts_filter["till"] = int(until_timestamp.timestamp())
             payload["filters"].append({
-                "ts": {
-                    "from": timestamp_unix
-                }
+                "ts": ts_filter
             })
         else:
             logger.info("No timestamp filter provided, retrieving all events")
-        
+
+        if page_size:
+            payload["page"] = page
+            payload["pagesize"] = page_size
+
         # Request events
-        response = requests.post(url, headers=headers, json=payload, timeout=5)
-        
+        response = self.request('POST', '/api/v1/events/read', json=payload, timeout=5, stream=True)
+        recording = eds_recorder.start(payload, response.status_code, response.elapsed.total_seconds())
+
         if response.status_code != 200:
             logger.error(f"EDS API events retrieval failed: {response.status_code} - {response.text}")
+            response.close()
+            if recording:
+                recording.end(f"Status code {response.status_code}")
             raise EDSApiError(f"Events retrieval failed with status code {response.status_code}")
-        
+
+        return response, recording
+
+    def iter_events(
+        self,
+        since_timestamp: Optional[datetime] = None,
+        until_timestamp: Optional[datetime] = None,
+        page_size: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream alarm events from the EDS API.
+
+        The first request is sent and its status checked straight away; the
+        body is then parsed incrementally as it downloads, so memory use does
+        not grow with the number of events returned.
+
+        Args:
+            since_timestamp: Get alarms at or after this timestamp
+            until_timestamp: Get alarms at or before this timestamp (only with since_timestamp)
+            page_size: Read the events in pages of this size (None for a single request)
+
+        Returns:
+            Iterator over normalised events, not yet classified (see alarm_rules)
+
+        Raises:
+            EDSConnectionError: If the API cannot be reached, or the body
+                cannot be read or parsed (also raised while iterating)
+            EDSApiError: If events retrieval fails (also raised while iterating)
+        """
+        response, recording = self._request_events(since_timestamp, until_timestamp, 1 if page_size else None, page_size)
+        if not page_size:
+            return self._iter_response_events(response, recording, {})
+        return self._iter_pages(response, recording, since_timestamp, until_timestamp, page_size)
+
+    def _iter_pages(
+        self,
+        response: requests.Response,
+        recording: Optional[eds_recorder.Recording],
+        since_timestamp: Optional[datetime],
+        until_timestamp: Optional[datetime],
+        page_size: int
+    ) -> Iterator[Dict[str, Any]]:
+        page = 1
+        while True:
+            counts: Dict[str, int] = {}
+            yield from self._iter_response_events(response, recording, counts)
+            # A short page is the last one
+            if counts['received'] < page_size:
+                return
+            page += 1
+            response, recording = self._request_events(since_timestamp, until_timestamp, page, page_size)
+
+    def _iter_response_events(
+        self,
+        response: requests.Response,
+        recording: Optional[eds_recorder.Recording],
+        counts: Dict[str, int]
+    ) -> Iterator[Dict[str, Any]]:
+        counts['received'] = 0
+        error = None
+        # Time spent in here is waiting for the body or parsing and normalising it
+        timings = {'read': 0.0}
+        busy = 0.0
         try:
-            data = response.json()
-            events = data.get('events', [])
-            
-            logger.info(f"Received {len(events)} events from EDS API")
-            
-            # Process events to extract alarm information
-            alarm_events = []
-            for event in events:
-                # Look for alarm events only
-                if 'alarm' in event.get('type', '').lower() or event.get('priority', '').upper() in ['HIGH', 'CRITICAL']:
-                    alarm_event = {
-                        'id': event.get('id', ''),
-                        'description': event.get('description', 'Unknown alarm'),
-                        'source': event.get('source', 'Unknown'),
-                        'timestamp': datetime.fromtimestamp(event.get('timestamp', 0)),
-                        'severity': event.get('priority', 'MEDIUM').upper(),
-                        'status': event.get('status', 'ACTIVE').upper(),
-                        'raw_data': event
-                    }
-                    alarm_events.append(alarm_event)
-            
-            logger.info(f"Extracted {len(alarm_events)} alarm events from response")
-            
-            # Clean up the session
-            logout(base_url, session_id)
-            
-            return alarm_events
-            
-        except json.JSONDecodeError as e:
+            started = time.perf_counter()
+            for event in iter_array_items(_timed_chunks(response.iter_content(chunk_size=65536), timings), 'events'):
+                counts['received'] += 1
+                if recording:
+                    recording.event(event)
+                alarm = normalize_event(event)
+                busy += time.perf_counter() - started
+                yield alarm
+                started = time.perf_counter()
+            busy += time.perf_counter() - started
+        except ValueError as e:
+            # Mostly a body cut off when the connection dropped
             logger.error(f"EDS API JSON decode error for events: {str(e)}")
-            raise EDSApiError(f"JSON decode error: {str(e)}")
-        
-        
+            error = f"JSON decode error: {str(e)}"
+            raise EDSConnectionError(error)
+        except requests.RequestException as e:
+            logger.error(f"EDS API request error while reading events: {str(e)}")
+            error = f"Request error: {str(e)}"
+            raise EDSConnectionError(error)
+        finally:
+            response.close()
+            if recording:
+                recording.end(error)
+            metrics.add_stage(metrics.STAGE_READ, response.elapsed.total_seconds() + timings['read'])
+            metrics.add_stage(metrics.STAGE_NORMALISE, max(busy - timings['read'], 0.0))
+
+        logger.info(f"Received {counts['received']} events from EDS API")
+
+    def _fetch_window(self, start: datetime, end: datetime, page_size: Optional[int]) -> List[Dict[str, Any]]:
+        # EDS timestamps are whole seconds and the filter is inclusive at both ends
+        return list(self.iter_events(start, end - timedelta(seconds=1), page_size))
+
+    def fetch_windows(
+        self,
+        windows: Iterable[Tuple[datetime, datetime]],
+        max_workers: int,
+        page_size: Optional[int] = None
+    ) -> Iterator[Tuple[datetime, datetime, List[Dict[str, Any]]]]:
+        """
+        Fetch the alarm events of several time windows concurrently.
+
+        At most max_workers windows are in flight at once. Results are yielded
+        in window order, so a caller that stores each window before taking the
+        next one always has a contiguous range stored.
+
+        Args:
+            windows: (start, end) pairs, see time_windows()
+            max_workers: Number of windows fetched in parallel
+            page_size: Page size for each window's request, see iter_events()
+
+        Returns:
+            Iterator over (start, end, alarm events) per window
+        """
+        windows = iter(windows)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='eds-backfill') as executor:
+            pending = deque()
+
+            def submit_next() -> None:
+                for start, end in islice(windows, 1):
+                    pending.append((start, end, executor.submit(self._fetch_window, start, end, page_size)))
+
+            for _ in range(max_workers):
+                submit_next()
+
+            while pending:
+                start, end, future = pending.popleft()
+                try:
+                    alarms = future.result()
+                except Exception:
+                    for _, _, other in pending:
+                        other.cancel()
+                    raise
+                submit_next()
+                yield start, end, alarms
+
+    def read_events(self, since_timestamp: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Get alarm events from the EDS API as a list.
+
+        Args:
+            since_timestamp: Get alarms after this timestamp
+
+        Returns:
+            List of alarm events
+
+        Raises:
+            EDSConnectionError: If the API cannot be reached
+            EDSApiError: If events retrieval fails
+        """
+        return list(self.iter_events(since_timestamp))
+
+    def close(self) -> None:
+        """Log out of the EDS API and release pooled connections."""
+        with self._lock:
+            session_id = self._session_id
+            self._session_id = None
+            self._expires_at = None
+
+        if session_id:
+            url = f"{self.base_url}/api/v1/logout"
+            try:
+                _timed(url, lambda: self._http.post(url, headers={"Authorization": f"Bearer {session_id}"}, timeout=2))
+            except requests.RequestException as e:
+                logger.warning(f"Error during EDS API logout: {str(e)}")
+
+        self._http.close()
+
+# Shared sessions keyed by (base URL, username), used by both the scheduler and web routes
+_sessions: Dict[Tuple[str, str], EdsSession] = {}
+_sessions_lock = threading.Lock()
+
+def get_session(base_url: str, username: str, password: str) -> EdsSession:
+    """
+    Get the shared EDS session for a set of credentials, creating it if needed.
+
+    Args:
+        base_url: Base URL of the EDS API
+        username: EDS API username
+        password: EDS API password
+
+    Returns:
+        The shared EdsSession
+    """
+    key = (normalize_base_url(base_url), username)
+    stale = None
+
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is not None and session.password != password:
+            stale, session = session, None
+        if session is None:
+            session = EdsSession(base_url, username, password)
+            _sessions[key] = session
+
+    if stale is not None:
+        stale.close()
+
+    return session
+
+def reset_sessions() -> None:
+    """Close all shared sessions, e.g. after the EDS credentials have changed."""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+
+    for session in sessions:
+        session.close()
+
+def get_alarm_events(
+    base_url: str,
+    username: str,
+    password: str,
+    since_timestamp: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """
+    Get alarm events from the EDS API using the shared session.
+
+    Args:
+        base_url: Base URL of the EDS API
+        username: EDS API username
+        password: EDS API password
+        since_timestamp: Get alarms after this timestamp
+
+    Returns:
+        List of alarm events
+
+    Raises:
+        EDSApiError: If events retrieval fails
+    """
+    try:
+        return get_session(base_url, username, password).read_events(since_timestamp)
     except EDSApiError:
         raise
-    except requests.RequestException as e:
-        logger.error(f"EDS API request error during events retrieval: {str(e)}")
-        raise EDSApiError(f"Request error: {str(e)}")
     except Exception as e:
         logger.error(f"Unexpected error during EDS API events retrieval: {str(e)}")
         raise EDSApiError(f"Unexpected error: {str(e)}")
@@ -0,0 +1,80 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, List, Dict, Any, Optional
+from app import db
+from config import Config
+from alarm_ingest import ingest_alarms, chunked
+import eds_api
+import poll_cursor
+from alarm_rules import RuleMatcher
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Cursor used by the command line backfill, separate from regular polling
+BACKFILL_CURSOR = 'eds_backfill'
+
+def backfill(
+    session: eds_api.EdsSession,
+    start: datetime,
+    end: datetime,
+    cursor_name: str,
+    matcher: RuleMatcher,
+    on_new_alarms: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    on_window_committed: Optional[Callable[[], None]] = None
+) -> int:
+    """
+    Read a range of EDS history window by window and store it.
+
+    Windows of BACKFILL_WINDOW_SECONDS are fetched BACKFILL_MAX_WORKERS at a
+    time and stored oldest first. Each window is committed together with the
+    cursor, so an interrupted backfill resumes after the last completed window.
+
+    Args:
+        session: EDS session to read with
+        start: Start of the range
+        end: End of the range
+        cursor_name: Poll cursor that records progress
+        matcher: Alarm rules deciding which events are stored
+        on_new_alarms: Called with the newly stored alarms of each batch,
+            before the window is committed; what it adds to the session is
+            committed with the window
+        on_window_committed: Called after each window is committed, e.g. to
+            publish its alarms
+
+    Returns:
+        Number of new alarms stored
+
+    Raises:
+        EDSApiError: If a window cannot be read; completed windows stay stored
+    """
+    windows = eds_api.time_windows(start, end, timedelta(seconds=Config.BACKFILL_WINDOW_SECONDS))
+    logger.info(f"Backfilling EDS events from {start} to {end} in {len(windows)} windows")
+
+    new_count = 0
+    for window_start, window_end, alarms in session.fetch_windows(
+        windows, Config.BACKFILL_MAX_WORKERS, Config.EDS_PAGE_SIZE or None
+    ):
+        for batch in chunked(alarms, Config.INGEST_BATCH_SIZE):
+            new_alarms = ingest_alarms(matcher.classify(batch))
+            new_count += len(new_alarms)
+            if on_new_alarms:
+                on_new_alarms(new_alarms)
+
+        poll_cursor.advance_cursor(alarms, cursor_name)
+        poll_cursor.advance_to(window_end - timedelta(seconds=1), cursor_name)
+        db.session.commit()
+        if on_window_committed:
+            on_window_committed()
+        logger.info(f"Backfilled window {window_start} - {window_end}: {len(alarms)} alarms")
+
+    return new_count
+
+def needs_backfill(last_timestamp: Optional[datetime], now: datetime) -> bool:
+    """Whether polling is far enough behind that a single events request could time out."""
+    return last_timestamp is None or now - last_timestamp > timedelta(seconds=Config.BACKFILL_THRESHOLD_SECONDS)
+
+def backfill_start(last_timestamp: Optional[datetime], now: datetime) -> datetime:
+    """Where catching up starts: the cursor, but never more than BACKFILL_MAX_DAYS back."""
+    earliest = now - timedelta(days=Config.BACKFILL_MAX_DAYS)
+    return max(last_timestamp, earliest) if last_timestamp else earliest
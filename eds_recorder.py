@@ -0,0 +1,167 @@
+"""
+Recording of the EDS events traffic, for replay.
+
+When EDS_RECORD_DIR is set, every /api/v1/events/read response eds_api
+receives is written, raw and with its timing, to gzip-compressed NDJSON
+segment files named eds-YYYYMMDD-HHMMSS-<pid>.ndjson.gz; a new segment
+starts every EDS_RECORD_SEGMENT_SECONDS. A response is recorded as
+
+    {"kind": "response", "id", "sent_at", "payload", "status", "headers_seconds"}
+    {"kind": "event", "id", "offset", "event"}   one per raw event, as received
+    {"kind": "end", "id", "events", "seconds", "error"}
+
+with sent_at a UTC unix time and offsets in seconds since the request was
+sent. Lines of concurrent responses (backfill windows) interleave and a
+response may continue in the next segment; the id tells them apart.
+read_responses() puts them back together and replay_traffic.py feeds them
+through the pipeline again.
+"""
+import atexit
+import glob
+import gzip
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from config import Config
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SEGMENT_PATTERN = 'eds-*.ndjson.gz'
+
+_lock = threading.Lock()
+_segment = None
+_segment_started = 0.0
+_ids = itertools.count(1)
+
+def _write(line: Dict[str, Any]) -> None:
+    """Append a line to the current segment, starting a new one when it is due."""
+    global _segment, _segment_started
+    data = (json.dumps(line, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+    with _lock:
+        now = time.time()
+        if _segment is not None and now - _segment_started >= Config.EDS_RECORD_SEGMENT_SECONDS:
+            _segment.close()
+            _segment = None
+        if _segment is None:
+            os.makedirs(Config.EDS_RECORD_DIR, exist_ok=True)
+            name = f"eds-{datetime.utcnow():%Y%m%d-%H%M%S}-{os.getpid()}.ndjson.gz"
+            _segment = gzip.open(os.path.join(Config.EDS_RECORD_DIR, name), 'ab')
+            _segment_started = now
+            logger.info(f"Recording EDS events responses to {name}")
+        _segment.write(data)
+
+@atexit.register
+def close() -> None:
+    """Finish the current segment, so it can be read to the end."""
+    global _segment
+    with _lock:
+        if _segment is not None:
+            _segment.close()
+            _segment = None
+
+class Recording:
+    """The recording of one events response; add its raw events as they are parsed."""
+
+    def __init__(self, payload: Dict[str, Any], status: int, headers_seconds: float):
+        # Ids are unique across the processes writing to one directory
+        self.id = f"{os.getpid()}-{next(_ids)}"
+        self.events = 0
+        self._started = time.perf_counter() - headers_seconds
+        _write({
+            'kind': 'response',
+            'id': self.id,
+            'sent_at': round(time.time() - headers_seconds, 6),
+            'payload': payload,
+            'status': status,
+            'headers_seconds': round(headers_seconds, 6),
+        })
+
+    def event(self, event: Dict[str, Any]) -> None:
+        self.events += 1
+        _write({'kind': 'event', 'id': self.id, 'offset': round(time.perf_counter() - self._started, 6), 'event': event})
+
+    def end(self, error: Optional[str] = None) -> None:
+        _write({
+            'kind': 'end',
+            'id': self.id,
+            'events': self.events,
+            'seconds': round(time.perf_counter() - self._started, 6),
+            'error': error,
+        })
+
+def start(payload: Dict[str, Any], status: int, headers_seconds: float) -> Optional[Recording]:
+    """
+    Start recording an events response, if recording is enabled.
+
+    Args:
+        payload: The events read request body
+        status: HTTP status of the response
+        headers_seconds: Time from sending the request until the response headers arrived
+
+    Returns:
+        The Recording, or None if EDS_RECORD_DIR is not set
+    """
+    if not Config.EDS_RECORD_DIR:
+        return None
+    try:
+        return Recording(payload, status, headers_seconds)
+    except OSError as e:
+        # Recording must never break polling
+        logger.error(f"Error recording EDS events response: {str(e)}")
+        return None
+
+def segment_files(paths: Iterable[str]) -> List[str]:
+    """Segment files from a list of files and directories, in the order they were written."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, SEGMENT_PATTERN)))
+        else:
+            files.append(path)
+    return sorted(files, key=os.path.basename)
+
+def _lines(path: str) -> Iterable[Dict[str, Any]]:
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    except (EOFError, gzip.BadGzipFile, json.JSONDecodeError) as e:
+        # The process writing the segment was killed; keep what was complete
+        logger.warning(f"Segment {path} ends early ({str(e)}), replaying what was recorded")
+
+def read_responses(paths: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Read recorded responses back, ordered by the time their request was sent.
+
+    Args:
+        paths: Segment files and directories holding them
+
+    Returns:
+        Responses as their 'response' line plus 'events' (a list of
+        (offset, raw event) pairs) and the 'seconds' and 'error' of their
+        'end' line; a response whose end was not recorded has the error
+        'incomplete recording'
+    """
+    responses: Dict[str, Dict[str, Any]] = {}
+    for path in segment_files(paths):
+        for line in _lines(path):
+            kind = line.pop('kind')
+            if kind == 'response':
+                responses[line['id']] = {**line, 'events': [], 'seconds': None, 'error': 'incomplete recording'}
+                continue
+            response = responses.get(line['id'])
+            if response is None:
+                continue
+            if kind == 'event':
+                response['events'].append((line['offset'], line['event']))
+            elif kind == 'end':
+                response['seconds'] = line['seconds']
+                response['error'] = line['error']
+    return sorted(responses.values(), key=lambda response: response['sent_at'])
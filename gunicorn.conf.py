@@ -0,0 +1,39 @@
+"""
+Gunicorn settings, read automatically from the working directory.
+
+The workers share their Prometheus metrics through files in
+PROMETHEUS_MULTIPROC_DIR (see metrics), which is emptied when gunicorn
+starts so that counters do not carry over from a previous run.
+
+Workers are threaded: every open dashboard or alarm list keeps a
+/api/stream request running for up to STREAM_MAX_SECONDS, which would hold
+a whole sync worker and block every other request it should serve.
+
+The database schema is created and upgraded once, by migrate.py before the
+workers start, instead of by every worker as it boots.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "16"))
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "eds-alarm-monitor-metrics"))
+
+def on_starting(server):
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+    # In a process of its own: modules imported by the master would be
+    # inherited by the workers and not reloaded with --reload
+    subprocess.run([sys.executable, "migrate.py"], cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    os.environ["RUN_MIGRATIONS"] = "False"
+
+def child_exit(server, worker):
+    # Drop the gauges of the exited worker
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,116 @@
+"""
+Incremental JSON parsing for large API responses.
+
+Parses the elements of one array inside a top-level JSON object while the
+body is still downloading, so only a single element is held in memory at a
+time instead of the whole document.
+"""
+import codecs
+import json
+from typing import Any, Iterable, Iterator, Union
+
+WHITESPACE = ' \t\n\r'
+NUMBER_CHARS = '0123456789.eE+-'
+
+class _Buffer:
+    """Text buffer over an iterable of byte (or str) chunks."""
+
+    def __init__(self, chunks: Iterable[Union[bytes, str]]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Read another chunk, dropping consumed text. Returns False at end of input."""
+        if self.eof:
+            return False
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.eof = True
+            chunk = b''
+        if isinstance(chunk, bytes):
+            chunk = self._decoder.decode(chunk, final=self.eof)
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it ('' at end of input)."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars: str) -> str:
+        """Consume one of the given characters, raising ValueError otherwise."""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {self.pos}, got {char!r}")
+        self.pos += 1
+        return char
+
+    def _number_continues(self, end: int) -> bool:
+        """Whether everything after a decoded number up to the end of the buffer could still be part of it."""
+        return all(char in NUMBER_CHARS for char in self.text[end:])
+
+    def value(self, decoder: json.JSONDecoder) -> Any:
+        """Decode the next complete JSON value, reading more input as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+                # A number may continue in the next chunk: 12. or 1e decode
+                # as 12 and 1 when the chunk ends after the . or e
+                if self.eof or not (self.text[self.pos] in NUMBER_CHARS and self._number_continues(end)):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+def iter_array_items(chunks: Iterable[Union[bytes, str]], key: str) -> Iterator[Any]:
+    """
+    Yield the elements of the array stored under `key` in a top-level JSON object.
+
+    Other members of the object are parsed and skipped. If the key is missing
+    nothing is yielded.
+
+    Args:
+        chunks: The response body as an iterable of chunks
+        key: Name of the array member
+
+    Raises:
+        ValueError: If the body is not valid JSON (json.JSONDecodeError is a subclass)
+    """
+    buffer = _Buffer(chunks)
+    decoder = json.JSONDecoder()
+
+    buffer.expect('{')
+    if buffer.peek() == '}':
+        return
+
+    while True:
+        name = buffer.value(decoder)
+        buffer.expect(':')
+
+        if name == key and buffer.peek() == '[':
+            buffer.expect('[')
+            if buffer.peek() == ']':
+                buffer.expect(']')
+            else:
+                while True:
+                    yield buffer.value(decoder)
+                    if buffer.expect(',]') == ']':
+                        break
+        else:
+            buffer.value(decoder)
+
+        if buffer.expect(',}') == '}':
+            return
@@ -0,0 +1,36 @@
+import argparse
+from datetime import datetime, timedelta
+from app import app, db
+import alarm_trace
+
+def print_latency_report(hours, severity, max_seconds):
+    with app.app_context():
+        try:
+            report = alarm_trace.latency_report(datetime.utcnow() - timedelta(hours=hours), severity=severity)
+            print(f"{report['alarms']} {report['severity'] or ''} alarms from {report['since']} to {report['until']} (UTC)")
+            print(f"{'hop':<10}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+            for name, hop in report['hops'].items():
+                values = "".join(f"{hop[key] if hop[key] is not None else '-':>10}" for key in ('p50', 'p95', 'p99', 'max'))
+                print(f"{name:<10}{hop['count']:>8}{values}")
+
+            if max_seconds is not None:
+                total = report['hops']['total']
+                if total['p99'] is not None and total['p99'] > max_seconds:
+                    print(f"FAIL: p99 from EDS event to SMS is {total['p99']}s, over {max_seconds}s")
+                    return False
+                print(f"OK: p99 from EDS event to SMS is within {max_seconds}s")
+            return True
+        except Exception as e:
+            print(f"Error building latency report: {e}")
+            db.session.rollback()
+            return False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report p50/p95/p99 latencies from EDS event to SMS per hop")
+    parser.add_argument("--hours", type=float, default=24, help="report on the alarms of the last N hours (default: 24)")
+    parser.add_argument("--severity", help="only alarms of this severity, e.g. CRITICAL")
+    parser.add_argument("--max-seconds", type=float, help="exit with status 1 if the end-to-end p99 is above this")
+    args = parser.parse_args()
+
+    if not print_latency_report(args.hours, args.severity, args.max_seconds):
+        raise SystemExit(1)
@@ -1,13 +1,34 @@
+import atexit
 import logging
 from dotenv import load_dotenv
 from app import app
-from models import db, ApiCredential, ContactNumber, AlarmEvent
+from config import Config
+from models import db, ApiCredential, ContactNumber, AlarmEvent, AlarmRule, SystemAlarmState
 import eds_api
 import notification_service
-from flask import render_template, redirect, url_for, request, flash, jsonify
+from alarm_ingest import ingest_alarms, chunked
+import poll_cursor
+import notification_outbox
+import notification_digest
+import eds_backfill
+import alarm_rules
+import alarm_stats
+import alarm_queries
+import alarm_partitions
+import alarm_stream
+import data_versions
+import scheduler_leader
+import metrics
+import alarm_trace
+import alarm_reset
+from status_monitor import StatusMonitor, probe
+from poll_schedule import AdaptivePollSchedule
+import poll_schedule
+from flask import render_template, redirect, url_for, request, flash, jsonify, Response
 from flask_apscheduler import APScheduler
+from sqlalchemy.exc import IntegrityError
+from collections import Counter
 import datetime
-import json
 
 # Load environment variables from .env file
 load_dotenv()
@@ -16,10 +37,35 @@ load_dotenv()
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Initialize scheduler
+# Record the latency of every route
+metrics.init_app(app)
+
+# Initialize scheduler; every process runs one, but the jobs that call EDS
+# and Twilio only run in the scheduler leader (see scheduler_leader)
 scheduler = APScheduler()
 scheduler.init_app(app)
-scheduler.start()
+if Config.SCHEDULER_ENABLED:
+    scheduler.start()
+
+def publish_status(name, status):
+    """Send the new connection status to the live pages."""
+    alarm_stream.publish(alarm_stream.EVENT_STATUS, status_monitor.snapshot())
+
+# Connection status shared by the prober job, check_alarms and the web routes
+status_monitor = StatusMonitor(ttl=Config.STATUS_CACHE_TTL, on_change=publish_status)
+
+# Chooses the delay after each scheduled alarm check
+alarm_check_schedule = AdaptivePollSchedule(
+    base=Config.ALARM_CHECK_INTERVAL,
+    backoff_max=Config.POLL_BACKOFF_MAX,
+    jitter=Config.POLL_BACKOFF_JITTER,
+    breaker_threshold=Config.POLL_BREAKER_THRESHOLD,
+    breaker_cooldown=Config.POLL_BREAKER_COOLDOWN,
+    burst_interval=Config.POLL_BURST_INTERVAL,
+    burst_seconds=Config.POLL_BURST_SECONDS,
+    burst_severities=Config.POLL_BURST_SEVERITIES,
+    on_decision=metrics.observe_poll_decision
+)
 
 def get_credentials(api_type):
     """Retrieve API credentials from the database."""
@@ -30,244 +76,362 @@ def get_active_contacts():
     return ContactNumber.query.filter_by(active=True).all()
 
 
-def datetime_converter(o):
-    if isinstance(o, datetime.datetime):
-        return o.isoformat()
-    raise TypeError("Object of type '%s' is not JSON serializable" % type(o).__name__)
+def _lock_system_alarm_state(alarm_id, description, severity):
+    """Load and lock a system alarm's state, creating it (cleared) on first use."""
+    query = SystemAlarmState.query.filter_by(alarm_id=alarm_id).populate_existing().with_for_update()
+    state = query.first()
+    if state is not None:
+        return state
 
+    now = datetime.datetime.now()
+    try:
+        with db.session.begin_nested():
+            state = SystemAlarmState(
+                alarm_id=alarm_id, description=description, severity=severity,
+                status="CLEARED", first_seen=now, last_seen=now, occurrence_count=0
+            )
+            db.session.add(state)
+        return state
+    except IntegrityError:
+        # Another worker created it first
+        return query.first()
 
 def create_system_alarm(alarm_id, description, severity="HIGH"):
-    """Create a system alarm event."""
-    system_alarm = AlarmEvent(
-        alarm_id=alarm_id,
-        description=description,
-        source="Alarm Monitor System",
-        event_time=datetime.datetime.now(),
-        severity=severity,
-        status="ACTIVE",
-        raw_data=json.dumps({"message": description, "type": "system"}, default=datetime_converter)
-    )
-    db.session.add(system_alarm)
+    """
+    Record an occurrence of a system alarm.
+
+    The first occurrence after the alarm was cleared starts a new episode and
+    stores one alarm event for it. Further occurrences only update the
+    alarm's SystemAlarmState, so an outage adds one row, not one per poll.
+
+    Returns:
+        The SystemAlarmState; occurrence_count is 1 when a new episode started
+    """
+    now = datetime.datetime.now()
+    state = _lock_system_alarm_state(alarm_id, description, severity)
+
+    if state.status == "ACTIVE":
+        state.occurrence_count += 1
+        state.last_seen = now
+        state.description = description
+        AlarmEvent.query.filter_by(id=state.event_id).update({AlarmEvent.description: description})
+    else:
+        system_alarm = AlarmEvent(
+            alarm_id=alarm_id,
+            description=description,
+            source="Alarm Monitor System",
+            event_time=now,
+            severity=severity,
+            status="ACTIVE",
+            raw_data={"message": description, "type": "system"}
+        )
+        db.session.add(system_alarm)
+        db.session.flush()
+
+        state.description = description
+        state.severity = severity
+        state.status = "ACTIVE"
+        state.first_seen = now
+        state.last_seen = now
+        state.occurrence_count = 1
+        state.event_id = system_alarm.id
+
+    data_versions.bump(data_versions.ALARMS)
     db.session.commit()
-    return system_alarm
+    if state.occurrence_count == 1:
+        alarm_stream.publish_alarms([alarm_to_dict(system_alarm)])
+    return state
+
+def clear_system_alarm(alarm_id):
+    """
+    Clear an active system alarm and the alarm event of its episode.
+
+    Returns:
+        True if the alarm was active
+    """
+    state = SystemAlarmState.query.filter_by(alarm_id=alarm_id, status="ACTIVE").first()
+    if state is None:
+        return False
+
+    state.status = "CLEARED"
+    AlarmEvent.query.filter_by(id=state.event_id).update({AlarmEvent.status: "CLEARED"})
+    data_versions.bump(data_versions.ALARMS)
+    db.session.commit()
+    alarm_stream.publish(alarm_stream.EVENT_CLEARED, {'alarm_id': alarm_id})
+    return True
 
-def send_sms_notifications(contacts, message, twilio_creds):
-    """Send SMS notifications to contacts."""
-    for contact in contacts:
-        try:
-            notification_service.send_sms(
-                twilio_creds.username,  # Account SID
-                twilio_creds.api_key,   # Auth Token
-                twilio_creds.api_secret,  # Twilio Phone Number
-                contact.phone_number,
-                message
-            )
-            logger.info(f"Notification sent to {contact.phone_number}")
-        except Exception as e:
-            logger.error(f"Failed to send SMS to {contact.phone_number}: {str(e)}")
+def queue_sms_notifications(contacts, message):
+    """Queue SMS notifications to contacts; the outbox worker sends them."""
+    notification_outbox.enqueue([contact.phone_number for contact in contacts], message)
+    db.session.commit()
+
+def collect_notifications(summary, alarms):
+    """Add the alarms whose rule asks for notifications to a digest summary."""
+    notify_alarms = [alarm for alarm in alarms if alarm.get('notify')]
+    notification_digest.merge(summary, notification_digest.summarize(notify_alarms))
+
+def collect_stream_alarms(stream_alarms, alarms):
+    """Add newly stored alarms to the list sent to the live pages, keeping one more than the stream sends."""
+    for alarm in alarms[:Config.STREAM_MAX_ALARMS + 1 - len(stream_alarms)]:
+        stream_alarms.append({
+            'id': alarm['event_id'],
+            'alarm_id': alarm['id'],
+            'description': alarm['description'],
+            'source': alarm['source'],
+            'event_time': alarm['timestamp'].isoformat(),
+            'severity': alarm['severity'],
+            'status': alarm['status']
+        })
+
+def collect_new_alarms(notify_summary, stream_alarms, severities, alarms):
+    """Collect newly stored alarms for the notification digest, the live pages and the per-severity counts."""
+    collect_notifications(notify_summary, alarms)
+    collect_stream_alarms(stream_alarms, alarms)
+    severities.update(alarm['severity'] for alarm in alarms)
+
+def eds_offline(error, contacts):
+    """Record a failed connection to EDS, notifying once per outage; returns the poll outcome."""
+    logger.error(f"EDS API connection failed: {str(error)}")
+    status_monitor.update('eds', "Failed")
+    system_alarm = create_system_alarm("SYSTEM-EDS-OFFLINE", "EDS API Connection Failed")
+    # Notify once per outage, not on every failed poll
+    if system_alarm.occurrence_count == 1:
+        queue_sms_notifications(contacts, "ALARM: EDS API is offline - Monitoring System - HIGH")
+    return poll_schedule.OUTCOME_FAILED
 
 def check_alarms():
-    """Check for new alarms from EDS API and send notifications."""
+    """
+    Check for new alarms from EDS API and queue notifications.
+
+    Returns:
+        (outcome, severities): a poll_schedule OUTCOME_* and a Counter of
+        the newly stored alarms by severity
+    """
+    severities = Counter()
     try:
         eds_creds = get_credentials('eds')
         if not eds_creds:
             logger.warning("No EDS API credentials found")
-            return
+            return poll_schedule.OUTCOME_SKIPPED, severities
 
         twilio_creds = get_credentials('twilio')
         if not twilio_creds:
             logger.warning("No Twilio API credentials found")
-            return
+            return poll_schedule.OUTCOME_SKIPPED, severities
 
         contacts = get_active_contacts()
         if not contacts:
             logger.warning("No active contact numbers found for notifications")
-            return
+            return poll_schedule.OUTCOME_SKIPPED, severities
 
-        last_timestamp_key = "last_check_timestamp"
-        last_timestamp = app.config.pop(last_timestamp_key, None)
-        if last_timestamp:
-            logger.info(f"Using reset timestamp for alarm check: {last_timestamp}")
-        else:
-            latest_alarm = AlarmEvent.query.order_by(AlarmEvent.event_time.desc()).first()
-            last_timestamp = latest_alarm.event_time if latest_alarm else None
-
-        connection_successful = eds_api.check_connection(eds_creds.api_url, eds_creds.username, eds_creds.api_key)
-
-        if connection_successful:
-            system_alarms = AlarmEvent.query.filter(
-                AlarmEvent.alarm_id == "SYSTEM-EDS-OFFLINE",
-                AlarmEvent.status == "ACTIVE"
-            ).all()
-            if system_alarms:
-                logger.info("Connection to EDS restored, clearing offline system alarms")
-                for alarm in system_alarms:
-                    alarm.status = "CLEARED"
+        # Durable cursor: survives restarts and is shared by all workers
+        start = poll_cursor.position(poll_cursor.get_cursor())
+        last_timestamp = start[0]
+        # Rules are only recompiled when they have changed
+        matcher = alarm_rules.get_matcher()
+        db.session.commit()
+
+        # One shared, already-authenticated session: a successful events read
+        # doubles as the connection check, so a normal poll is one round trip
+        eds = eds_api.get_session(eds_creds.api_url, eds_creds.username, eds_creds.api_key)
+
+        notify_summary = notification_digest.summarize([])
+        stream_alarms = []
+
+        try:
+            # Far behind (first start, after a clear or an outage): catch up in
+            # windows first, then poll normally from where that left off
+            now = datetime.datetime.now()
+            if eds_backfill.needs_backfill(last_timestamp, now):
+                # History is not notified: a first start or a start after a
+                # clear would text every contact about days of old alarms.
+                # Each window is published to the live pages once committed.
+                def collect_backfilled(alarms):
+                    collect_stream_alarms(stream_alarms, alarms)
+                    severities.update(alarm['severity'] for alarm in alarms)
+
+                def publish_backfilled():
+                    alarm_stream.publish_alarms(stream_alarms)
+                    stream_alarms.clear()
+
+                eds_backfill.backfill(
+                    eds, eds_backfill.backfill_start(last_timestamp, now), now, poll_cursor.EDS_EVENTS_CURSOR, matcher,
+                    collect_backfilled, publish_backfilled
+                )
+                start = poll_cursor.position(poll_cursor.get_cursor())
+                last_timestamp = start[0]
                 db.session.commit()
-        else:
-            logger.error("EDS API connection failed")
-            system_alarm = create_system_alarm("SYSTEM-EDS-OFFLINE", "EDS API Connection Failed")
-            recent_system_alarm = AlarmEvent.query.filter(
-                AlarmEvent.alarm_id == "SYSTEM-EDS-OFFLINE",
-                AlarmEvent.status == "ACTIVE",
-                AlarmEvent.event_time >= datetime.datetime.now() - datetime.timedelta(hours=1)
-            ).first()
-            if not recent_system_alarm or recent_system_alarm.id == system_alarm.id:
-                send_sms_notifications(contacts, "ALARM: EDS API is offline - Monitoring System - HIGH", twilio_creds)
-            return
-
-        new_alarms = eds_api.get_alarm_events(
-            eds_creds.api_url,
-            eds_creds.username,
-            eds_creds.api_key,
-            last_timestamp
-        )
 
-        if not new_alarms:
+            fetched_alarms = eds.iter_events(last_timestamp)
+        except eds_api.EDSConnectionError as e:
+            return eds_offline(e, contacts), severities
+
+        # The response is parsed as it streams in, classified by the alarm
+        # rules and stored in fixed-size batches, each one batched insert; alarms already stored (e.g. at the
+        # inclusive ts.from boundary) are skipped and not notified again. The
+        # cursor moves and notifications are queued in the same transaction,
+        # so SMS latency never holds up ingestion.
+        # The body is read while iterating, so a dropped connection or a cut
+        # off body is only raised here; nothing of this poll is kept then.
+        new_count = 0
+        traces = []
+        try:
+            for batch in chunked(fetched_alarms, Config.INGEST_BATCH_SIZE):
+                fetched_at = datetime.datetime.utcnow()
+                with metrics.stage(metrics.STAGE_NORMALISE):
+                    classified = matcher.classify(poll_cursor.filter_unseen(start, batch))
+                with metrics.stage(metrics.STAGE_INSERT):
+                    new_alarms = ingest_alarms(classified)
+                    poll_cursor.advance_cursor(batch)
+                new_count += len(new_alarms)
+                collect_new_alarms(notify_summary, stream_alarms, severities, new_alarms)
+                alarm_trace.collect(traces, new_alarms, fetched_at)
+        except eds_api.EDSConnectionError as e:
+            db.session.rollback()
+            return eds_offline(e, contacts), Counter()
+
+        if new_count:
+            logger.info(f"Found {new_count} new alarms")
+        else:
             logger.info("No new alarms found")
-            return
-
-        logger.info(f"Found {len(new_alarms)} new alarms")
-
-        for alarm in new_alarms:
-            new_alarm = AlarmEvent(
-                alarm_id=alarm['id'],
-                description=alarm['description'],
-                source=alarm['source'],
-                event_time=alarm['timestamp'],
-                severity=alarm['severity'],
-                status=alarm['status'],
-                raw_data=json.dumps(alarm, default=datetime_converter)
-            )
-            db.session.add(new_alarm)
 
-            if alarm['severity'] in ['HIGH', 'CRITICAL']:
-                message = f"ALARM: {alarm['description']} - {alarm['source']} - {alarm['severity']}"
-                send_sms_notifications(contacts, message, twilio_creds)
+        # One summarising SMS per contact instead of one per alarm
+        with metrics.stage(metrics.STAGE_NOTIFY):
+            enqueued_at = datetime.datetime.utcnow()
+            digests = notification_digest.queue_digest([contact.phone_number for contact in contacts], notify_summary)
+        alarm_trace.record(traces, enqueued_at, digests[0] if digests else None)
 
-        db.session.commit()
+        with metrics.stage(metrics.STAGE_COMMIT):
+            db.session.commit()
+        with metrics.stage(metrics.STAGE_NOTIFY):
+            alarm_stream.publish_alarms(stream_alarms)
+
+        status_monitor.update('eds', "Connected")
+        if clear_system_alarm("SYSTEM-EDS-OFFLINE"):
+            logger.info("Connection to EDS restored, cleared offline system alarm")
+
+        if clear_system_alarm("SYSTEM-EDS-ERROR"):
+            logger.info("Alarm check succeeded again, cleared error system alarm")
+        return poll_schedule.OUTCOME_OK, severities
 
     except Exception as e:
         logger.error(f"Error in check_alarms job: {str(e)}")
+        db.session.rollback()
         system_alarm = create_system_alarm("SYSTEM-EDS-ERROR", f"EDS API Error: {str(e)[:100]}")
-        recent_system_alarm = AlarmEvent.query.filter(
-            AlarmEvent.alarm_id == "SYSTEM-EDS-ERROR",
-            AlarmEvent.status == "ACTIVE",
-            AlarmEvent.event_time >= datetime.datetime.now() - datetime.timedelta(hours=1)
-        ).first()
-        if not recent_system_alarm or recent_system_alarm.id == system_alarm.id:
-            send_sms_notifications(contacts, f"ALARM: EDS API Error - {str(e)[:50]}... - HIGH", twilio_creds)
-
-@scheduler.task('interval', id='check_alarms_job', seconds=60, misfire_grace_time=900)
+        if system_alarm.occurrence_count == 1:
+            queue_sms_notifications(contacts, f"ALARM: EDS API Error - {str(e)[:50]}... - HIGH")
+        return poll_schedule.OUTCOME_FAILED, severities
+
+@scheduler.task('interval', id='check_alarms_job', seconds=Config.ALARM_CHECK_INTERVAL, misfire_grace_time=900)
+@scheduler_leader.leader_only
 def scheduled_alarm_check():
-    """Scheduled task to check for alarms every minute."""
+    """Scheduled task to check for alarms, then schedule the next check by how this one went."""
+    with app.app_context(), metrics.alarm_check():
+        outcome, severities = check_alarms()
+    metrics.observe_alarm_check(outcome, severities)
+    delay = alarm_check_schedule.record(outcome, severities)
+    scheduler.modify_job('check_alarms_job', next_run_time=datetime.datetime.now() + datetime.timedelta(seconds=delay))
+
+def drain_notifications():
+    """Send the notifications waiting in the outbox."""
+    twilio_creds = get_credentials('twilio')
+    if not twilio_creds:
+        return
+    notification_outbox.drain_outbox(twilio_creds.username, twilio_creds.api_key, twilio_creds.api_secret)
+
+@scheduler.task('interval', id='drain_notifications_job', seconds=Config.OUTBOX_DRAIN_INTERVAL, misfire_grace_time=60)
+@scheduler_leader.leader_only
+def scheduled_notification_drain():
+    """Scheduled task to send queued notifications, separate from alarm polling."""
     with app.app_context():
-        check_alarms()
+        drain_notifications()
 
-@app.route('/')
-def index():
-    """Dashboard home page."""
-    eds_status = "Unknown"
+@scheduler.task('cron', id='partition_maintenance_job', hour=3, minute=15, misfire_grace_time=3600)
+@scheduler_leader.leader_only
+def scheduled_partition_maintenance():
+    """Scheduled task to create upcoming alarm partitions and archive expired alarm history."""
+    with app.app_context():
+        try:
+            alarm_partitions.run_maintenance()
+        except Exception as e:
+            logger.error(f"Error in partition maintenance job: {str(e)}")
+            db.session.rollback()
+
+def refresh_status():
+    """Probe the EDS and Twilio APIs and update the cached status snapshot."""
     eds_creds = get_credentials('eds')
     if eds_creds:
-        try:
-            if eds_api.check_connection(eds_creds.api_url, eds_creds.username, eds_creds.api_key):
-                eds_status = "Connected"
-            else:
-                eds_status = "Failed"
-        except Exception:
-            eds_status = "Error"
+        status_monitor.update('eds', probe(eds_api.check_connection, eds_creds.api_url, eds_creds.username, eds_creds.api_key))
+    else:
+        status_monitor.update('eds', "Unknown")
 
-    twilio_status = "Unknown"
     twilio_creds = get_credentials('twilio')
     if twilio_creds:
-        try:
-            if notification_service.check_connection(twilio_creds.username, twilio_creds.api_key):
-                twilio_status = "Connected"
-            else:
-                twilio_status = "Failed"
-        except Exception:
-            twilio_status = "Error"
-
-    latest_system_alarms_subquery = db.session.query(
-        AlarmEvent.alarm_id,
-        db.func.max(AlarmEvent.event_time).label('max_time')
-    ).filter(
-        AlarmEvent.alarm_id.like('SYSTEM-%'),
-        AlarmEvent.status == 'ACTIVE'
-    ).group_by(
-        AlarmEvent.alarm_id
-    ).subquery()
-
-    recent_alarms_query = AlarmEvent.query.outerjoin(
-        latest_system_alarms_subquery,
-        db.and_(
-            AlarmEvent.alarm_id == latest_system_alarms_subquery.c.alarm_id,
-            AlarmEvent.event_time == latest_system_alarms_subquery.c.max_time
-        )
-    ).filter(
-        AlarmEvent.status == 'ACTIVE',
-        db.or_(
-            ~AlarmEvent.alarm_id.like('SYSTEM-%'),
-            db.and_(
-                AlarmEvent.alarm_id == latest_system_alarms_subquery.c.alarm_id,
-                AlarmEvent.event_time == latest_system_alarms_subquery.c.max_time
-            )
-        )
-    )
+        status_monitor.update('twilio', probe(notification_service.check_connection, twilio_creds.username, twilio_creds.api_key))
+    else:
+        status_monitor.update('twilio', "Unknown")
+
+@scheduler.task('interval', id='refresh_status_job', seconds=Config.STATUS_CHECK_INTERVAL,
+                next_run_time=datetime.datetime.now(), misfire_grace_time=60)
+def scheduled_status_refresh():
+    """Scheduled task to refresh the connection status snapshot."""
+    with app.app_context():
+        refresh_status()
+
+def take_over_jobs():
+    """Check for alarms right away in a process that just became the leader, so a failover skips at most one check."""
+    scheduler.modify_job('check_alarms_job', next_run_time=datetime.datetime.now())
+
+# Added after the jobs it reschedules
+@scheduler.task('interval', id='leader_lease_job', seconds=Config.LEADER_RENEW_INTERVAL,
+                next_run_time=datetime.datetime.now(), misfire_grace_time=60)
+def scheduled_leader_renewal():
+    """Scheduled task to take or renew the scheduler lease; runs in every process."""
+    with app.app_context():
+        scheduler_leader.renew(on_acquire=take_over_jobs)
+
+@atexit.register
+def release_leadership():
+    """Hand the scheduler lease over on shutdown instead of letting it expire."""
+    with app.app_context():
+        scheduler_leader.release()
+
+@app.route('/')
+def index():
+    """Dashboard home page."""
+    status = status_monitor.snapshot()
 
-    recent_alarms = recent_alarms_query.order_by(AlarmEvent.event_time.desc()).limit(5).all()
+    # System alarms have one alarm event per episode, so no deduplication is needed
+    recent_alarms = alarm_queries.recent_active_alarms(5).all()
+
+    system_alarms = SystemAlarmState.query.filter_by(status='ACTIVE').order_by(SystemAlarmState.alarm_id).all()
 
     return render_template('index.html', 
-        eds_status=eds_status, 
-        twilio_status=twilio_status, 
+        eds_status=status['eds'], 
+        twilio_status=status['twilio'], 
         recent_alarms=recent_alarms,
+        system_alarms=system_alarms,
         now=datetime.datetime.now()
     )
 
 @app.route('/alarms')
 def alarms():
-    """View all alarms."""
-    page = request.args.get('page', 1, type=int)
+    """View all alarms, paged by position (after/before cursors) instead of page number."""
     per_page = 20
     status_filter = request.args.get('status', 'ACTIVE')
+    query = alarm_queries.alarms_by_status(status_filter)
 
-    latest_system_alarms_subquery = db.session.query(
-        AlarmEvent.alarm_id,
-        db.func.max(AlarmEvent.event_time).label('max_time')
-    ).filter(
-        AlarmEvent.alarm_id.like('SYSTEM-%')
-    ).group_by(
-        AlarmEvent.alarm_id
-    ).subquery()
-
-    query = AlarmEvent.query.outerjoin(
-        latest_system_alarms_subquery,
-        db.and_(
-            AlarmEvent.alarm_id == latest_system_alarms_subquery.c.alarm_id,
-            AlarmEvent.event_time == latest_system_alarms_subquery.c.max_time
-        )
-    )
-
-    if status_filter != 'ALL':
-        query = query.filter(AlarmEvent.status == status_filter)
-
-    query = query.filter(
-        db.or_(
-            ~AlarmEvent.alarm_id.like('SYSTEM-%'),
-            db.and_(
-                AlarmEvent.alarm_id == latest_system_alarms_subquery.c.alarm_id,
-                AlarmEvent.event_time == latest_system_alarms_subquery.c.max_time
-            )
-        )
-    )
-
-    alarms = query.order_by(AlarmEvent.event_time.desc()).paginate(page=page, per_page=per_page)
+    try:
+        alarms = alarm_queries.keyset_page(query, per_page, request.args.get('after'), request.args.get('before'))
+    except ValueError:
+        flash('Invalid page link, showing the newest alarms', 'warning')
+        alarms = alarm_queries.keyset_page(query, per_page)
 
     status_options = ['ACTIVE', 'CLEARED', 'ACKNOWLEDGED', 'ALL']
 
     return render_template('alarms.html', 
                           alarms=alarms, 
+                          estimated_total=alarm_queries.estimate_count(query),
                           status_filter=status_filter,
                           status_options=status_options,
                           now=datetime.datetime.now())
@@ -285,6 +449,7 @@ def contacts():
             else:
                 contact = ContactNumber(name=name, phone_number=phone_number, active=True)
                 db.session.add(contact)
+                data_versions.bump(data_versions.CONTACTS)
                 db.session.commit()
                 flash('Contact added successfully', 'success')
 
@@ -293,6 +458,7 @@ def contacts():
             contact = ContactNumber.query.get(contact_id)
             if contact:
                 db.session.delete(contact)
+                data_versions.bump(data_versions.CONTACTS)
                 db.session.commit()
                 flash('Contact deleted successfully', 'success')
 
@@ -301,6 +467,7 @@ def contacts():
             contact = ContactNumber.query.get(contact_id)
             if contact:
                 contact.active = not contact.active
+                data_versions.bump(data_versions.CONTACTS)
                 db.session.commit()
                 status = "activated" if contact.active else "deactivated"
                 flash(f'Contact {status} successfully', 'success')
@@ -310,6 +477,65 @@ def contacts():
     contacts = ContactNumber.query.all()
     return render_template('contacts.html', contacts=contacts, now=datetime.datetime.now())
 
+@app.route('/rules', methods=['GET', 'POST'])
+def rules():
+    """Manage alarm classification rules."""
+    if request.method == 'POST':
+        if 'add_rule' in request.form:
+            rule = AlarmRule(
+                name=request.form.get('name', '').strip(),
+                position=request.form.get('position', 100, type=int),
+                sources=request.form.get('sources', '').strip() or None,
+                priorities=request.form.get('priorities', '').strip() or None,
+                type_pattern=request.form.get('type_pattern', '').strip() or None,
+                description_pattern=request.form.get('description_pattern', '').strip() or None,
+                metadata_match=request.form.get('metadata_match', '').strip() or None,
+                action=request.form.get('action', alarm_rules.ACTION_ALARM),
+                severity=request.form.get('severity', '').strip().upper() or None,
+                notify='notify' in request.form,
+                enabled=True
+            )
+
+            try:
+                if not rule.name:
+                    raise ValueError('Name is required')
+                alarm_rules.validate_rule(rule, AlarmRule.query.filter_by(enabled=True).all())
+            except ValueError as e:
+                flash(str(e), 'danger')
+            else:
+                db.session.add(rule)
+                db.session.commit()
+                alarm_rules.invalidate()
+                flash('Rule added successfully', 'success')
+
+        elif 'delete_rule' in request.form:
+            rule = AlarmRule.query.get(request.form.get('rule_id'))
+            if rule:
+                db.session.delete(rule)
+                db.session.commit()
+                alarm_rules.invalidate()
+                flash('Rule deleted successfully', 'success')
+
+        elif 'toggle_rule' in request.form:
+            rule = AlarmRule.query.get(request.form.get('rule_id'))
+            if rule and not rule.enabled:
+                try:
+                    alarm_rules.validate_rule(rule, AlarmRule.query.filter_by(enabled=True).all())
+                except ValueError as e:
+                    flash(str(e), 'danger')
+                    rule = None
+            if rule:
+                rule.enabled = not rule.enabled
+                db.session.commit()
+                alarm_rules.invalidate()
+                status = "enabled" if rule.enabled else "disabled"
+                flash(f'Rule {status} successfully', 'success')
+
+        return redirect(url_for('rules'))
+
+    rules = AlarmRule.query.order_by(AlarmRule.position, AlarmRule.id).all()
+    return render_template('rules.html', rules=rules, now=datetime.datetime.now())
+
 @app.route('/settings', methods=['GET', 'POST'])
 def settings():
     """Manage API credentials."""
@@ -341,6 +567,9 @@ def settings():
                 db.session.add(credential)
 
             db.session.commit()
+            if api_type == 'eds':
+                # Drop pooled sessions logged in with the old credentials
+                eds_api.reset_sessions()
             flash(f'{api_type.upper()} API credentials updated successfully', 'success')
 
         return redirect(url_for('settings'))
@@ -350,115 +579,193 @@ def settings():
 
     return render_template('settings.html', eds_creds=eds_creds, twilio_creds=twilio_creds, now=datetime.datetime.now())
 
+def alarm_to_dict(alarm):
+    """Serialise an alarm event for the JSON API."""
+    return {
+        'id': alarm.id,
+        'alarm_id': alarm.alarm_id,
+        'description': alarm.description,
+        'source': alarm.source,
+        'event_time': alarm.event_time.isoformat(),
+        'severity': alarm.severity,
+        'status': alarm.status
+    }
+
+@app.route('/api/alarms')
+def api_alarms():
+    """
+    API endpoint to page through alarms newest first.
+
+    Query parameters: status (default ALL), limit (default 50, at most 500),
+    after/before (cursors from a previous response) and count=exact to
+    count the matching alarms; otherwise the total is a planner estimate
+    where the database provides one. field/value filter on a raw event
+    field listed in RAW_DATA_INDEX_KEYS (PostgreSQL).
+    """
+    try:
+        status_filter = request.args.get('status', 'ALL')
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+        query = alarm_queries.alarms_by_status(status_filter)
+
+        field = request.args.get('field')
+        if field:
+            # Only indexed fields, so a filter never scans the raw events
+            if field not in Config.RAW_DATA_INDEX_KEYS or db.engine.dialect.name != 'postgresql':
+                return jsonify({'error': f"Field {field} is not indexed (see RAW_DATA_INDEX_KEYS)"}), 400
+            query = query.filter(alarm_queries.raw_field(field) == request.args.get('value', ''))
+
+        try:
+            page = alarm_queries.keyset_page(query, limit, request.args.get('after'), request.args.get('before'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        result = {
+            'alarms': [alarm_to_dict(alarm) for alarm in page.items],
+            'next': page.next_cursor,
+            'prev': page.prev_cursor,
+        }
+        if request.args.get('count') == 'exact':
+            result['total'] = query.order_by(None).count()
+        else:
+            result['estimated_total'] = alarm_queries.estimate_count(query)
+
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f"Error getting alarms: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/alarms/<int:event_id>')
+def api_alarm_detail(event_id):
+    """API endpoint to get one alarm with its raw EDS event, which the lists do not load."""
+    try:
+        alarm = db.session.get(AlarmEvent, event_id, options=[db.undefer(AlarmEvent.raw_data)])
+        if alarm is None:
+            return jsonify({'error': f"Alarm {event_id} not found"}), 404
+
+        result = alarm_to_dict(alarm)
+        result['raw_data'] = alarm.raw_data
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f"Error getting alarm {event_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/alarms/recent')
+@data_versions.cached_response(data_versions.ALARMS, window=Config.RESPONSE_CACHE_SECONDS)
 def api_recent_alarms():
     """API endpoint to get recent alarms for Ajax refresh."""
     try:
         hours = request.args.get('hours', 24, type=int)
+        limit = request.args.get('limit', type=int)
         since = datetime.datetime.now() - datetime.timedelta(hours=hours)
 
-        latest_system_alarms_subquery = db.session.query(
-            AlarmEvent.alarm_id,
-            db.func.max(AlarmEvent.event_time).label('max_time')
-        ).filter(
-            AlarmEvent.alarm_id.like('SYSTEM-%'),
-            AlarmEvent.event_time >= since
-        ).group_by(
-            AlarmEvent.alarm_id
-        ).subquery()
-
-        alarms = AlarmEvent.query.outerjoin(
-            latest_system_alarms_subquery,
-            db.and_(
-                AlarmEvent.alarm_id == latest_system_alarms_subquery.c.alarm_id,
-                AlarmEvent.event_time == latest_system_alarms_subquery.c.max_time
-            )
-        ).filter(
-            db.and_(
-                AlarmEvent.event_time >= since,
-                db.or_(
-                    ~AlarmEvent.alarm_id.like('SYSTEM-%'),
-                    db.and_(
-                        AlarmEvent.alarm_id == latest_system_alarms_subquery.c.alarm_id,
-                        AlarmEvent.event_time == latest_system_alarms_subquery.c.max_time
-                    )
-                )
-            )
-        ).order_by(AlarmEvent.event_time.desc()).all()
-
-        result = []
-        for alarm in alarms:
-            result.append({
-                'id': alarm.id,
-                'alarm_id': alarm.alarm_id,
-                'description': alarm.description,
-                'source': alarm.source,
-                'event_time': alarm.event_time.isoformat(),
-                'severity': alarm.severity,
-                'status': alarm.status
-            })
+        alarms = alarm_queries.alarms_since(since, limit).all()
 
-        return jsonify(result)
+        return jsonify([alarm_to_dict(alarm) for alarm in alarms])
     except Exception as e:
         logger.error(f"Error getting recent alarms: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/alarms/stats')
+@data_versions.cached_response(data_versions.ALARMS, window=Config.RESPONSE_CACHE_SECONDS)
+def api_alarm_stats():
+    """API endpoint to get alarm counts for the dashboard, read from the per-minute rollup."""
+    try:
+        hours = request.args.get('hours', 24, type=int)
+        since = datetime.datetime.now() - datetime.timedelta(hours=hours)
+
+        return jsonify(alarm_stats.get_stats(since))
+    except Exception as e:
+        logger.error(f"Error getting alarm statistics: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/status')
 def api_status():
-    """API endpoint to get the current connection status."""
+    """API endpoint to get the current connection status from the cached snapshot."""
     try:
-        result = {
-            'eds': 'Unknown',
-            'twilio': 'Unknown'
-        }
+        result = status_monitor.snapshot()
 
-        eds_creds = get_credentials('eds')
-        if eds_creds:
-            try:
-                if eds_api.check_connection(eds_creds.api_url, eds_creds.username, eds_creds.api_key):
-                    result['eds'] = 'Connected'
-                else:
-                    result['eds'] = 'Failed'
-            except Exception:
-                result['eds'] = 'Error'
+        return data_versions.conditional(jsonify(result))
+    except Exception as e:
+        logger.error(f"Error getting API status: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
-        twilio_creds = get_credentials('twilio')
-        if twilio_creds:
-            try:
-                if notification_service.check_connection(twilio_creds.username, twilio_creds.api_key):
-                    result['twilio'] = 'Connected'
-                else:
-                    result['twilio'] = 'Failed'
-            except Exception:
-                result['twilio'] = 'Error'
+@app.route('/api/contacts/summary')
+@data_versions.cached_response(data_versions.CONTACTS)
+def api_contacts_summary():
+    """API endpoint to get the number of contacts and active contacts for the dashboard."""
+    try:
+        total = db.session.query(db.func.count(ContactNumber.id)).scalar()
+        active = db.session.query(db.func.count(ContactNumber.id)).filter(ContactNumber.active.is_(True)).scalar()
+
+        return jsonify({'total': total, 'active': active})
+    except Exception as e:
+        logger.error(f"Error getting contacts summary: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Metrics of all workers in the Prometheus text format."""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+@app.route('/api/poller')
+def api_poller():
+    """API endpoint to get the alarm check interval decisions of this process."""
+    try:
+        result = alarm_check_schedule.metrics()
+        result['leader'] = scheduler_leader.is_leader()
 
         return jsonify(result)
     except Exception as e:
-        logger.error(f"Error getting API status: {str(e)}")
+        logger.error(f"Error getting poller metrics: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/latency')
+def api_latency():
+    """API endpoint to get p50/p95/p99 latencies from EDS event to SMS for the alarms of the last `hours`."""
+    try:
+        hours = request.args.get('hours', 24, type=int)
+        since = datetime.datetime.utcnow() - datetime.timedelta(hours=hours)
+
+        return jsonify(alarm_trace.latency_report(since, severity=request.args.get('severity')))
+    except Exception as e:
+        logger.error(f"Error getting latency report: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/stream')
+def api_stream():
+    """
+    Server-Sent Events stream of live updates: new alarms, status changes and clears.
+
+    Reconnecting browsers send Last-Event-ID and receive the events they
+    missed, or a resync event if those are gone.
+    """
+    return Response(
+        alarm_stream.stream(request.headers.get('Last-Event-ID')),
+        mimetype='text/event-stream',
+        # No caching, and no buffering by nginx-style proxies
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/alarms/clear', methods=['POST'])
 def clear_alarms():
     """API endpoint to clear all current alarms."""
     try:
-        AlarmEvent.query.update({AlarmEvent.status: 'CLEARED'})
-        db.session.commit()
-
-        system_alarms = AlarmEvent.query.filter(AlarmEvent.alarm_id.like('SYSTEM-%')).all()
-        for alarm in system_alarms:
-            db.session.delete(alarm)
+        # Rows that are already cleared are not rewritten
+        AlarmEvent.query.filter(AlarmEvent.status != 'CLEARED').update(
+            {AlarmEvent.status: 'CLEARED'}, synchronize_session=False
+        )
+        alarm_stats.clear_all()
+        data_versions.bump(data_versions.ALARMS)
         db.session.commit()
 
-        last_timestamp_key = "last_check_timestamp"
-        app.config[last_timestamp_key] = datetime.datetime.now() - datetime.timedelta(hours=24)
-        logger.info(f"Alarm timestamp reset to: {app.config[last_timestamp_key]}")
-
-        db.session.commit()
+        alarm_reset.reset_after_clear()
         logger.info("All alarms have been cleared, timestamp reset to check all alarms")
 
-        logger.info("Running immediate alarm check after clear...")
-        with app.app_context():
-            check_alarms()
+        # Only through the scheduled job: in the leader it runs right away,
+        # in any other worker leader_only skips it and the leader's next
+        # scheduled check reads the reset cursor
+        scheduler.modify_job('check_alarms_job', next_run_time=datetime.datetime.now())
 
         return jsonify({'success': True, 'message': 'All alarms cleared successfully'})
     except Exception as e:
@@ -0,0 +1,48 @@
+import argparse
+from datetime import datetime
+from app import app, db
+from config import Config
+import alarm_partitions
+
+def list_partitions():
+    if not alarm_partitions.is_partitioned():
+        print("alarm_event is not partitioned")
+        return
+    for month in alarm_partitions.list_partitions():
+        name = alarm_partitions.partition_name(month)
+        rows = db.session.execute(db.text(f"SELECT reltuples::bigint FROM pg_class WHERE relname = '{name}'")).scalar()
+        print(f"{name}  {month:%Y-%m}  ~{max(rows, 0)} rows")
+
+def manage_partitions(command, start, end, keep_old):
+    with app.app_context():
+        try:
+            if command == 'convert':
+                if alarm_partitions.convert_to_partitioned(keep_old):
+                    print("Converted alarm_event to monthly partitions")
+                else:
+                    print("alarm_event is already partitioned")
+            elif command == 'ensure':
+                created = alarm_partitions.ensure_partitions(start, end)
+                print(f"Created {len(created)} partitions: {', '.join(created) or 'none needed'}")
+            elif command == 'retention':
+                if Config.ALARM_RETENTION_MONTHS <= 0:
+                    print("Retention is disabled (ALARM_RETENTION_MONTHS=0)")
+                    return
+                archived = alarm_partitions.apply_retention()
+                print(f"Archived and removed {len(archived)} months: {', '.join(archived) or 'nothing expired'}")
+            else:
+                list_partitions()
+        except Exception as e:
+            print(f"Error managing partitions: {e}")
+            db.session.rollback()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the monthly partitions of the alarm history (PostgreSQL)")
+    parser.add_argument("command", choices=["list", "convert", "ensure", "retention"],
+                        help="list partitions, convert an existing table, create missing partitions, or apply the retention policy")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="ensure: first month to create (ISO date)")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="ensure: last month to create (ISO date)")
+    parser.add_argument("--keep-old", action="store_true", help="convert: keep the original table as alarm_event_unpartitioned")
+    args = parser.parse_args()
+
+    manage_partitions(args.command, args.start, args.end, args.keep_old)
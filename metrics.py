@@ -0,0 +1,171 @@
+"""
+Prometheus metrics of the alarm monitor, served at /metrics.
+
+Covers the stages of an alarm check, the EDS API calls, SMS sends, the
+alarm check interval decisions and the latency of the web routes.
+
+Under gunicorn every worker records its own values; gunicorn.conf.py sets
+PROMETHEUS_MULTIPROC_DIR before the workers start, so they write them to
+shared files and /metrics, served by any worker, adds them up. Without it
+(e.g. the Flask development server) /metrics shows the current process.
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator, Mapping, Tuple
+from flask import Flask, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+)
+
+# Seconds, from a fast database round trip to a slow EDS response
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Stages of check_alarms
+STAGE_LOGIN = 'login'  # EDS login, only when the cached session has expired
+STAGE_READ = 'events_read'  # Waiting for the EDS events response and its body
+STAGE_NORMALISE = 'normalise'  # Parsing, normalising and classifying events
+STAGE_INSERT = 'insert'  # Storing alarm batches and moving the poll cursor
+STAGE_COMMIT = 'commit'
+STAGE_NOTIFY = 'notify'  # Queueing the notification digest and publishing to the live pages
+
+ALARM_CHECKS = Counter(
+    'alarm_checks_total', 'Scheduled alarm checks by outcome', ['outcome']
+)
+ALARM_CHECK_SECONDS = Histogram(
+    'alarm_check_seconds', 'Duration of scheduled alarm checks', buckets=LATENCY_BUCKETS
+)
+ALARM_CHECK_STAGE_SECONDS = Histogram(
+    'alarm_check_stage_seconds', 'Time per scheduled alarm check spent in each stage', ['stage'], buckets=LATENCY_BUCKETS
+)
+ALARMS_STORED = Counter(
+    'alarms_stored_total', 'New alarms stored by the alarm checks', ['severity']
+)
+
+EDS_REQUESTS = Counter(
+    'eds_api_requests_total', 'EDS API HTTP requests', ['endpoint', 'status']
+)
+EDS_REQUEST_SECONDS = Histogram(
+    'eds_api_request_seconds', 'EDS API response time until the headers arrived', ['endpoint'], buckets=LATENCY_BUCKETS
+)
+
+SMS_SENDS = Counter(
+    'sms_send_total', 'SMS send attempts by outcome (sent, rejected by Twilio, error)', ['outcome']
+)
+SMS_SEND_SECONDS = Histogram(
+    'sms_send_seconds', 'Duration of Twilio message requests', buckets=LATENCY_BUCKETS
+)
+
+ALARM_CHECK_INTERVAL_DECISIONS = Counter(
+    'alarm_check_interval_decisions_total', 'Alarm check interval decisions by reason', ['reason']
+)
+# Only the scheduler leader sets these; the others keep 0
+ALARM_CHECK_INTERVAL_SECONDS = Gauge(
+    'alarm_check_interval_seconds', 'Delay chosen before the next alarm check', multiprocess_mode='livemax'
+)
+ALARM_CHECK_BREAKER_OPEN = Gauge(
+    'alarm_check_breaker_open', '1 while the EDS circuit breaker is open', multiprocess_mode='livemax'
+)
+
+HTTP_REQUESTS = Counter(
+    'http_requests_total', 'Web requests by route and status', ['method', 'route', 'status']
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_seconds', 'Web request latency until the response was returned', ['method', 'route'],
+    buckets=LATENCY_BUCKETS
+)
+
+# Stage times of the alarm check running on this thread
+_check = threading.local()
+
+@contextmanager
+def alarm_check() -> Iterator[None]:
+    """
+    Time an alarm check, adding up the time of each stage on this thread.
+
+    Every stage that occurred is recorded once per check when it ends.
+    Stage times reported outside a check (e.g. by the status probe) are
+    ignored.
+    """
+    _check.stages = defaultdict(float)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages, _check.stages = _check.stages, None
+        ALARM_CHECK_SECONDS.observe(time.perf_counter() - started)
+        for name, seconds in stages.items():
+            ALARM_CHECK_STAGE_SECONDS.labels(name).observe(seconds)
+
+def add_stage(name: str, seconds: float) -> None:
+    """Add time to a stage of the alarm check running on this thread."""
+    stages = getattr(_check, 'stages', None)
+    if stages is not None:
+        stages[name] += seconds
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as a stage of the alarm check running on this thread."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage(name, time.perf_counter() - started)
+
+def observe_alarm_check(outcome: str, severities: Mapping[str, int]) -> None:
+    """Count a finished alarm check and the new alarms it stored."""
+    ALARM_CHECKS.labels(outcome).inc()
+    for severity, count in severities.items():
+        ALARMS_STORED.labels(severity).inc(count)
+
+def observe_eds_request(endpoint: str, status: str, seconds: float) -> None:
+    """
+    Record an EDS API call.
+
+    Args:
+        endpoint: API path without the version prefix, e.g. 'events/read'
+        status: HTTP status code, or 'error' if no response arrived
+        seconds: Time until the response headers arrived
+    """
+    EDS_REQUESTS.labels(endpoint, status).inc()
+    EDS_REQUEST_SECONDS.labels(endpoint).observe(seconds)
+
+def observe_poll_decision(outcome: str, reason: str, delay: float, breaker_open: bool) -> None:
+    """Record an alarm check interval decision (AdaptivePollSchedule on_decision callback)."""
+    ALARM_CHECK_INTERVAL_DECISIONS.labels(reason).inc()
+    ALARM_CHECK_INTERVAL_SECONDS.set(delay)
+    ALARM_CHECK_BREAKER_OPEN.set(1 if breaker_open else 0)
+
+def init_app(app: Flask) -> None:
+    """Record the latency of every web request."""
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            # The route pattern, not the URL, keeps the number of series bounded
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_REQUESTS.labels(request.method, route, str(response.status_code)).inc()
+            HTTP_REQUEST_SECONDS.labels(request.method, route).observe(time.perf_counter() - started)
+        return response
+
+def render() -> Tuple[bytes, str]:
+    """
+    Render all metrics in the Prometheus text format.
+
+    Returns:
+        (body, content type)
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        # Imported here: only valid once the directory is configured
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,33 @@
+"""
+Create and upgrade the database schema.
+
+Importing app does this too, but every process then repeats it; run this
+once before starting the application, as gunicorn.conf.py does, and start
+the processes with RUN_MIGRATIONS=False.
+"""
+import argparse
+import os
+
+# Migrate below, reporting the result, instead of while importing app
+os.environ["RUN_MIGRATIONS"] = "False"
+
+from app import app, db
+import db_migrations
+
+def migrate():
+    with app.app_context():
+        try:
+            db_migrations.migrate()
+            print("Database schema is up to date")
+            return True
+        except Exception as e:
+            print(f"Error upgrading the database schema: {e}")
+            db.session.rollback()
+            return False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create and upgrade the database schema")
+    parser.parse_args()
+
+    if not migrate():
+        raise SystemExit(1)
@@ -1,21 +1,67 @@
 """
 Mock EDS API for testing the alarm monitor system
 This is a simple Flask app that mimics the EDS API endpoints
+
+Events are kept in a time-sorted store indexed with bisect, so reading a
+time range costs the same with 20 events or with millions. The store is
+preloaded with MOCK_EDS_EVENTS events over the last MOCK_EDS_DAYS days and
+grows by MOCK_EDS_RATE events per second while the server runs. Only the
+timestamp and priority of an event are stored; the other fields are derived
+from its position.
+
+For load and failure testing every request can be delayed, and a share of
+them can fail with 401 (the session is dropped, as after an EDS restart),
+with a 5xx error or with a response body that is cut off. The settings can
+be changed while the server runs through /mock/config; /mock/stats counts
+the requests and injected faults.
 """
+import json
+import logging
 import os
 import random
+import threading
 import time
-import json
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify
+from typing import Any, Dict, Iterator, Optional, Tuple
+from flask import Flask, Response, request, jsonify
+
+# Configure logging
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# In-memory storage for sessions and alarms
-sessions = {}
-alarms = []
+class MockConfig:
+    """Settings of the mock server, from environment variables or run_test_server.py options."""
+    # Events in the store at start-up, spread over the last DAYS days
+    EVENTS = int(os.environ.get('MOCK_EDS_EVENTS', 20))
+    DAYS = float(os.environ.get('MOCK_EDS_DAYS', 7))
+    # New events per second while the server runs
+    RATE = float(os.environ.get('MOCK_EDS_RATE', 0))
+    # Events added by every (first page) events request, as the original mock did, and their priority
+    EVENTS_PER_READ = int(os.environ.get('MOCK_EDS_EVENTS_PER_READ', 1))
+    READ_PRIORITY = os.environ.get('MOCK_EDS_READ_PRIORITY', 'HIGH')
+    # Relative frequency of LOW, MEDIUM, HIGH and CRITICAL among generated events
+    PRIORITY_WEIGHTS = [float(weight) for weight in os.environ.get('MOCK_EDS_PRIORITY_WEIGHTS', '40,30,20,10').split(',')]
+    SEED = int(os.environ.get('MOCK_EDS_SEED', 0)) or None
+
+    SESSION_SECONDS = int(os.environ.get('MOCK_EDS_SESSION_SECONDS', 3600))
+
+    # Fault injection; rates are the share of requests affected, 0 to 1
+    LATENCY_MS = float(os.environ.get('MOCK_EDS_LATENCY_MS', 0))
+    LATENCY_JITTER_MS = float(os.environ.get('MOCK_EDS_LATENCY_JITTER_MS', 0))
+    UNAUTHORIZED_RATE = float(os.environ.get('MOCK_EDS_UNAUTHORIZED_RATE', 0))
+    ERROR_RATE = float(os.environ.get('MOCK_EDS_ERROR_RATE', 0))
+    TRUNCATE_RATE = float(os.environ.get('MOCK_EDS_TRUNCATE_RATE', 0))
+
+# Settings that can be changed through /mock/config while the server runs
+RUNTIME_SETTINGS = (
+    'RATE', 'EVENTS_PER_READ', 'READ_PRIORITY', 'SESSION_SECONDS', 'LATENCY_MS',
+    'LATENCY_JITTER_MS', 'UNAUTHORIZED_RATE', 'ERROR_RATE', 'TRUNCATE_RATE'
+)
 
-# Generate some sample alarms
 alarm_sources = ["Server Room", "Network Switch", "Database", "Application Server", "Power Supply"]
 alarm_descriptions = [
     "Temperature threshold exceeded",
@@ -32,56 +78,223 @@ alarm_descriptions = [
 alarm_priorities = ["LOW", "MEDIUM", "HIGH", "CRITICAL"]
 alarm_statuses = ["ACTIVE", "CLEARED", "ACKNOWLEDGED"]
 
-# Generate some initial alarms
-for i in range(20):
-    # Create some alarms in the past week
-    timestamp = datetime.now() - timedelta(days=random.randint(0, 7), 
-                                         hours=random.randint(0, 23), 
-                                         minutes=random.randint(0, 59))
-    
-    alarm = {
-        "id": f"ALARM-{i+1000}",
-        "source": random.choice(alarm_sources),
-        "description": random.choice(alarm_descriptions),
-        "timestamp": int(timestamp.timestamp()),
-        "priority": random.choice(alarm_priorities),
-        "status": random.choice(alarm_statuses),
-        "metadata": {
-            "location": "Building A",
-            "system": "Production",
-            "type": "Environmental" if "Temperature" in alarm_descriptions else "System"
+# Events serialised per chunk of a streamed events response
+STREAM_CHUNK_EVENTS = 500
+
+class EventStore:
+    """
+    Append-only store of events sorted by timestamp.
+
+    Timestamps and priorities live in parallel compact arrays (9 bytes per
+    event), so millions of events fit in memory. Events are only appended
+    with timestamps at or after the newest one, which keeps the arrays
+    sorted and the positions, and with them the event ids, stable while
+    the server runs.
+    """
+
+    def __init__(self, rng: random.Random):
+        self._rng = rng
+        self._timestamps = array('q')
+        self._priorities = bytearray()
+        self._lock = threading.Lock()
+        self._generated_until = time.time()
+        self._live_from = 0  # Position of the first event added while running
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def _random_priorities(self, count: int) -> bytearray:
+        return bytearray(self._rng.choices(range(len(alarm_priorities)), MockConfig.PRIORITY_WEIGHTS, k=count))
+
+    def preload(self, count: int, days: float) -> None:
+        """Fill the store with events at random times over the last days, as a Poisson process."""
+        now = time.time()
+        start = now - days * 86400
+        rate = count / (now - start) if count and now > start else 0
+        timestamps = array('q')
+        moment = start
+        for _ in range(count):
+            moment += self._rng.expovariate(rate)
+            timestamps.append(int(min(moment, now)))
+        with self._lock:
+            self._timestamps = timestamps
+            self._priorities = self._random_priorities(count)
+            self._generated_until = now
+            self._live_from = count
+
+    def _append(self, timestamps: list, priorities: bytearray) -> None:
+        newest = self._timestamps[-1] if self._timestamps else 0
+        self._timestamps.extend(max(timestamp, newest) for timestamp in timestamps)
+        self._priorities.extend(priorities)
+
+    def generate(self, extra: int = 0, extra_priority: Optional[str] = None) -> None:
+        """
+        Add the events due at MockConfig.RATE since the last call, then `extra` events at the current time.
+
+        Args:
+            extra: Number of events to add now, e.g. one per events request
+            extra_priority: Priority of the extra events, random if None
+        """
+        now = time.time()
+        with self._lock:
+            elapsed = now - self._generated_until
+            self._generated_until = now
+            if MockConfig.RATE > 0 and elapsed > 0:
+                # Poisson arrivals in (last call, now]
+                timestamps = []
+                moment = now - elapsed
+                while True:
+                    moment += self._rng.expovariate(MockConfig.RATE)
+                    if moment > now:
+                        break
+                    timestamps.append(int(moment))
+                self._append(timestamps, self._random_priorities(len(timestamps)))
+
+            if extra > 0:
+                if extra_priority in alarm_priorities:
+                    priorities = bytearray([alarm_priorities.index(extra_priority)] * extra)
+                else:
+                    priorities = self._random_priorities(extra)
+                self._append([int(now)] * extra, priorities)
+
+    def find(self, from_ts: Optional[int], till_ts: Optional[int]) -> Tuple[int, int]:
+        """Positions [start, end) of the events with from_ts <= timestamp <= till_ts."""
+        start = bisect_left(self._timestamps, from_ts) if from_ts is not None else 0
+        end = bisect_right(self._timestamps, till_ts) if till_ts is not None else len(self._timestamps)
+        return start, max(start, end)
+
+    def event(self, position: int) -> Dict[str, Any]:
+        """Build the event stored at a position."""
+        description = alarm_descriptions[position * 7 % len(alarm_descriptions)]
+        return {
+            # The timestamp keeps ids unique across restarts of the mock
+            "id": f"ALARM-{self._timestamps[position]}-{position}",
+            "source": alarm_sources[position * 3 % len(alarm_sources)],
+            "description": description,
+            "timestamp": self._timestamps[position],
+            "priority": alarm_priorities[self._priorities[position]],
+            # New alarms are always active
+            "status": "ACTIVE" if position >= self._live_from else alarm_statuses[position % len(alarm_statuses)],
+            "metadata": {
+                "location": "Building A",
+                "system": "Production",
+                "type": "Environmental" if "Temperature" in description else "System"
+            }
         }
-    }
-    
-    alarms.append(alarm)
 
-# Sort alarms by timestamp (newest first)
-alarms.sort(key=lambda x: x["timestamp"], reverse=True)
+# In-memory storage for sessions and events
+rng = random.Random(MockConfig.SEED)
+sessions: Dict[str, Dict[str, Any]] = {}
+sessions_lock = threading.Lock()
+store = EventStore(rng)
+stats: Counter = Counter()
+_setup_lock = threading.Lock()
+_ready = False
+
+def _preload() -> None:
+    """Preload the event store; the caller holds _setup_lock."""
+    global _ready
+    if MockConfig.SEED is not None:
+        rng.seed(MockConfig.SEED)
+    started = time.perf_counter()
+    store.preload(MockConfig.EVENTS, MockConfig.DAYS)
+    _ready = True
+    logger.info(f"Preloaded {MockConfig.EVENTS} events over {MockConfig.DAYS} days in {time.perf_counter() - started:.1f}s")
+
+def setup(**settings: Any) -> None:
+    """
+    Apply settings (MockConfig attribute names) and preload the event store.
+
+    Called by run_test_server.py and the __main__ block before serving; a
+    server started otherwise preloads with the environment settings on its
+    first request.
+    """
+    for name, value in settings.items():
+        setattr(MockConfig, name, value)
+    with _setup_lock:
+        _preload()
+
+def _session_id() -> Optional[str]:
+    """Return the valid session of the request, dropping it if it has expired."""
+    auth_header = request.headers.get('Authorization', '')
+    if not auth_header.startswith('Bearer '):
+        return None
+    session_id = auth_header.split(' ')[1]
+    with sessions_lock:
+        session = sessions.get(session_id)
+        if session is None:
+            return None
+        if session['expires'] <= datetime.now():
+            del sessions[session_id]
+            stats['sessions_expired'] += 1
+            return None
+    return session_id
+
+def _count(endpoint: str, status: int) -> None:
+    stats[f"{endpoint} {status}"] += 1
+
+@app.before_request
+def inject_faults():
+    """Preload if needed, delay the request and fail a share of them."""
+    if not _ready:
+        with _setup_lock:
+            if not _ready:
+                _preload()
+    if not request.path.startswith('/api/v1/'):
+        return None
+
+    endpoint = request.path[len('/api/v1/'):]
+    delay = MockConfig.LATENCY_MS + rng.random() * MockConfig.LATENCY_JITTER_MS
+    if delay > 0:
+        time.sleep(delay / 1000)
+
+    if MockConfig.ERROR_RATE and rng.random() < MockConfig.ERROR_RATE:
+        status = rng.choice((500, 502, 503))
+        stats['injected_errors'] += 1
+        _count(endpoint, status)
+        return jsonify({"error": "Injected server error"}), status
+
+    if endpoint in ('ping', 'events/read') and MockConfig.UNAUTHORIZED_RATE and rng.random() < MockConfig.UNAUTHORIZED_RATE:
+        session_id = _session_id()
+        if session_id:
+            with sessions_lock:
+                sessions.pop(session_id, None)
+        stats['injected_unauthorized'] += 1
+        _count(endpoint, 401)
+        return jsonify({"error": "Invalid session"}), 401
+    return None
 
 @app.route('/api/v1/login', methods=['POST'])
 def login():
     """Mock login endpoint"""
-    data = request.json
-    
+    data = request.json or {}
+
     # Check credentials (accept any for testing)
     username = data.get('username')
     password = data.get('password')
-    
+
     if not username or not password:
+        _count('login', 401)
         return jsonify({"error": "Missing credentials"}), 401
-    
-    # Generate a session ID
-    session_id = f"sess_{int(time.time())}_{random.randint(1000, 9999)}"
-    sessions[session_id] = {
-        "username": username,
-        "created": datetime.now(),
-        "expires": datetime.now() + timedelta(hours=1)
-    }
-    
+
+    # Generate a session ID, dropping expired sessions so they do not pile up under load
+    now = datetime.now()
+    expires = now + timedelta(seconds=MockConfig.SESSION_SECONDS)
+    session_id = f"sess_{int(time.time())}_{rng.randint(100000, 999999)}"
+    with sessions_lock:
+        for expired in [key for key, session in sessions.items() if session['expires'] <= now]:
+            del sessions[expired]
+        sessions[session_id] = {
+            "username": username,
+            "created": now,
+            "expires": expires
+        }
+
+    _count('login', 200)
     return jsonify({
         "sessionId": session_id,
         "user": username,
-        "expires": int((datetime.now() + timedelta(hours=1)).timestamp())
+        "expires": int(expires.timestamp())
     })
 
 @app.route('/api/v1/logout', methods=['POST'])
@@ -90,88 +303,133 @@ def logout():
     # Get session from Authorization header
     auth_header = request.headers.get('Authorization', '')
     if not auth_header.startswith('Bearer '):
+        _count('logout', 401)
         return jsonify({"error": "Invalid authorization"}), 401
-    
+
     session_id = auth_header.split(' ')[1]
-    
+
     # Remove session
-    if session_id in sessions:
-        del sessions[session_id]
-    
+    with sessions_lock:
+        sessions.pop(session_id, None)
+
+    _count('logout', 200)
     return jsonify({"status": "success"})
 
 @app.route('/api/v1/ping', methods=['GET'])
 def ping():
     """Mock ping endpoint to verify session"""
-    # Get session from Authorization header
-    auth_header = request.headers.get('Authorization', '')
-    if not auth_header.startswith('Bearer '):
-        return jsonify({"error": "Invalid authorization"}), 401
-    
-    session_id = auth_header.split(' ')[1]
-    
-    # Verify session exists
-    if session_id not in sessions:
+    if _session_id() is None:
+        _count('ping', 401)
         return jsonify({"error": "Invalid session"}), 401
-    
+
+    _count('ping', 200)
     return jsonify({"status": "ok"})
 
+def _stream_events(start: int, end: int, total: int, truncate_after: Optional[int]) -> Iterator[str]:
+    """
+    Serialise events [start, end) as an events response, chunk by chunk.
+
+    Args:
+        start: Position of the first event
+        end: Position after the last event
+        total: Number of events matching the filters on all pages
+        truncate_after: Cut the body off in the middle of the event after this many, None for a full body
+    """
+    yield f'{{"total": {total}, "events": ['
+    for chunk_start in range(start, end, STREAM_CHUNK_EVENTS):
+        chunk_end = min(end, chunk_start + STREAM_CHUNK_EVENTS)
+        if truncate_after is not None and chunk_end - start > truncate_after:
+            cut = start + truncate_after
+            head = ','.join(json.dumps(store.event(position)) for position in range(chunk_start, cut))
+            partial = json.dumps(store.event(cut))
+            yield (',' if chunk_start > start else '') + head + (',' if head else '') + partial[:len(partial) // 2]
+            return
+        yield (',' if chunk_start > start else '') + ','.join(
+            json.dumps(store.event(position)) for position in range(chunk_start, chunk_end)
+        )
+    if truncate_after is not None:
+        # Nothing to cut inside: stop before the array is closed
+        return
+    yield ']}'
+
 @app.route('/api/v1/events/read', methods=['POST'])
 def events_read():
-    """Mock events endpoint to retrieve alarm events"""
-    # Get session from Authorization header
-    auth_header = request.headers.get('Authorization', '')
-    if not auth_header.startswith('Bearer '):
-        return jsonify({"error": "Invalid authorization"}), 401
-    
-    session_id = auth_header.split(' ')[1]
-    
-    # Verify session exists
-    if session_id not in sessions:
+    """
+    Mock events endpoint to retrieve alarm events.
+
+    Returns the events with ts.from <= timestamp <= ts.till, oldest first.
+    With "pagesize", returns page "page" (from 1) of that size; a short page
+    is the last one.
+    """
+    if _session_id() is None:
+        _count('events/read', 401)
         return jsonify({"error": "Invalid session"}), 401
-    
+
     # Get filters from request
-    data = request.json
-    filters = data.get('filters', [])
-    
-    # Apply timestamp filter if provided
-    filtered_alarms = alarms
-    for filter_item in filters:
-        if 'ts' in filter_item and 'from' in filter_item['ts']:
-            from_ts = filter_item['ts']['from']
-            filtered_alarms = [a for a in filtered_alarms if a['timestamp'] >= from_ts]
-    
-    # Always create a new alarm with current timestamp
-    # And ensure it's HIGH priority to trigger notifications
-    new_alarm = {
-        "id": f"ALARM-{int(time.time())}-{random.randint(1000, 9999)}",
-        "source": random.choice(alarm_sources),
-        "description": random.choice(alarm_descriptions),
-        "timestamp": int(datetime.now().timestamp()),
-        "priority": "HIGH",  # Force HIGH priority to trigger notification
-        "status": "ACTIVE",  # New alarms are always active
-        "metadata": {
-            "location": "Building A",
-            "system": "Production",
-            "type": "Environmental" if "Temperature" in alarm_descriptions else "System"
-        }
-    }
-    
-    # Add to global alarms list
-    alarms.insert(0, new_alarm)
-    
-    # If it's after the filter timestamp, add to results
-    if not filters or not any('ts' in f for f in filters) or new_alarm['timestamp'] >= filters[0]['ts']['from']:
-        filtered_alarms.insert(0, new_alarm)
-    
+    data = request.json or {}
+    from_ts = till_ts = None
+    for filter_item in data.get('filters', []):
+        if 'ts' in filter_item:
+            from_ts = filter_item['ts'].get('from', from_ts)
+            till_ts = filter_item['ts'].get('till', till_ts)
+    try:
+        page = int(data.get('page') or 1)
+        page_size = int(data.get('pagesize') or 0)
+    except (TypeError, ValueError):
+        page = 0
+    if page < 1 or page_size < 0:
+        _count('events/read', 400)
+        return jsonify({"error": "Invalid page or pagesize"}), 400
+
+    # Events arriving since the last request, plus the ones every first read adds
+    store.generate(MockConfig.EVENTS_PER_READ if page == 1 else 0, MockConfig.READ_PRIORITY)
+
+    first, last = store.find(from_ts, till_ts)
+    total = last - first
+    if page_size:
+        start = min(last, first + (page - 1) * page_size)
+        end = min(last, start + page_size)
+    else:
+        start, end = first, last
+
+    truncate_after = None
+    if MockConfig.TRUNCATE_RATE and rng.random() < MockConfig.TRUNCATE_RATE:
+        truncate_after = rng.randint(0, end - start)
+        stats['injected_truncations'] += 1
+
+    stats['events_returned'] += end - start
+    _count('events/read', 200)
+    return Response(_stream_events(start, end, total, truncate_after), mimetype='application/json')
+
+@app.route('/mock/config', methods=['GET', 'POST'])
+def mock_config():
+    """Show the settings, or change those in RUNTIME_SETTINGS with a JSON object of name: value."""
+    if request.method == 'POST':
+        for name, value in (request.json or {}).items():
+            name = name.upper()
+            if name not in RUNTIME_SETTINGS:
+                return jsonify({"error": f"{name} cannot be changed at runtime"}), 400
+            setattr(MockConfig, name, type(getattr(MockConfig, name))(value))
+        logger.info(f"Mock settings changed: {request.json}")
+    settings = {name: value for name, value in vars(MockConfig).items() if name.isupper()}
+    return jsonify(settings)
+
+@app.route('/mock/stats', methods=['GET'])
+def mock_stats():
+    """Requests by endpoint and status, injected faults and the size of the store."""
+    with sessions_lock:
+        active_sessions = len(sessions)
     return jsonify({
-        "events": filtered_alarms,
-        "total": len(filtered_alarms)
+        "events_stored": len(store),
+        "sessions": active_sessions,
+        "counts": dict(stats)
     })
 
 if __name__ == '__main__':
     port = int(os.environ.get('MOCK_EDS_PORT', 3000))
-    
+    logging.basicConfig(level=logging.INFO)
+    setup()
+
     print(f"""
 ==================================================
 MOCK EDS API SERVER RUNNING ON PORT {port}
@@ -184,14 +442,14 @@ To use this mock API server with the EDS Alarm Monitor:
             or http://127.0.0.1:{port} (in Replit environment)
    - Username: test
    - Password: test
-   
-2. The mock server will generate random alarms
-   and ensure at least one HIGH priority alarm
-   to test notifications
-   
+
+2. The mock server holds {len(store)} events and adds
+   {MockConfig.EVENTS_PER_READ} {MockConfig.READ_PRIORITY} alarm(s) per events request
+   to test notifications (see MOCK_EDS_* in the README)
+
 3. Press Ctrl+C to stop the server
 
 ==================================================
 """)
-    
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+
+    app.run(host='0.0.0.0', port=port, threaded=True)
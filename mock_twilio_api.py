@@ -0,0 +1,218 @@
+"""
+Mock Twilio Messages API for testing the alarm monitor system
+This is a small Flask app that mimics the Twilio REST endpoints the monitor uses
+
+Point the monitor at it with TWILIO_API_URL=http://localhost:3002; any account
+SID and auth token are accepted. Every request can be delayed, and a share of
+message requests can fail with a 5xx error or with 429 Too Many Requests, as
+Twilio answers when its queue for the account is full. MAX_PER_SECOND caps
+the accepted messages per second, answering 429 above it. The settings can
+be changed while the server runs through /mock/config; /mock/stats counts
+the requests and /mock/messages lists the last accepted messages.
+"""
+import argparse
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from email.utils import formatdate
+from typing import Any, Dict
+from flask import Flask, request, jsonify
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+app = Flask(__name__)
+
+class MockTwilioConfig:
+    """Settings of the mock server, from environment variables or command line options."""
+    LATENCY_MS = float(os.environ.get('MOCK_TWILIO_LATENCY_MS', 0))
+    LATENCY_JITTER_MS = float(os.environ.get('MOCK_TWILIO_LATENCY_JITTER_MS', 0))
+    # Share of message requests failing, 0 to 1
+    ERROR_RATE = float(os.environ.get('MOCK_TWILIO_ERROR_RATE', 0))
+    TOO_MANY_REQUESTS_RATE = float(os.environ.get('MOCK_TWILIO_TOO_MANY_REQUESTS_RATE', 0))
+    # Accepted messages per second before answering 429 (0 = no limit)
+    MAX_PER_SECOND = int(os.environ.get('MOCK_TWILIO_MAX_PER_SECOND', 0))
+    SEED = int(os.environ.get('MOCK_TWILIO_SEED', 0)) or None
+
+# Number of accepted messages kept for /mock/messages
+RECENT_MESSAGES = 1000
+
+rng = random.Random(MockTwilioConfig.SEED)
+stats: Counter = Counter()
+messages: deque = deque(maxlen=RECENT_MESSAGES)
+_window_lock = threading.Lock()
+_window = [0, 0]  # [second, messages accepted in it]
+
+def _error(status: int, code: int, message: str):
+    """A Twilio error response; the Twilio client raises TwilioRestException for it."""
+    stats[f"messages {status}"] += 1
+    return jsonify({
+        "code": code,
+        "message": message,
+        "more_info": f"https://www.twilio.com/docs/errors/{code}",
+        "status": status
+    }), status
+
+def _authorized(account_sid: str) -> bool:
+    auth = request.authorization
+    return auth is not None and auth.username == account_sid and bool(auth.password)
+
+def _over_rate_limit() -> bool:
+    """Count a message against MAX_PER_SECOND; True if it is over the limit."""
+    if not MockTwilioConfig.MAX_PER_SECOND:
+        return False
+    second = int(time.time())
+    with _window_lock:
+        if _window[0] != second:
+            _window[0], _window[1] = second, 0
+        if _window[1] >= MockTwilioConfig.MAX_PER_SECOND:
+            return True
+        _window[1] += 1
+    return False
+
+@app.before_request
+def add_latency():
+    delay = MockTwilioConfig.LATENCY_MS + rng.random() * MockTwilioConfig.LATENCY_JITTER_MS
+    if delay > 0 and not request.path.startswith('/mock/'):
+        time.sleep(delay / 1000)
+
+@app.route('/2010-04-01/Accounts/<account_sid>.json', methods=['GET'])
+def fetch_account(account_sid):
+    """Mock account endpoint, used by the monitor's connection check"""
+    if not _authorized(account_sid):
+        stats['account 401'] += 1
+        return jsonify({"code": 20003, "message": "Authenticate", "status": 401}), 401
+    stats['account 200'] += 1
+    return jsonify({
+        "sid": account_sid,
+        "friendly_name": "Mock account",
+        "status": "active",
+        "type": "Full"
+    })
+
+@app.route('/2010-04-01/Accounts/<account_sid>/Messages.json', methods=['POST'])
+def create_message(account_sid):
+    """Mock message endpoint: accepts the message as queued, or fails as configured"""
+    if not _authorized(account_sid):
+        return _error(401, 20003, "Authenticate")
+
+    to_number = request.form.get('To')
+    from_number = request.form.get('From')
+    body = request.form.get('Body')
+    if not to_number:
+        return _error(400, 21604, "A 'To' phone number is required.")
+    if not from_number:
+        return _error(400, 21603, "A 'From' phone number is required.")
+    if not body:
+        return _error(400, 21602, "Message body is required.")
+
+    if MockTwilioConfig.ERROR_RATE and rng.random() < MockTwilioConfig.ERROR_RATE:
+        stats['injected_errors'] += 1
+        return _error(rng.choice((500, 503)), 20500, "Internal Server Error")
+    if MockTwilioConfig.TOO_MANY_REQUESTS_RATE and rng.random() < MockTwilioConfig.TOO_MANY_REQUESTS_RATE:
+        stats['injected_too_many_requests'] += 1
+        return _error(429, 20429, "Too Many Requests")
+    if _over_rate_limit():
+        stats['rate_limited'] += 1
+        return _error(429, 20429, "Too Many Requests")
+
+    sid = f"SM{uuid.uuid4().hex}"
+    now = formatdate(usegmt=True)
+    message: Dict[str, Any] = {
+        "account_sid": account_sid,
+        "api_version": "2010-04-01",
+        "body": body,
+        "date_created": now,
+        "date_sent": None,
+        "date_updated": now,
+        "direction": "outbound-api",
+        "error_code": None,
+        "error_message": None,
+        "from": from_number,
+        "num_media": "0",
+        "num_segments": str(len(body) // 153 + 1 if len(body) > 160 else 1),
+        "price": None,
+        "price_unit": "USD",
+        "sid": sid,
+        "status": "queued",
+        "to": to_number,
+        "uri": f"/2010-04-01/Accounts/{account_sid}/Messages/{sid}.json"
+    }
+    messages.append(message)
+    stats['messages 201'] += 1
+    return jsonify(message), 201
+
+@app.route('/mock/config', methods=['GET', 'POST'])
+def mock_config():
+    """Show the settings, or change them with a JSON object of name: value."""
+    if request.method == 'POST':
+        for name, value in (request.json or {}).items():
+            name = name.upper()
+            if name == 'SEED' or not hasattr(MockTwilioConfig, name):
+                return jsonify({"error": f"{name} cannot be changed at runtime"}), 400
+            setattr(MockTwilioConfig, name, type(getattr(MockTwilioConfig, name))(value))
+        logger.info(f"Mock settings changed: {request.json}")
+    return jsonify({name: value for name, value in vars(MockTwilioConfig).items() if name.isupper()})
+
+@app.route('/mock/stats', methods=['GET'])
+def mock_stats():
+    """Requests by endpoint and status and the injected faults."""
+    return jsonify({"counts": dict(stats)})
+
+@app.route('/mock/messages', methods=['GET'])
+def mock_messages():
+    """The last accepted messages, newest first."""
+    limit = request.args.get('limit', 100, type=int)
+    recent = list(messages)[-limit:] if limit > 0 else []
+    return jsonify({"messages": recent[::-1]})
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the mock Twilio Messages API server")
+    parser.add_argument("--port", type=int, default=int(os.environ.get('MOCK_TWILIO_PORT', 3002)),
+                        help="port to listen on (default: 3002)")
+    parser.add_argument("--latency-ms", type=float, default=MockTwilioConfig.LATENCY_MS, help="delay of every request")
+    parser.add_argument("--latency-jitter-ms", type=float, default=MockTwilioConfig.LATENCY_JITTER_MS,
+                        help="random extra delay, up to this much")
+    parser.add_argument("--error-rate", type=float, default=MockTwilioConfig.ERROR_RATE,
+                        help="share of message requests answered with a 5xx error")
+    parser.add_argument("--too-many-requests-rate", type=float, default=MockTwilioConfig.TOO_MANY_REQUESTS_RATE,
+                        help="share of message requests answered with 429")
+    parser.add_argument("--max-per-second", type=int, default=MockTwilioConfig.MAX_PER_SECOND,
+                        help="accepted messages per second before answering 429 (0 = no limit)")
+    parser.add_argument("--seed", type=int, default=MockTwilioConfig.SEED, help="random seed, for repeatable runs")
+    parser.add_argument("--quiet", action="store_true", help="do not log every request")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.quiet:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    MockTwilioConfig.LATENCY_MS = args.latency_ms
+    MockTwilioConfig.LATENCY_JITTER_MS = args.latency_jitter_ms
+    MockTwilioConfig.ERROR_RATE = args.error_rate
+    MockTwilioConfig.TOO_MANY_REQUESTS_RATE = args.too_many_requests_rate
+    MockTwilioConfig.MAX_PER_SECOND = args.max_per_second
+    if args.seed is not None:
+        rng.seed(args.seed)
+
+    logger.info(f"Starting mock Twilio API server on port {args.port}")
+    print(f"""
+==================================================
+MOCK TWILIO API SERVER RUNNING ON PORT {args.port}
+==================================================
+
+Point the EDS Alarm Monitor at it:
+
+    TWILIO_API_URL=http://localhost:{args.port}
+
+Any account SID and auth token are accepted.
+Sent messages: GET http://localhost:{args.port}/mock/messages
+
+==================================================
+""")
+
+    app.run(host='0.0.0.0', port=args.port, threaded=True)
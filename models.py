@@ -1,5 +1,49 @@
+import json
+import zlib
 from app import db
 from datetime import datetime
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+def datetime_converter(o):
+    if isinstance(o, datetime):
+        return o.isoformat()
+    raise TypeError("Object of type '%s' is not JSON serializable" % type(o).__name__)
+
+class _SerializedJSONB(JSONB):
+    """JSONB bound from an already serialised JSON string."""
+    def bind_processor(self, dialect):
+        return None
+
+class CompactJSON(TypeDecorator):
+    """
+    JSON document stored as JSONB on PostgreSQL and as zlib-compressed bytes elsewhere.
+
+    Values are dicts (datetimes are stored as ISO strings). Rows written as
+    plain JSON text before the column was converted are still read.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(_SerializedJSONB())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        serialized = json.dumps(value, default=datetime_converter, separators=(',', ':'))
+        if dialect.name == 'postgresql':
+            return serialized
+        return zlib.compress(serialized.encode('utf-8'))
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, (dict, list)):
+            return value
+        if isinstance(value, bytes):
+            value = zlib.decompress(value).decode('utf-8')
+        return json.loads(value)
 
 class ApiCredential(db.Model):
     """Model to store API credentials for EDS and Twilio"""
@@ -36,8 +80,153 @@ class AlarmEvent(db.Model):
     event_time = db.Column(db.DateTime, nullable=False, index=True)  # Timestamp of the alarm
     severity = db.Column(db.String(20), nullable=False)  # HIGH, MEDIUM, LOW, etc.
     status = db.Column(db.String(20), nullable=False)  # ACTIVE, CLEARED, ACKNOWLEDGED, etc.
-    raw_data = db.Column(db.Text)  # Raw JSON data from API
+    raw_data = db.deferred(db.Column(CompactJSON))  # Raw event from the API, loaded only when accessed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Dedup key for ingestion: the same EDS event is only stored once
+        db.Index('uq_alarm_event_alarm_id_event_time', 'alarm_id', 'event_time', unique=True),
+        # Alarm list filtered by status, newest first
+        db.Index('ix_alarm_event_status_event_time', status, event_time.desc(), id.desc()),
+        # Active alarms only (dashboard, default alarm list): small however long the history is
+        db.Index('ix_alarm_event_active_event_time', event_time.desc(), id.desc(),
+                 postgresql_where=status == 'ACTIVE', sqlite_where=status == 'ACTIVE'),
+        # Prefix searches such as alarm_id LIKE 'SYSTEM-%', whatever the database collation
+        db.Index('ix_alarm_event_alarm_id_pattern', 'alarm_id',
+                 postgresql_ops={'alarm_id': 'text_pattern_ops'}).ddl_if(dialect='postgresql'),
+    )
+
     def __repr__(self):
         return f"<AlarmEvent {self.alarm_id}: {self.description}>"
+
+class SystemAlarmState(db.Model):
+    """Model to store the current state of each monitoring system alarm (SYSTEM-*), one row per alarm ID"""
+    id = db.Column(db.Integer, primary_key=True)
+    alarm_id = db.Column(db.String(50), unique=True, nullable=False)  # e.g. SYSTEM-EDS-OFFLINE
+    description = db.Column(db.String(255), nullable=False)  # From the latest occurrence
+    severity = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='ACTIVE')  # ACTIVE or CLEARED
+    first_seen = db.Column(db.DateTime, nullable=False)  # Start of the current (or last) episode
+    last_seen = db.Column(db.DateTime, nullable=False)  # Latest occurrence
+    occurrence_count = db.Column(db.Integer, nullable=False, default=1)  # Occurrences in the current episode
+    event_id = db.Column(db.Integer)  # alarm_event row recording the current episode
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SystemAlarmState {self.alarm_id}: {self.status}>"
+
+class AlarmStatsMinute(db.Model):
+    """Model to store per-minute alarm counts, maintained during ingestion for the dashboard statistics"""
+    id = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.DateTime, nullable=False)  # Event time truncated to the minute
+    severity = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # Status of the alarms; clearing them moves their counts (alarm_stats.clear_all)
+    source = db.Column(db.String(100), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # One row per minute and combination, incremented by ingestion
+        db.Index('uq_alarm_stats_minute_key', 'bucket', 'severity', 'status', 'source', unique=True),
+    )
+
+    def __repr__(self):
+        return f"<AlarmStatsMinute {self.bucket} {self.severity}/{self.status}/{self.source}: {self.count}>"
+
+class PollCursor(db.Model):
+    """Model to store how far alarm polling has read the EDS event stream"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)  # Which stream, e.g. 'eds_events'
+    last_timestamp = db.Column(db.DateTime)  # Newest EDS event time processed
+    last_ids = db.Column(db.Text, default='[]')  # JSON list of alarm IDs already seen at last_timestamp
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<PollCursor {self.name}: {self.last_timestamp}>"
+
+class SchedulerLease(db.Model):
+    """Model to store which process runs the scheduled jobs, held while its holder keeps renewing it"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)  # e.g. 'scheduler'
+    holder = db.Column(db.String(100))  # host:pid of the leader, see scheduler_leader.instance_name()
+    acquired_at = db.Column(db.DateTime)  # When the current holder took over (UTC)
+    expires_at = db.Column(db.DateTime, nullable=False)  # Other processes take over after this (UTC)
+
+    def __repr__(self):
+        return f"<SchedulerLease {self.name}: {self.holder} until {self.expires_at}>"
+
+class DataVersion(db.Model):
+    """Model to store a change counter per table, bumped by every write that the cached read APIs depend on"""
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), unique=True, nullable=False)  # e.g. 'alarm_event'
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<DataVersion {self.table_name}: {self.version}>"
+
+class NotificationOutbox(db.Model):
+    """Model to queue outbound SMS notifications until they are delivered"""
+    id = db.Column(db.Integer, primary_key=True)
+    to_number = db.Column(db.String(20), nullable=False)  # Recipient phone number
+    message = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='PENDING')  # PENDING, SENT, FAILED
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # Send attempts so far
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Not sent before this time (UTC)
+    last_error = db.Column(db.String(255))
+    message_sid = db.Column(db.String(64))  # Twilio message SID once sent
+    digest_payload = db.Column(db.Text)  # JSON alarm summary for digest messages, None for plain messages
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # The worker's "what is due" query
+        db.Index('ix_notification_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+        # Messages recently sent to a recipient, for the per-contact rate cap
+        db.Index('ix_notification_outbox_to_number_sent_at', 'to_number', 'sent_at'),
+    )
+
+    def __repr__(self):
+        return f"<NotificationOutbox {self.to_number}: {self.status}>"
+
+class AlarmTrace(db.Model):
+    """Model to store when a polled alarm passed each stage on its way to an SMS, for latency reports (all times UTC)"""
+    # No foreign key: alarm history partitions are dropped by the retention policy
+    alarm_event_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    severity = db.Column(db.String(20))
+    event_at = db.Column(db.DateTime, nullable=False)  # Event time reported by EDS
+    fetched_at = db.Column(db.DateTime, nullable=False)  # Received from EDS
+    enqueued_at = db.Column(db.DateTime)  # Notification queued; None if the alarm was not notified
+    committed_at = db.Column(db.DateTime, nullable=False)  # Alarm (and notification) committed
+    outbox_id = db.Column(db.Integer)  # Notification followed: the first recipient's outbox entry
+    accepted_at = db.Column(db.DateTime)  # Twilio accepted that SMS
+    message_sid = db.Column(db.String(64))
+
+    __table_args__ = (
+        # Reports over a time window
+        db.Index('ix_alarm_trace_event_at', 'event_at'),
+        # Traces waiting for their SMS to be sent
+        db.Index('ix_alarm_trace_outbox_id', 'outbox_id'),
+    )
+
+    def __repr__(self):
+        return f"<AlarmTrace {self.alarm_event_id}: {self.event_at}>"
+
+class AlarmRule(db.Model):
+    """Model to store a rule classifying EDS events; enabled rules are evaluated by position and the first match wins"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    position = db.Column(db.Integer, nullable=False, default=100)  # Evaluation order, lowest first
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    sources = db.Column(db.Text)  # Comma-separated source names (exact, case-insensitive); empty matches any
+    priorities = db.Column(db.String(255))  # Comma-separated EDS priorities; empty matches any
+    type_pattern = db.Column(db.String(255))  # Regex searched in the event type (case-insensitive); empty matches any
+    description_pattern = db.Column(db.String(255))  # Regex searched in the description (case-insensitive); empty matches any
+    metadata_match = db.Column(db.Text)  # JSON object of other event fields and the values they must have
+    action = db.Column(db.String(20), nullable=False, default='ALARM')  # ALARM stores the event, IGNORE drops it
+    severity = db.Column(db.String(20))  # Stored instead of the event priority if set
+    notify = db.Column(db.Boolean, nullable=False, default=False)  # Send SMS notifications for new matching alarms
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<AlarmRule {self.position}: {self.name}>"
@@ -0,0 +1,136 @@
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+from app import db
+from config import Config
+from models import NotificationOutbox
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Most severe first when listing groups in a digest
+SEVERITY_RANK = {'CRITICAL': 0, 'HIGH': 1, 'MEDIUM': 2, 'LOW': 3}
+
+def summarize(alarms: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Summarise alarms into counts per (source, severity) group.
+
+    Args:
+        alarms: Normalised alarm events
+
+    Returns:
+        Digest payload: {'total': n, 'groups': {key: {'source', 'severity', 'count', 'descriptions'}}}
+    """
+    payload = {'total': 0, 'groups': {}}
+    for alarm in alarms:
+        key = f"{alarm['severity']}|{alarm['source']}"
+        group = payload['groups'].setdefault(key, {
+            'source': alarm['source'],
+            'severity': alarm['severity'],
+            'count': 0,
+            'descriptions': {},
+        })
+        group['count'] += 1
+        group['descriptions'][alarm['description']] = group['descriptions'].get(alarm['description'], 0) + 1
+        payload['total'] += 1
+    return payload
+
+def merge(payload: Dict[str, Any], other: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge the counts of another digest payload into this one and return it."""
+    payload['total'] += other['total']
+    for key, other_group in other['groups'].items():
+        group = payload['groups'].setdefault(key, dict(other_group, count=0, descriptions={}))
+        group['count'] += other_group['count']
+        for description, count in other_group['descriptions'].items():
+            group['descriptions'][description] = group['descriptions'].get(description, 0) + count
+    return payload
+
+def render(payload: Dict[str, Any], max_length: Optional[int] = None) -> str:
+    """
+    Render a digest payload as an SMS message.
+
+    A single alarm keeps the usual one-line alarm format. Larger digests list
+    the groups most severe and busiest first, each with its top descriptions,
+    and are cut off at max_length characters.
+    """
+    max_length = max_length or Config.SMS_MAX_LENGTH
+    groups = sorted(
+        payload['groups'].values(),
+        key=lambda group: (SEVERITY_RANK.get(group['severity'], len(SEVERITY_RANK)), -group['count'])
+    )
+
+    if payload['total'] == 1:
+        group = groups[0]
+        description = next(iter(group['descriptions']))
+        return f"ALARM: {description} - {group['source']} - {group['severity']}"[:max_length]
+
+    lines = [f"ALARM DIGEST: {payload['total']} alarms"]
+    for group in groups:
+        top = sorted(group['descriptions'].items(), key=lambda item: -item[1])[:Config.DIGEST_TOP_DESCRIPTIONS]
+        descriptions = ", ".join(f"{description} x{count}" if count > 1 else description for description, count in top)
+        lines.append(f"{group['severity']} {group['source']} ({group['count']}): {descriptions}")
+
+    shown = lines[:1]
+    for index, line in enumerate(lines[1:]):
+        hidden = len(groups) - index - 1
+        reserve = len(f"\n+{hidden} more") if hidden else 0
+        if index > 0 and len("\n".join(shown + [line])) + reserve > max_length:
+            shown.append(f"+{len(groups) - index} more")
+            break
+        shown.append(line)
+    return "\n".join(shown)[:max_length]
+
+def queue_digest(to_numbers: List[str], summary: Dict[str, Any]) -> List[NotificationOutbox]:
+    """
+    Queue one summarising SMS per contact for a digest payload.
+
+    If a contact already has a digest waiting for its window to close (or
+    for the rate cap to allow another message), the alarms are folded into
+    it instead of queueing another SMS. The caller commits.
+
+    Args:
+        to_numbers: Recipients' phone numbers
+        summary: Digest payload of the alarms to notify about, see summarize()
+
+    Returns:
+        The new or merged outbox entries, in the order of to_numbers
+    """
+    if not summary['total'] or not to_numbers:
+        return []
+
+    now = datetime.utcnow()
+
+    # Digests that have not been sent yet and are still waiting
+    open_digests = {
+        entry.to_number: entry
+        for entry in NotificationOutbox.query.filter(
+            NotificationOutbox.to_number.in_(to_numbers),
+            NotificationOutbox.status == 'PENDING',
+            NotificationOutbox.attempts == 0,
+            NotificationOutbox.digest_payload.isnot(None),
+            NotificationOutbox.next_attempt_at > now
+        ).with_for_update().all()
+    }
+
+    entries = []
+    for to_number in to_numbers:
+        entry = open_digests.get(to_number)
+        if entry is not None:
+            payload = merge(json.loads(entry.digest_payload), summary)
+        else:
+            payload = json.loads(json.dumps(summary))
+            entry = NotificationOutbox(
+                to_number=to_number,
+                status='PENDING',
+                attempts=0,
+                next_attempt_at=now + timedelta(seconds=Config.DIGEST_WINDOW_SECONDS)
+            )
+            db.session.add(entry)
+
+        entry.digest_payload = json.dumps(payload)
+        entry.message = render(payload)
+        entries.append(entry)
+
+    logger.info(f"Queued digest of {summary['total']} alarms for {len(to_numbers)} contacts ({len(open_digests)} merged)")
+    return entries
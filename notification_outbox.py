@@ -0,0 +1,139 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from app import db
+from config import Config
+from models import NotificationOutbox
+import notification_service
+import alarm_trace
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Signature of notification_service.send_messages
+SendMessages = Callable[[str, str, str, List[Tuple[str, str]]], List[Dict[str, Optional[str]]]]
+
+def enqueue(to_numbers: List[str], message: str) -> List[NotificationOutbox]:
+    """
+    Queue an SMS message for several recipients.
+
+    The rows are added to the current session, so they are committed (or
+    rolled back) together with whatever the caller is storing.
+
+    Args:
+        to_numbers: Recipients' phone numbers
+        message: Message content
+
+    Returns:
+        The queued outbox rows
+    """
+    now = datetime.utcnow()
+    entries = [
+        NotificationOutbox(to_number=to_number, message=message, status='PENDING', attempts=0, next_attempt_at=now)
+        for to_number in to_numbers
+    ]
+    db.session.add_all(entries)
+    return entries
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff after a failed attempt: base, 2x base, 4x base, ... capped at the max."""
+    return timedelta(seconds=min(Config.OUTBOX_RETRY_BASE * 2 ** (attempts - 1), Config.OUTBOX_RETRY_MAX))
+
+def _apply_rate_limit(entries: List[NotificationOutbox], now: datetime) -> List[NotificationOutbox]:
+    """
+    Hold back messages to contacts that have reached SMS_RATE_LIMIT_PER_HOUR.
+
+    Held-back messages are rescheduled for when the contact's oldest message
+    in the last hour ages out. Digests stay open meanwhile, so new alarms are
+    folded into them instead of queueing more messages.
+
+    Returns:
+        The entries that may be sent now
+    """
+    numbers = {entry.to_number for entry in entries}
+    recent = {
+        to_number: (count, oldest)
+        for to_number, count, oldest in db.session.query(
+            NotificationOutbox.to_number,
+            db.func.count(NotificationOutbox.id),
+            db.func.min(NotificationOutbox.sent_at)
+        ).filter(
+            NotificationOutbox.to_number.in_(numbers),
+            NotificationOutbox.sent_at >= now - timedelta(hours=1)
+        ).group_by(NotificationOutbox.to_number)
+    }
+
+    allowed = []
+    for entry in entries:
+        count, oldest = recent.get(entry.to_number, (0, None))
+        if count >= Config.SMS_RATE_LIMIT_PER_HOUR:
+            entry.next_attempt_at = (oldest or now) + timedelta(hours=1)
+            logger.warning(f"SMS rate limit reached for {entry.to_number}, holding message until {entry.next_attempt_at}")
+            continue
+        recent[entry.to_number] = (count + 1, oldest or now)
+        allowed.append(entry)
+    return allowed
+
+def drain_outbox(account_sid: str, auth_token: str, from_number: str, batch_size: Optional[int] = None,
+                 send: Optional[SendMessages] = None) -> int:
+    """
+    Send queued messages that are due and record the outcome of each.
+
+    Due rows are locked with SKIP LOCKED (on PostgreSQL), so several workers
+    can drain the outbox without sending a message twice. If the process dies
+    mid-batch the transaction rolls back and the rows are retried.
+
+    Args:
+        account_sid: Twilio account SID
+        auth_token: Twilio auth token
+        from_number: Twilio phone number to send from
+        batch_size: Maximum number of messages to send in this run
+        send: Sends the messages instead of notification_service.send_messages,
+            with the same arguments and results (e.g. a replay sink)
+
+    Returns:
+        Number of messages processed
+    """
+    now = datetime.utcnow()
+    entries = NotificationOutbox.query.filter(
+        NotificationOutbox.status == 'PENDING',
+        NotificationOutbox.next_attempt_at <= now
+    ).order_by(
+        NotificationOutbox.next_attempt_at, NotificationOutbox.id
+    ).limit(batch_size or Config.OUTBOX_BATCH_SIZE).with_for_update(skip_locked=True).all()
+
+    if Config.SMS_RATE_LIMIT_PER_HOUR:
+        entries = _apply_rate_limit(entries, now)
+
+    if not entries:
+        db.session.commit()
+        return 0
+
+    results = (send or notification_service.send_messages)(
+        account_sid, auth_token, from_number,
+        [(entry.to_number, entry.message) for entry in entries]
+    )
+
+    sent_at = datetime.utcnow()
+    for entry, result in zip(entries, results):
+        entry.attempts += 1
+        if result['sid']:
+            entry.status = 'SENT'
+            entry.message_sid = result['sid']
+            entry.sent_at = sent_at
+            entry.last_error = None
+        elif entry.attempts >= Config.OUTBOX_MAX_ATTEMPTS:
+            entry.status = 'FAILED'
+            entry.last_error = result['error'][:255]
+            logger.error(f"Giving up on SMS to {entry.to_number} after {entry.attempts} attempts: {result['error']}")
+        else:
+            entry.next_attempt_at = sent_at + retry_delay(entry.attempts)
+            entry.last_error = result['error'][:255]
+            logger.warning(f"SMS to {entry.to_number} failed (attempt {entry.attempts}), retrying at {entry.next_attempt_at}")
+
+    alarm_trace.mark_accepted(entries)
+    db.session.commit()
+
+    sent = sum(1 for result in results if result['sid'])
+    logger.info(f"Outbox drained: {sent} sent, {len(results) - sent} failed")
+    return len(entries)
@@ -1,7 +1,13 @@
 import os
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
+from config import Config
+import metrics
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -10,6 +16,46 @@ class TwilioError(Exception):
     """Exception raised for errors in Twilio SMS service."""
     pass
 
+# One client per account SID, reused so messages share pooled HTTPS connections
+_clients: Dict[str, Tuple[str, Client]] = {}
+_clients_lock = threading.Lock()
+
+# Worker pool for sending to many recipients at once
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_client(account_sid: str, auth_token: str) -> Client:
+    """
+    Get the cached Twilio client for an account, creating it if needed.
+    
+    Args:
+        account_sid: Twilio account SID
+        auth_token: Twilio auth token
+        
+    Returns:
+        Twilio REST client
+    """
+    with _clients_lock:
+        cached = _clients.get(account_sid)
+        if cached is None or cached[0] != auth_token:
+            client = Client(account_sid, auth_token)
+            if Config.TWILIO_API_URL:
+                # Messages and account requests both go through the api domain
+                client.api.base_url = Config.TWILIO_API_URL.rstrip('/')
+            cached = (auth_token, client)
+            _clients[account_sid] = cached
+        return cached[1]
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=Config.NOTIFICATION_MAX_WORKERS,
+                thread_name_prefix='sms'
+            )
+        return _executor
+
 def check_connection(account_sid: str, auth_token: str) -> bool:
     """
     Check if we can connect to the Twilio API.
@@ -22,7 +68,7 @@ def check_connection(account_sid: str, auth_token: str) -> bool:
         True if connection is successful, False otherwise
     """
     try:
-        client = Client(account_sid, auth_token)
+        client = get_client(account_sid, auth_token)
         # Try to fetch account info - this will fail if credentials are wrong
         client.api.accounts(account_sid).fetch()
         return True
@@ -51,7 +97,7 @@ def send_sms(account_sid: str, auth_token: str, from_number: str, to_number: str
         TwilioError: If SMS sending fails
     """
     try:
-        client = Client(account_sid, auth_token)
+        client = get_client(account_sid, auth_token)
         
         # Sanitize phone numbers if needed
         if not to_number.startswith('+'):
@@ -61,18 +107,74 @@ def send_sms(account_sid: str, auth_token: str, from_number: str, to_number: str
             from_number = f"+{from_number}"
         
         # Send the message
-        twilio_message = client.messages.create(
-            body=message,
-            from_=from_number,
-            to=to_number
-        )
+        started = time.perf_counter()
+        try:
+            twilio_message = client.messages.create(
+                body=message,
+                from_=from_number,
+                to=to_number
+            )
+        finally:
+            metrics.SMS_SEND_SECONDS.observe(time.perf_counter() - started)
         
         logger.info(f"SMS sent successfully to {to_number}, SID: {twilio_message.sid}")
+        metrics.SMS_SENDS.labels('sent').inc()
         return twilio_message.sid
         
     except TwilioRestException as e:
         logger.error(f"Twilio error sending SMS: {str(e)}")
+        metrics.SMS_SENDS.labels('rejected').inc()
         raise TwilioError(f"Twilio API error: {str(e)}")
     except Exception as e:
         logger.error(f"Unexpected error sending SMS: {str(e)}")
+        metrics.SMS_SENDS.labels('error').inc()
         raise TwilioError(f"Unexpected error: {str(e)}")
+
+
+def send_messages(account_sid: str, auth_token: str, from_number: str, messages: List[Tuple[str, str]]) -> List[Dict[str, Optional[str]]]:
+    """
+    Send several SMS messages concurrently.
+    
+    Messages go out on a shared pool of NOTIFICATION_MAX_WORKERS threads, so
+    the whole batch takes about as long as the slowest single send.
+    
+    Args:
+        account_sid: Twilio account SID
+        auth_token: Twilio auth token
+        from_number: Twilio phone number to send from
+        messages: (recipient phone number, message content) pairs
+        
+    Returns:
+        One result per message, in order, with 'to', 'sid' (None on failure)
+        and 'error' (None on success)
+    """
+    executor = _get_executor()
+    futures = [
+        executor.submit(send_sms, account_sid, auth_token, from_number, to_number, message)
+        for to_number, message in messages
+    ]
+    
+    results = []
+    for (to_number, _), future in zip(messages, futures):
+        try:
+            results.append({'to': to_number, 'sid': future.result(), 'error': None})
+        except TwilioError as e:
+            results.append({'to': to_number, 'sid': None, 'error': str(e)})
+    
+    return results
+
+def send_bulk_sms(account_sid: str, auth_token: str, from_number: str, to_numbers: List[str], message: str) -> List[Dict[str, Optional[str]]]:
+    """
+    Send the same SMS message to several recipients concurrently.
+    
+    Args:
+        account_sid: Twilio account SID
+        auth_token: Twilio auth token
+        from_number: Twilio phone number to send from
+        to_numbers: Recipients' phone numbers
+        message: Message content
+        
+    Returns:
+        One result per recipient, see send_messages
+    """
+    return send_messages(account_sid, auth_token, from_number, [(to_number, message) for to_number in to_numbers])
\ No newline at end of file
@@ -0,0 +1,140 @@
+import json
+import logging
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Set, Tuple
+from sqlalchemy.exc import IntegrityError
+from app import db
+from models import AlarmEvent, PollCursor
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Cursor for the regular EDS event poll
+EDS_EVENTS_CURSOR = 'eds_events'
+
+def _load(name: str, for_update: bool) -> Optional[PollCursor]:
+    query = PollCursor.query.filter_by(name=name).populate_existing()
+    if for_update:
+        query = query.with_for_update()
+    return query.first()
+
+def find_cursor(name: str) -> Optional[PollCursor]:
+    """
+    Get a poll cursor without creating it.
+
+    Returns:
+        The PollCursor, or None if it has never been used
+    """
+    return _load(name, False)
+
+def get_cursor(name: str = EDS_EVENTS_CURSOR, for_update: bool = False) -> PollCursor:
+    """
+    Get a poll cursor, creating it on first use.
+
+    A new cursor starts from the newest stored EDS alarm, so upgrading from
+    the old MAX(event_time) watermark does not re-read any history.
+
+    Args:
+        name: Cursor name
+        for_update: Lock the row until the current transaction ends
+
+    Returns:
+        The PollCursor
+    """
+    cursor = _load(name, for_update)
+    if cursor is not None:
+        return cursor
+
+    latest = db.session.query(db.func.max(AlarmEvent.event_time)).filter(
+        ~AlarmEvent.alarm_id.like('SYSTEM-%')
+    ).scalar()
+    cursor = PollCursor(name=name, last_timestamp=latest, last_ids='[]')
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(cursor)
+        logger.info(f"Created poll cursor {name} at {latest}")
+        return cursor
+    except IntegrityError:
+        # Another worker created it first
+        return _load(name, for_update)
+
+def seen_ids(cursor: PollCursor) -> Set[str]:
+    """Return the alarm IDs already processed at the cursor's timestamp."""
+    return set(json.loads(cursor.last_ids or '[]'))
+
+def position(cursor: PollCursor) -> Tuple[Optional[datetime], Set[str]]:
+    """Snapshot the cursor position as (last timestamp, alarm IDs already seen at it)."""
+    return cursor.last_timestamp, seen_ids(cursor)
+
+def filter_unseen(start: Tuple[Optional[datetime], Set[str]], alarms: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Drop alarms already processed before the poll started.
+
+    The ts.from filter is inclusive, so every poll returns the events at the
+    cursor timestamp again; those are recognised by ID and skipped.
+
+    Args:
+        start: Cursor position when the poll started, see position()
+        alarms: Alarms returned by the poll
+    """
+    last_timestamp, ids = start
+    if last_timestamp is None:
+        return alarms
+
+    return [
+        alarm for alarm in alarms
+        if not (alarm['timestamp'] == last_timestamp and alarm['id'] in ids)
+    ]
+
+def advance_cursor(alarms: List[Dict[str, Any]], name: str = EDS_EVENTS_CURSOR) -> None:
+    """
+    Move the cursor past a batch of processed alarms.
+
+    Locks the cursor row and only ever moves it forward, so concurrent polls
+    cannot rewind it. The caller commits, which makes the move atomic with
+    the ingestion of the same batch.
+
+    Args:
+        alarms: All alarms returned by the poll
+        name: Cursor name
+    """
+    if not alarms:
+        return
+
+    cursor = get_cursor(name, for_update=True)
+    newest = max(alarm['timestamp'] for alarm in alarms)
+    if cursor.last_timestamp is not None and newest < cursor.last_timestamp:
+        return
+
+    ids = {alarm['id'] for alarm in alarms if alarm['timestamp'] == newest}
+    if newest == cursor.last_timestamp:
+        ids |= seen_ids(cursor)
+
+    cursor.last_timestamp = newest
+    cursor.last_ids = json.dumps(sorted(ids))
+
+def advance_to(timestamp: datetime, name: str = EDS_EVENTS_CURSOR) -> None:
+    """
+    Move the cursor forward to a timestamp known to be fully processed.
+
+    Used after a backfill window, which may contain no events at all. Does
+    nothing if the cursor is already past the timestamp. The caller commits.
+    """
+    cursor = get_cursor(name, for_update=True)
+    if cursor.last_timestamp is None or timestamp > cursor.last_timestamp:
+        cursor.last_timestamp = timestamp
+        cursor.last_ids = '[]'
+
+def reset_cursor(timestamp: Optional[datetime], name: str = EDS_EVENTS_CURSOR) -> None:
+    """
+    Move the cursor to a fixed timestamp, e.g. to re-read history after a clear.
+
+    Args:
+        timestamp: New cursor position, or None to read everything
+        name: Cursor name
+    """
+    cursor = get_cursor(name, for_update=True)
+    cursor.last_timestamp = timestamp
+    cursor.last_ids = '[]'
+    logger.info(f"Poll cursor {name} reset to {timestamp}")
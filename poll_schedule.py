@@ -0,0 +1,144 @@
+"""
+Adaptive interval between alarm checks.
+
+The check normally runs every ALARM_CHECK_INTERVAL seconds. While EDS
+fails, the interval doubles per failed check (with jitter, so restarted
+monitors do not retry in step) up to POLL_BACKOFF_MAX, and after
+POLL_BREAKER_THRESHOLD failures in a row the circuit breaker opens: EDS is
+then only tried once per POLL_BREAKER_COOLDOWN until a check succeeds.
+After a check that stored HIGH or CRITICAL alarms, checks run every
+POLL_BURST_INTERVAL seconds for POLL_BURST_SECONDS, to follow an alarm
+storm closely.
+
+Every decision is counted; metrics() returns the counters and the current
+state for the API, and on_decision passes each one on (e.g. to Prometheus).
+"""
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Results of one alarm check
+OUTCOME_OK = 'ok'
+OUTCOME_FAILED = 'failed'  # EDS unreachable or the check raised
+OUTCOME_SKIPPED = 'skipped'  # Not configured yet (no credentials or contacts)
+
+# Why an interval was chosen
+REASON_BASE = 'base'
+REASON_BURST = 'burst'
+REASON_BACKOFF = 'backoff'
+REASON_BREAKER_OPEN = 'breaker_open'
+
+class AdaptivePollSchedule:
+    """
+    Thread-safe state machine choosing the delay before the next alarm check.
+
+    Call record() with the result of each scheduled check; it returns the
+    number of seconds to wait before the next one.
+    """
+
+    def __init__(self, base: float, backoff_max: float, jitter: float, breaker_threshold: int,
+                 breaker_cooldown: float, burst_interval: float, burst_seconds: float,
+                 burst_severities: Iterable[str], rng: Callable[[], float] = random.random,
+                 on_decision: Optional[Callable[[str, str, float, bool], None]] = None):
+        self.base = base
+        self.backoff_max = backoff_max
+        self.jitter = jitter  # Fraction of a backoff delay that is randomised away
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.burst_interval = burst_interval
+        self.burst_seconds = burst_seconds
+        self.burst_severities = set(burst_severities)
+        self._rng = rng
+        self.on_decision = on_decision  # Called with (outcome, reason, delay, breaker open) after each decision
+        self._lock = threading.Lock()
+
+        self._failures = 0
+        self._burst_until = 0.0
+        self._interval = base
+        self._reason = REASON_BASE
+        self._next_poll_at: Optional[float] = None
+        self._decisions: Counter = Counter()
+        self._outcomes: Counter = Counter()
+        self._breaker_trips = 0
+
+    def _jittered(self, delay: float) -> float:
+        return delay * (1 - self.jitter * self._rng())
+
+    def _decide(self, outcome: str, severities: Mapping[str, int], now: float) -> Tuple[float, str]:
+        if outcome == OUTCOME_FAILED:
+            self._failures += 1
+            if self._failures >= self.breaker_threshold:
+                if self._failures == self.breaker_threshold:
+                    self._breaker_trips += 1
+                    logger.warning(f"EDS failed {self._failures} checks in a row, opening the circuit breaker")
+                return self._jittered(self.breaker_cooldown), REASON_BREAKER_OPEN
+            delay = min(self.base * 2 ** self._failures, self.backoff_max)
+            return self._jittered(delay), REASON_BACKOFF
+
+        if self._failures >= self.breaker_threshold and outcome == OUTCOME_OK:
+            logger.info("EDS check succeeded, closing the circuit breaker")
+        if outcome == OUTCOME_OK:
+            self._failures = 0
+            if any(severities.get(severity) for severity in self.burst_severities):
+                self._burst_until = now + self.burst_seconds
+
+        if now < self._burst_until:
+            return min(self.burst_interval, self.base), REASON_BURST
+        return self.base, REASON_BASE
+
+    def record(self, outcome: str, severities: Optional[Mapping[str, int]] = None) -> float:
+        """
+        Record the result of a check and choose the delay before the next one.
+
+        Args:
+            outcome: OUTCOME_OK, OUTCOME_FAILED or OUTCOME_SKIPPED
+            severities: Number of newly stored alarms per severity
+
+        Returns:
+            Seconds until the next check
+        """
+        now = time.time()
+        with self._lock:
+            delay, reason = self._decide(outcome, severities or {}, now)
+            self._outcomes[outcome] += 1
+            self._decisions[reason] += 1
+            self._interval = delay
+            self._reason = reason
+            self._next_poll_at = now + delay
+            breaker_open = self._failures >= self.breaker_threshold
+
+        if self.on_decision:
+            self.on_decision(outcome, reason, delay, breaker_open)
+        if reason != REASON_BASE:
+            logger.info(f"Next alarm check in {delay:.0f}s ({reason})")
+        return delay
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Return the current decision and the counters since the process started.
+
+        Returns:
+            Dict with the last interval and its reason, the next check time,
+            the breaker and burst state, and counts of decisions by reason,
+            check outcomes and breaker trips
+        """
+        now = time.time()
+        with self._lock:
+            return {
+                'interval_seconds': round(self._interval, 3),
+                'reason': self._reason,
+                'next_poll_at': datetime.fromtimestamp(self._next_poll_at).isoformat() if self._next_poll_at else None,
+                'consecutive_failures': self._failures,
+                'breaker': 'open' if self._failures >= self.breaker_threshold else 'closed',
+                'breaker_trips': self._breaker_trips,
+                'burst_until': datetime.fromtimestamp(self._burst_until).isoformat() if self._burst_until > now else None,
+                'decisions': {reason: self._decisions[reason] for reason in (REASON_BASE, REASON_BURST, REASON_BACKOFF, REASON_BREAKER_OPEN)},
+                'outcomes': {outcome: self._outcomes[outcome] for outcome in (OUTCOME_OK, OUTCOME_FAILED, OUTCOME_SKIPPED)},
+            }
@@ -0,0 +1,170 @@
+"""
+Replay recorded EDS events traffic through the alarm pipeline.
+
+Reads the segments written with EDS_RECORD_DIR set (see eds_recorder.py) and
+feeds every recorded events response through the same normalisation, alarm
+rules, ingestion, digest and outbox code as a poll. Responses are replayed
+at their recorded pace (--speed 1), N times faster (--speed N) or as fast as
+possible (--speed 0), and the events of a response at their recorded
+download offsets. Responses that failed when they were recorded are skipped,
+as the poll that read them stored nothing.
+
+Nothing is sent: the outbox is drained into a sink, an NDJSON file of the
+messages Twilio would have received. The replay has its own poll cursor but
+stores alarms and queues messages like a poll, so run it against a scratch
+database. Digest windows and the SMS rate limit run on wall-clock time, so
+at N times speed they cover N times as much traffic.
+
+    DATABASE_URL=sqlite:////tmp/replay.db python replay_traffic.py recordings/ --speed 10 --sink replay_sms.ndjson
+"""
+import argparse
+import json
+import os
+import time
+from collections import Counter
+from datetime import datetime
+
+# Importing main must not start the scheduler: its jobs would take the lease
+# and poll EDS and send SMS with the credentials of the configured database
+os.environ["SCHEDULER_ENABLED"] = "False"
+
+from app import app, db
+from config import Config
+from alarm_ingest import ingest_alarms, chunked
+import alarm_partitions
+import alarm_rules
+import eds_api
+import eds_recorder
+import main
+import notification_digest
+import notification_outbox
+import poll_cursor
+
+# Cursor of the replayed traffic, separate from regular polling
+REPLAY_CURSOR = 'eds_replay'
+
+class NotificationSink:
+    """Stands in for notification_service.send_messages, writing the messages to an NDJSON file."""
+
+    def __init__(self, path):
+        self.sent = 0
+        self._file = open(path, 'w') if path else None
+
+    def send_messages(self, account_sid, auth_token, from_number, messages):
+        results = []
+        for to_number, message in messages:
+            self.sent += 1
+            sid = f"SINK{self.sent:08d}"
+            if self._file:
+                self._file.write(json.dumps({
+                    'sent_at': datetime.utcnow().isoformat(), 'to': to_number, 'message': message, 'sid': sid
+                }) + '\n')
+            results.append({'to': to_number, 'sid': sid, 'error': None})
+        return results
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+def wait_until(deadline):
+    delay = deadline - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+def paced_events(response, due, speed):
+    """Normalise the raw events of a response, each no earlier than its recorded offset allows."""
+    for offset, event in response['events']:
+        if speed:
+            wait_until(due + offset / speed)
+        yield eds_api.normalize_event(event)
+
+def replay_response(response, due, speed, matcher, to_numbers, sink):
+    """
+    Store the events of one recorded response and send the notifications they cause to the sink.
+
+    Returns:
+        (new alarms stored, digests queued)
+    """
+    start = poll_cursor.position(poll_cursor.get_cursor(REPLAY_CURSOR))
+    db.session.commit()
+
+    notify_summary = notification_digest.summarize([])
+    new_count = 0
+    for batch in chunked(paced_events(response, due, speed), Config.INGEST_BATCH_SIZE):
+        new_alarms = ingest_alarms(matcher.classify(poll_cursor.filter_unseen(start, batch)))
+        poll_cursor.advance_cursor(batch, REPLAY_CURSOR)
+        new_count += len(new_alarms)
+        main.collect_notifications(notify_summary, new_alarms)
+
+    digests = notification_digest.queue_digest(to_numbers, notify_summary)
+    db.session.commit()
+
+    while notification_outbox.drain_outbox('replay', 'replay', 'replay', send=sink.send_messages):
+        pass
+    return new_count, len(digests)
+
+def replay_traffic(paths, speed, contacts, sink_path):
+    sink = NotificationSink(sink_path)
+    with app.app_context():
+        try:
+            responses = eds_recorder.read_responses(paths)
+            if not responses:
+                print("No recorded EDS responses found")
+                return False
+
+            timestamps = [event['timestamp'] for response in responses for _, event in response['events']
+                          if isinstance(event.get('timestamp'), (int, float))]
+            if timestamps:
+                alarm_partitions.ensure_partitions(datetime.fromtimestamp(min(timestamps)), datetime.fromtimestamp(max(timestamps)))
+            poll_cursor.reset_cursor(None, REPLAY_CURSOR)
+            db.session.commit()
+
+            matcher = alarm_rules.get_matcher()
+            to_numbers = [f"+1555{i:07d}" for i in range(contacts)]
+            counts = Counter()
+            max_lag = 0.0
+            first_sent_at = responses[0]['sent_at']
+            started = time.monotonic()
+
+            for response in responses:
+                due = started + (response['sent_at'] - first_sent_at) / speed if speed else time.monotonic()
+                wait_until(due)
+                max_lag = max(max_lag, time.monotonic() - due)
+
+                counts['events'] += len(response['events'])
+                if response['status'] != 200 or response['error']:
+                    counts['failed_responses'] += 1
+                    continue
+                new_count, digests = replay_response(response, due, speed, matcher, to_numbers, sink)
+                counts['responses'] += 1
+                counts['alarms'] += new_count
+                counts['digests'] += digests
+
+            elapsed = time.monotonic() - started
+            span = responses[-1]['sent_at'] - first_sent_at
+            print(f"Replayed {counts['responses']} responses ({counts['failed_responses']} failed when recorded, skipped) "
+                  f"recorded over {span:.1f}s in {elapsed:.1f}s")
+            print(f"{counts['events']} events, {counts['alarms']} new alarms stored, "
+                  f"{counts['digests']} digests queued, {sink.sent} messages sent to the sink")
+            if elapsed:
+                print(f"{counts['events'] / elapsed:.1f} events/s, {counts['alarms'] / elapsed:.1f} alarms/s")
+            if speed:
+                print(f"Fell at most {max_lag:.3f}s behind the recorded pace")
+            return True
+        except Exception as e:
+            print(f"Error replaying EDS traffic: {e}")
+            db.session.rollback()
+            return False
+        finally:
+            sink.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded EDS events responses through ingestion and notifications")
+    parser.add_argument("paths", nargs='+', help="segment files, or directories of them (EDS_RECORD_DIR)")
+    parser.add_argument("--speed", type=float, default=1, help="replay N times faster than recorded, 0 for as fast as possible (default: 1)")
+    parser.add_argument("--contacts", type=int, default=1, help="number of contacts the notifications go to (default: 1)")
+    parser.add_argument("--sink", help="NDJSON file for the messages that would have been sent")
+    args = parser.parse_args()
+
+    if not replay_traffic(args.paths, args.speed, args.contacts, args.sink):
+        raise SystemExit(1)
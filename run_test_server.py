@@ -3,41 +3,94 @@
 Run the mock EDS API server for testing purposes.
 This allows comprehensive testing of the EDS Alarm Monitor system
 without connecting to the real EDS API.
+
+The options set the volume and rate of events and the injected faults
+(see mock_eds_api.py); each defaults to its MOCK_EDS_* environment variable.
+For example, a week of history at 100 events per minute, new events at 5 per
+second, 200 ms latency and 1% server errors:
+
+    python run_test_server.py --events 1000000 --rate 5 --latency-ms 200 --error-rate 0.01
 """
+import argparse
 import os
 import logging
-from mock_eds_api import app
+import mock_eds_api
+from mock_eds_api import app, MockConfig
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the mock EDS API server")
     # By default, use port 3000 for the mock API
-    port = int(os.environ.get('MOCK_EDS_PORT', 3000))
+    parser.add_argument("--port", type=int, default=int(os.environ.get('MOCK_EDS_PORT', 3000)),
+                        help="port to listen on (default: 3000)")
+    parser.add_argument("--events", type=int, default=MockConfig.EVENTS, help="events in the store at start-up")
+    parser.add_argument("--days", type=float, default=MockConfig.DAYS, help="days of history the start-up events cover")
+    parser.add_argument("--rate", type=float, default=MockConfig.RATE, help="new events per second while running")
+    parser.add_argument("--events-per-read", type=int, default=MockConfig.EVENTS_PER_READ,
+                        help="events added by every events request (0 for load tests driven by --rate)")
+    parser.add_argument("--read-priority", default=MockConfig.READ_PRIORITY,
+                        help="priority of the events added per request, 'random' for the generated mix")
+    parser.add_argument("--seed", type=int, default=MockConfig.SEED, help="random seed, for repeatable runs")
+    parser.add_argument("--session-seconds", type=int, default=MockConfig.SESSION_SECONDS,
+                        help="lifetime of an EDS session")
+    parser.add_argument("--latency-ms", type=float, default=MockConfig.LATENCY_MS, help="delay of every request")
+    parser.add_argument("--latency-jitter-ms", type=float, default=MockConfig.LATENCY_JITTER_MS,
+                        help="random extra delay, up to this much")
+    parser.add_argument("--unauthorized-rate", type=float, default=MockConfig.UNAUTHORIZED_RATE,
+                        help="share of session requests answered with 401, dropping the session")
+    parser.add_argument("--error-rate", type=float, default=MockConfig.ERROR_RATE,
+                        help="share of requests answered with a 5xx error")
+    parser.add_argument("--truncate-rate", type=float, default=MockConfig.TRUNCATE_RATE,
+                        help="share of events responses whose body is cut off")
+    parser.add_argument("--quiet", action="store_true", help="do not log every request")
+    args = parser.parse_args()
+
+    if args.quiet:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    port = args.port
     logger.info(f"Starting mock EDS API server on port {port}")
-    
+    mock_eds_api.setup(
+        EVENTS=args.events,
+        DAYS=args.days,
+        RATE=args.rate,
+        EVENTS_PER_READ=args.events_per_read,
+        READ_PRIORITY=args.read_priority.upper(),
+        SEED=args.seed,
+        SESSION_SECONDS=args.session_seconds,
+        LATENCY_MS=args.latency_ms,
+        LATENCY_JITTER_MS=args.latency_jitter_ms,
+        UNAUTHORIZED_RATE=args.unauthorized_rate,
+        ERROR_RATE=args.error_rate,
+        TRUNCATE_RATE=args.truncate_rate,
+    )
+
     # Print usage instructions for testing
     print(f"""
     ==================================================
     MOCK EDS API SERVER RUNNING ON PORT {port}
     ==================================================
-    
+
     To use this mock API server with the EDS Alarm Monitor:
-    
+
     1. Set these API credentials in the monitor settings:
        - API URL: http://localhost:{port}
        - Username: test
        - Password: test
-       
-    2. The mock server will generate random alarms
-       and ensure at least one HIGH priority alarm
-       to test notifications
-       
-    3. Press Ctrl+C to stop the server
-    
+
+    2. The mock server holds {len(mock_eds_api.store)} events, adds {args.rate:g}
+       per second and {args.events_per_read} {args.read_priority.upper()} alarm(s) per events request
+
+    3. Settings: GET/POST http://localhost:{port}/mock/config
+       Counters: GET http://localhost:{port}/mock/stats
+
+    4. Press Ctrl+C to stop the server
+
     ==================================================
     """)
-    
-    # Run the server
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+
+    # Run the server; the reloader would preload the store twice
+    app.run(host='0.0.0.0', port=port, threaded=True, use_reloader=False)
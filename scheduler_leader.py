@@ -0,0 +1,133 @@
+"""
+Leader election for the scheduled jobs.
+
+Every gunicorn worker (and every --reload child) imports main.py and starts
+its own scheduler. Jobs that call EDS or Twilio or maintain the database
+must run in one process only, so they only run in the process holding the
+scheduler lease: a row in scheduler_lease whose holder keeps moving its
+expiry time forward. When the leader dies the lease runs out, and the next
+renewal attempt of another process takes it over.
+
+The lease is taken with a conditional UPDATE, so this works the same on
+PostgreSQL and SQLite. Expiry times come from the clock of each process
+(UTC), so hosts sharing a database need synchronised clocks.
+"""
+import datetime
+import functools
+import logging
+import os
+import socket
+import time
+from typing import Callable, Optional
+from sqlalchemy.exc import IntegrityError
+from app import db
+from config import Config
+from models import SchedulerLease
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = 'scheduler'
+
+# Monotonic time until which this process may act as the leader
+_valid_until = 0.0
+
+def instance_name() -> str:
+    """Lease holder name of this process (read per call: worker processes may be forked after import)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def is_leader() -> bool:
+    """Whether this process holds the lease; needs no database access."""
+    if not Config.LEADER_ELECTION:
+        return True
+    return time.monotonic() < _valid_until
+
+def _create(holder: str, now: datetime.datetime, expires: datetime.datetime) -> bool:
+    if SchedulerLease.query.filter_by(name=LEASE_NAME).first() is not None:
+        return False
+    try:
+        with db.session.begin_nested():
+            db.session.add(SchedulerLease(name=LEASE_NAME, holder=holder, acquired_at=now, expires_at=expires))
+        return True
+    except IntegrityError:
+        # Another process created it first
+        return False
+
+def renew(on_acquire: Optional[Callable[[], None]] = None) -> bool:
+    """
+    Take the lease if it is free or expired, or extend it if this process holds it.
+
+    A process that cannot reach the database keeps acting as the leader only
+    until its last lease would have run out, so two leaders never overlap
+    while the clocks agree.
+
+    Args:
+        on_acquire: Called after this process became the leader
+
+    Returns:
+        True if this process is the leader
+    """
+    global _valid_until
+    if not Config.LEADER_ELECTION:
+        return True
+
+    was_leader = is_leader()
+    started = time.monotonic()
+    holder = instance_name()
+    now = datetime.datetime.utcnow()
+    expires = now + datetime.timedelta(seconds=Config.LEADER_LEASE_SECONDS)
+
+    try:
+        updated = db.session.execute(
+            db.update(SchedulerLease)
+            .where(
+                SchedulerLease.name == LEASE_NAME,
+                db.or_(SchedulerLease.holder == holder, SchedulerLease.expires_at < now)
+            )
+            .values(
+                holder=holder,
+                expires_at=expires,
+                acquired_at=db.case((SchedulerLease.holder == holder, SchedulerLease.acquired_at), else_=now)
+            )
+        ).rowcount
+        leader = bool(updated) or _create(holder, now, expires)
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Error renewing scheduler lease: {str(e)}")
+        db.session.rollback()
+        return is_leader()
+
+    _valid_until = started + Config.LEADER_LEASE_SECONDS if leader else 0.0
+
+    if leader and not was_leader:
+        logger.info(f"{holder} is now the scheduler leader")
+        if on_acquire is not None:
+            on_acquire()
+    elif was_leader and not leader:
+        logger.warning(f"{holder} lost the scheduler lease")
+    return leader
+
+def release() -> None:
+    """Give up the lease, so another process takes over at its next renewal instead of after expiry."""
+    global _valid_until
+    if not Config.LEADER_ELECTION or not is_leader():
+        return
+    _valid_until = 0.0
+    try:
+        SchedulerLease.query.filter_by(name=LEASE_NAME, holder=instance_name()).update(
+            {SchedulerLease.expires_at: datetime.datetime.utcnow()}, synchronize_session=False
+        )
+        db.session.commit()
+        logger.info(f"{instance_name()} released the scheduler lease")
+    except Exception as e:
+        logger.error(f"Error releasing scheduler lease: {str(e)}")
+        db.session.rollback()
+
+def leader_only(job: Callable) -> Callable:
+    """Decorate a scheduled job so it is skipped in processes that are not the leader."""
+    @functools.wraps(job)
+    def wrapper(*args, **kwargs):
+        if not is_leader():
+            return None
+        return job(*args, **kwargs)
+    return wrapper
@@ -7,47 +7,81 @@ document.addEventListener('DOMContentLoaded', function() {
     function updateApiStatus() {
         fetch('/api/status')
             .then(response => response.json())
-            .then(data => {
-                // Update EDS status
-                const edsStatusBadge = document.getElementById('eds-status');
-                if (edsStatusBadge) {
-                    const statusSpan = edsStatusBadge.querySelector('span');
-                    if (data.eds === 'Connected') {
-                        edsStatusBadge.className = 'badge rounded-pill bg-success';
-                        statusSpan.textContent = 'Connected';
-                    } else if (data.eds === 'Failed') {
-                        edsStatusBadge.className = 'badge rounded-pill bg-danger';
-                        statusSpan.textContent = 'Failed';
-                    } else {
-                        edsStatusBadge.className = 'badge rounded-pill bg-secondary';
-                        statusSpan.textContent = data.eds;
-                    }
-                }
-                
-                // Update Twilio status
-                const twilioStatusBadge = document.getElementById('twilio-status');
-                if (twilioStatusBadge) {
-                    const statusSpan = twilioStatusBadge.querySelector('span');
-                    if (data.twilio === 'Connected') {
-                        twilioStatusBadge.className = 'badge rounded-pill bg-success';
-                        statusSpan.textContent = 'Connected';
-                    } else if (data.twilio === 'Failed') {
-                        twilioStatusBadge.className = 'badge rounded-pill bg-danger';
-                        statusSpan.textContent = 'Failed';
-                    } else {
-                        twilioStatusBadge.className = 'badge rounded-pill bg-secondary';
-                        statusSpan.textContent = data.twilio;
-                    }
-                }
-            })
+            .then(showApiStatus)
             .catch(error => {
                 console.error('Error updating API status:', error);
             });
     }
     
-    // Set up periodic status updates
+    function showApiStatus(data) {
+        // Update EDS status
+        const edsStatusBadge = document.getElementById('eds-status');
+        if (edsStatusBadge) {
+            const statusSpan = edsStatusBadge.querySelector('span');
+            if (data.eds === 'Connected') {
+                edsStatusBadge.className = 'badge rounded-pill bg-success';
+                statusSpan.textContent = 'Connected';
+            } else if (data.eds === 'Failed') {
+                edsStatusBadge.className = 'badge rounded-pill bg-danger';
+                statusSpan.textContent = 'Failed';
+            } else {
+                edsStatusBadge.className = 'badge rounded-pill bg-secondary';
+                statusSpan.textContent = data.eds;
+            }
+        }
+        
+        // Update Twilio status
+        const twilioStatusBadge = document.getElementById('twilio-status');
+        if (twilioStatusBadge) {
+            const statusSpan = twilioStatusBadge.querySelector('span');
+            if (data.twilio === 'Connected') {
+                twilioStatusBadge.className = 'badge rounded-pill bg-success';
+                statusSpan.textContent = 'Connected';
+            } else if (data.twilio === 'Failed') {
+                twilioStatusBadge.className = 'badge rounded-pill bg-danger';
+                statusSpan.textContent = 'Failed';
+            } else {
+                twilioStatusBadge.className = 'badge rounded-pill bg-secondary';
+                statusSpan.textContent = data.twilio;
+            }
+        }
+    }
+    
+    // Live updates: the server pushes new alarms and status changes over
+    // /api/stream. Pages listen for 'alarm-stream:<event>' events on the
+    // document and only poll while the stream is down
+    // (window.alarmStreamConnected is false). Only pages that show live
+    // alarms open the stream (data-live-stream on <body>), since every open
+    // stream occupies a server thread.
+    window.alarmStreamConnected = false;
+    if (window.EventSource && document.body.dataset.liveStream === 'true') {
+        const stream = new EventSource('/api/stream');
+        stream.addEventListener('open', function() {
+            window.alarmStreamConnected = true;
+        });
+        stream.addEventListener('error', function() {
+            // The browser reconnects by itself; poll in the meantime
+            window.alarmStreamConnected = false;
+        });
+        ['alarms', 'status', 'cleared', 'resync'].forEach(eventName => {
+            stream.addEventListener(eventName, function(event) {
+                document.dispatchEvent(new CustomEvent(`alarm-stream:${eventName}`, {
+                    detail: JSON.parse(event.data)
+                }));
+            });
+        });
+    }
+    
+    document.addEventListener('alarm-stream:status', event => showApiStatus(event.detail));
+    document.addEventListener('alarm-stream:resync', updateApiStatus);
+    
+    // Set up periodic status updates, skipped while the stream is connected
     updateApiStatus();
-    setInterval(updateApiStatus, 60000); // Update every minute
+    setInterval(function() {
+        if (!window.alarmStreamConnected) {
+            updateApiStatus();
+        }
+    }, 60000); // Update every minute
     
     // Form validation for contact numbers
     const phoneInputs = document.querySelectorAll('input[type="tel"]');
@@ -0,0 +1,89 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Any
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class StatusMonitor:
+    """
+    Thread-safe, TTL-cached snapshot of the external API connection status.
+
+    A background job refreshes the snapshot on its own schedule and web routes
+    only read it, so page latency does not depend on the EDS or Twilio APIs.
+    Entries older than the TTL are reported as "Unknown" rather than trusted.
+    """
+
+    def __init__(self, ttl: float, on_change: Optional[Callable[[str, str], None]] = None):
+        self.ttl = ttl
+        self.on_change = on_change  # Called with (name, status) when a service's status changes
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+    def update(self, name: str, status: str) -> None:
+        """
+        Record the latest status for a service.
+
+        Args:
+            name: Service name, e.g. 'eds' or 'twilio'
+            status: "Connected", "Failed", "Error" or "Unknown"
+        """
+        with self._lock:
+            previous = self._entries.get(name, {}).get('status')
+            self._entries[name] = {'status': status, 'checked_at': time.time()}
+
+        if previous != status:
+            logger.info(f"{name} status changed: {previous} -> {status}")
+            if self.on_change:
+                self.on_change(name, status)
+
+    def get(self, name: str) -> str:
+        """Return the cached status for a service, or "Unknown" if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(name)
+
+        if not entry or time.time() - entry['checked_at'] > self.ttl:
+            return "Unknown"
+        return entry['status']
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return a copy of the current status of all services.
+
+        Returns:
+            Dict with one status per service plus the time of the oldest check
+        """
+        with self._lock:
+            entries = dict(self._entries)
+
+        now = time.time()
+        result: Dict[str, Any] = {'eds': 'Unknown', 'twilio': 'Unknown'}
+        oldest: Optional[float] = None
+        for name, entry in entries.items():
+            if now - entry['checked_at'] > self.ttl:
+                continue
+            result[name] = entry['status']
+            if oldest is None or entry['checked_at'] < oldest:
+                oldest = entry['checked_at']
+
+        result['checked_at'] = datetime.fromtimestamp(oldest).isoformat() if oldest else None
+        return result
+
+def probe(check, *args) -> str:
+    """
+    Run a connection check and map its outcome to a status string.
+
+    Args:
+        check: Connection check function returning True/False
+        *args: Arguments for the check
+
+    Returns:
+        "Connected", "Failed" or "Error"
+    """
+    try:
+        return "Connected" if check(*args) else "Failed"
+    except Exception as e:
+        logger.error(f"Connection probe failed: {str(e)}")
+        return "Error"
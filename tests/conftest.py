@@ -0,0 +1,26 @@
+"""
+Shared test setup: the tests run against a throwaway SQLite database.
+
+Importing app connects to DATABASE_URL and creates the schema, so the
+environment is set before any module of the application is imported.
+"""
+import os
+import tempfile
+
+_database_dir = tempfile.mkdtemp(prefix='eds-alarm-monitor-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_database_dir, 'test.db')}"
+os.environ['SCHEDULER_ENABLED'] = 'False'
+
+import pytest
+from app import app, db
+from models import AlarmEvent, AlarmStatsMinute, PollCursor
+
+@pytest.fixture
+def session():
+    """An application context over an empty alarm history, emptied again afterwards."""
+    with app.app_context():
+        yield db.session
+        db.session.rollback()
+        for model in (AlarmEvent, AlarmStatsMinute, PollCursor):
+            db.session.execute(db.delete(model))
+        db.session.commit()
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+import pytest
+import alarm_ingest
+from alarm_ingest import ingest_alarms
+from models import AlarmEvent, AlarmStatsMinute
+
+T0 = datetime(2026, 10, 1, 12, 0, 30)
+
+def make_alarm(alarm_id, timestamp=T0, severity='HIGH', status='ACTIVE', source='Server Room'):
+    return {
+        'id': alarm_id,
+        'description': f"Alarm {alarm_id}",
+        'source': source,
+        'timestamp': timestamp,
+        'severity': severity,
+        'status': status,
+        'raw_data': {'id': alarm_id},
+    }
+
+@pytest.fixture(params=['upsert', 'lookup'])
+def dedup(request, monkeypatch):
+    """Run a test with INSERT ... ON CONFLICT and with the key lookup used on other databases."""
+    if request.param == 'lookup':
+        monkeypatch.setattr(alarm_ingest, 'get_upsert_insert', lambda: None)
+    return request.param
+
+def stored_keys(session):
+    return sorted(session.query(AlarmEvent.alarm_id, AlarmEvent.event_time).all())
+
+def test_new_alarms_are_returned_with_their_row_id(session, dedup):
+    new_alarms = ingest_alarms([make_alarm('A1'), make_alarm('A2')])
+    session.commit()
+
+    assert [alarm['id'] for alarm in new_alarms] == ['A1', 'A2']
+    rows = {row.alarm_id: row.id for row in AlarmEvent.query}
+    assert [alarm['event_id'] for alarm in new_alarms] == [rows['A1'], rows['A2']]
+
+def test_duplicates_within_a_batch_are_stored_once(session, dedup):
+    new_alarms = ingest_alarms([make_alarm('A1'), make_alarm('A1', severity='LOW'), make_alarm('A2')])
+    session.commit()
+
+    assert [alarm['id'] for alarm in new_alarms] == ['A1', 'A2']
+    # The first occurrence wins
+    assert new_alarms[0]['severity'] == 'HIGH'
+    assert stored_keys(session) == [('A1', T0), ('A2', T0)]
+
+def test_alarms_already_stored_are_skipped(session, dedup):
+    ingest_alarms([make_alarm('A1'), make_alarm('A2')])
+    session.commit()
+
+    new_alarms = ingest_alarms([make_alarm('A2'), make_alarm('A3')])
+    session.commit()
+
+    assert [alarm['id'] for alarm in new_alarms] == ['A3']
+    assert len(stored_keys(session)) == 3
+
+def test_same_alarm_id_at_another_time_is_a_new_occurrence(session, dedup):
+    later = T0 + timedelta(minutes=5)
+    ingest_alarms([make_alarm('A1')])
+    new_alarms = ingest_alarms([make_alarm('A1', timestamp=later)])
+    session.commit()
+
+    assert [alarm['timestamp'] for alarm in new_alarms] == [later]
+    assert stored_keys(session) == [('A1', T0), ('A1', later)]
+
+def test_rollup_counts_only_new_alarms(session, dedup):
+    ingest_alarms([make_alarm('A1'), make_alarm('A2', severity='LOW'), make_alarm('A3', timestamp=T0 + timedelta(seconds=40))])
+    ingest_alarms([make_alarm('A1'), make_alarm('A2', severity='LOW'), make_alarm('A4')])
+    session.commit()
+
+    counts = {
+        (row.bucket, row.severity, row.status, row.source): row.count for row in AlarmStatsMinute.query
+    }
+    minute = T0.replace(second=0)
+    assert counts == {
+        (minute, 'HIGH', 'ACTIVE', 'Server Room'): 2,
+        (minute + timedelta(minutes=1), 'HIGH', 'ACTIVE', 'Server Room'): 1,
+        (minute, 'LOW', 'ACTIVE', 'Server Room'): 1,
+    }
+
+def test_empty_batch_stores_nothing(session, dedup):
+    assert ingest_alarms([]) == []
+    assert stored_keys(session) == []
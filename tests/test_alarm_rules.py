@@ -0,0 +1,168 @@
+import itertools
+import json
+import random
+import re
+import pytest
+import alarm_rules
+from alarm_rules import RuleMatcher, validate_rule
+from models import AlarmRule
+
+def make_rule(rule_id, **fields):
+    fields.setdefault('action', alarm_rules.ACTION_ALARM)
+    return AlarmRule(id=rule_id, name=f"Rule {rule_id}", position=rule_id, enabled=True, **fields)
+
+def event(**fields):
+    fields.setdefault('source', 'Server Room')
+    fields.setdefault('priority', 'LOW')
+    fields.setdefault('description', '')
+    return fields
+
+def matched(matcher, **fields):
+    result = matcher.match(event(**fields))
+    return result.rule_id if result else None
+
+def reference_match(rules, raw):
+    """Evaluate the rules one by one, as the hardcoded filter would."""
+    for rule in rules:
+        if rule.sources and str(raw.get('source', '')).lower() not in alarm_rules.split_values(rule.sources):
+            continue
+        if rule.priorities and str(raw.get('priority', '')).lower() not in alarm_rules.split_values(rule.priorities):
+            continue
+        if rule.type_pattern and not re.search(rule.type_pattern, str(raw.get('type', '')), re.IGNORECASE):
+            continue
+        if rule.description_pattern and not re.search(rule.description_pattern, str(raw.get('description', '')), re.IGNORECASE):
+            continue
+        metadata = alarm_rules.parse_metadata(rule.metadata_match)
+        if any(str(alarm_rules.metadata_value(raw, key)).lower() != value for key, value in metadata.items()):
+            continue
+        return rule.id
+    return None
+
+def test_first_matching_rule_wins():
+    matcher = RuleMatcher([
+        make_rule(1, priorities='CRITICAL'),
+        make_rule(2, description_pattern='pump'),
+        make_rule(3),
+    ])
+    assert matched(matcher, priority='CRITICAL', description='Pump failure') == 1
+    assert matched(matcher, description='Pump failure') == 2
+    assert matched(matcher, description='Door open') == 3
+
+def test_conditions_are_case_insensitive():
+    matcher = RuleMatcher([make_rule(1, sources='server room, Boiler', priorities='high', description_pattern='PUMP')])
+    assert matched(matcher, source='SERVER ROOM', priority='HIGH', description='pump') == 1
+    assert matched(matcher, source='boiler', priority='High', description='Pump') == 1
+    assert matched(matcher, source='Roof', priority='HIGH', description='pump') is None
+
+def test_no_match_and_ignore_rules_drop_events():
+    matcher = RuleMatcher([
+        make_rule(1, description_pattern='test', action=alarm_rules.ACTION_IGNORE),
+        make_rule(2, priorities='HIGH', severity='critical', notify=True),
+    ])
+    alarms = [
+        {'id': 'A1', 'severity': 'HIGH', 'raw_data': event(priority='HIGH', description='Test alarm')},
+        {'id': 'A2', 'severity': 'HIGH', 'raw_data': event(priority='HIGH', description='Pump failure')},
+        {'id': 'A3', 'severity': 'LOW', 'raw_data': event(priority='LOW', description='Pump failure')},
+    ]
+    kept = matcher.classify(alarms)
+    assert [(alarm['id'], alarm['severity'], alarm['notify']) for alarm in kept] == [('A2', 'CRITICAL', True)]
+
+def test_metadata_keys_are_looked_up_in_the_event_and_its_metadata():
+    matcher = RuleMatcher([
+        make_rule(1, metadata_match=json.dumps({'location': 'building a', 'status': 'ACTIVE'})),
+        make_rule(2, metadata_match=json.dumps({'metadata.type': 'System'})),
+    ])
+    metadata = {'location': 'Building A', 'system': 'Production', 'type': 'System'}
+    assert matched(matcher, status='ACTIVE', metadata=metadata) == 1
+    assert matched(matcher, status='CLEARED', metadata=metadata) == 2
+    assert matched(matcher, status='ACTIVE', type='Alarm', metadata={'location': 'Building B'}) is None
+    assert matched(matcher, status='ACTIVE', metadata=None) is None
+
+@pytest.mark.parametrize('pattern, message', [
+    ('(?i)pump', 'global flags'),
+    ('(?P<name>pump)', 'named groups'),
+    ('(pump', 'missing \\)'),
+])
+def test_patterns_that_cannot_be_combined_are_rejected(pattern, message):
+    with pytest.raises(ValueError, match=message):
+        validate_rule(make_rule(1, description_pattern=pattern))
+
+def test_scoped_flags_and_plain_groups_are_accepted():
+    validate_rule(make_rule(1, description_pattern='(?-i:PUMP)|(valve|gate)'), [make_rule(2, description_pattern='door')])
+
+def test_unknown_action_is_rejected():
+    with pytest.raises(ValueError, match='Unknown action'):
+        validate_rule(make_rule(1, action='ESCALATE'))
+
+def test_invalid_metadata_is_rejected():
+    with pytest.raises(ValueError, match='metadata'):
+        validate_rule(make_rule(1, metadata_match='["location"]'))
+
+def test_stored_rules_that_cannot_be_combined_are_checked_one_by_one():
+    # Saved before validation covered the combined regex: (?i) is only valid at its start
+    matcher = RuleMatcher([
+        make_rule(1, description_pattern='valve'),
+        make_rule(2, description_pattern='(?i)pump'),
+        make_rule(3, description_pattern='(?P<x>gate)'),
+        make_rule(4, description_pattern='(?P<x>door)'),
+    ])
+    assert matcher._descriptions.combined is None
+    assert matched(matcher, description='Valve stuck') == 1
+    assert matched(matcher, description='Pump failure') == 2
+    assert matched(matcher, description='gate open') == 3
+    assert matched(matcher, description='door open') == 4
+    assert matched(matcher, description='fire') is None
+
+def test_rules_that_do_not_compile_are_skipped():
+    matcher = RuleMatcher([make_rule(1, description_pattern='(pump'), make_rule(2)])
+    assert [result.rule_id for result in matcher.results] == [2]
+    assert matched(matcher, description='pump') == 2
+
+def test_prefilter_agrees_with_evaluating_every_rule():
+    rng = random.Random(7)
+    sources = ['Server Room', 'Boiler', 'Roof']
+    priorities = ['LOW', 'MEDIUM', 'HIGH', 'CRITICAL']
+    words = ['pump', 'valve', 'door', 'temperature', 'alarm', 'fault']
+    rules = []
+    for rule_id in range(1, 41):
+        fields = {}
+        if rng.random() < 0.3:
+            fields['sources'] = ','.join(rng.sample(sources, rng.randint(1, 2)))
+        if rng.random() < 0.4:
+            fields['priorities'] = ','.join(rng.sample(priorities, rng.randint(1, 2)))
+        if rng.random() < 0.5:
+            fields['description_pattern'] = '|'.join(rng.sample(words, rng.randint(1, 2)))
+        if rng.random() < 0.3:
+            fields['type_pattern'] = rng.choice(['^alarm$', 'event', 'alarm|fault'])
+        if rng.random() < 0.2:
+            fields['metadata_match'] = json.dumps({rng.choice(['location', 'metadata.system']): rng.choice(['A', 'B'])})
+        rules.append(make_rule(rule_id, **fields))
+    matcher = RuleMatcher(rules)
+
+    for description, event_type in itertools.product(
+        ['', 'Pump failure', 'Door open and valve stuck', 'Temperature high', 'ok'],
+        ['', 'alarm', 'event', 'Alarm fault'],
+    ):
+        for _ in range(20):
+            raw = event(
+                source=rng.choice(sources), priority=rng.choice(priorities), description=description, type=event_type,
+                metadata={'location': rng.choice(['A', 'B']), 'system': rng.choice(['a', 'b'])},
+            )
+            result = matcher.match(raw)
+            assert (result.rule_id if result else None) == reference_match(rules, raw), raw
+
+def test_get_matcher_recompiles_when_rules_change(session):
+    matcher = alarm_rules.get_matcher()
+    assert alarm_rules.get_matcher() is matcher
+
+    rule = AlarmRule(name='Pumps', position=1, description_pattern='pump', action=alarm_rules.ACTION_IGNORE)
+    session.add(rule)
+    session.commit()
+    try:
+        changed = alarm_rules.get_matcher()
+        assert changed is not matcher
+        assert changed.match(event(priority='HIGH', description='Pump failure')).action == alarm_rules.ACTION_IGNORE
+    finally:
+        session.delete(rule)
+        session.commit()
+        alarm_rules.invalidate()
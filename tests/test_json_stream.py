@@ -0,0 +1,74 @@
+import json
+import pytest
+from json_stream import iter_array_items
+
+DOCUMENT = json.dumps({
+    'total': 12.5,
+    'offset': -1e-7,
+    'events': [
+        {'id': 'A1', 'value': 1.25e10, 'tags': [3, -0.5, 'café ☃'], 'ok': True},
+        42,
+        1E+2,
+        0.001,
+        -7,
+        None,
+        'a "quoted" string',
+    ],
+    'more': {'nested': [1, 2]},
+}, ensure_ascii=False).encode('utf-8')
+EVENTS = json.loads(DOCUMENT)['events']
+
+def split_at(data, *offsets):
+    bounds = [0, *offsets, len(data)]
+    return [data[start:end] for start, end in zip(bounds, bounds[1:])]
+
+def test_whole_document():
+    assert list(iter_array_items([DOCUMENT], 'events')) == EVENTS
+
+def test_split_at_every_byte():
+    for offset in range(len(DOCUMENT) + 1):
+        assert list(iter_array_items(split_at(DOCUMENT, offset), 'events')) == EVENTS, offset
+
+def test_split_at_every_pair_of_bytes():
+    for first in range(len(DOCUMENT) + 1):
+        for second in range(first, len(DOCUMENT) + 1):
+            chunks = split_at(DOCUMENT, first, second)
+            assert list(iter_array_items(chunks, 'events')) == EVENTS, (first, second)
+
+def test_one_byte_at_a_time():
+    assert list(iter_array_items([DOCUMENT[i:i + 1] for i in range(len(DOCUMENT))], 'events')) == EVENTS
+
+@pytest.mark.parametrize('chunks, expected', [
+    ([b'{"total": 12.', b'5, "events": [1]}'], [1]),
+    ([b'{"events": [1e', b'3]}'], [1000.0]),
+    ([b'{"events": [1', b'2, -', b'3.5E', b'+', b'2, 7]}'], [12, -350.0, 7]),
+    ([b'{"events": [1.5e-3', b']}'], [0.0015]),
+    ([b'{"events": [12', b']}'], [12]),
+])
+def test_numbers_split_across_chunks(chunks, expected):
+    assert list(iter_array_items(chunks, 'events')) == expected
+
+def test_str_chunks():
+    assert list(iter_array_items(['{"events": [1, ', '"a"]}'], 'events')) == [1, 'a']
+
+@pytest.mark.parametrize('document', [b'{}', b'{"total": 0}', b'{"events": []}', b'{"events": {"a": 1}}'])
+def test_no_items(document):
+    assert list(iter_array_items([document], 'events')) == []
+
+@pytest.mark.parametrize('document', [
+    b'{"events": [1, 2',
+    b'{"events": [1.]}',
+    b'{"events": [{"id": "A1"',
+    b'[1, 2]',
+    b'',
+])
+def test_invalid_or_truncated_body(document):
+    with pytest.raises(ValueError):
+        list(iter_array_items(split_at(document, len(document) // 2), 'events'))
+
+def test_items_before_a_truncation_are_yielded():
+    items = iter_array_items([b'{"events": [1, 2, {"id": '], 'events')
+    assert next(items) == 1
+    assert next(items) == 2
+    with pytest.raises(ValueError):
+        next(items)
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+import poll_cursor
+from models import AlarmEvent
+
+T0 = datetime(2026, 10, 1, 12, 0, 0)
+T1 = T0 + timedelta(seconds=1)
+
+def event(alarm_id, timestamp):
+    return {'id': alarm_id, 'timestamp': timestamp}
+
+def poll(events, name=poll_cursor.EDS_EVENTS_CURSOR):
+    """One poll as check_alarms runs it: skip what was seen, then advance past the batch."""
+    start = poll_cursor.position(poll_cursor.get_cursor(name))
+    unseen = poll_cursor.filter_unseen(start, events)
+    poll_cursor.advance_cursor(events, name)
+    return [alarm['id'] for alarm in unseen]
+
+def test_new_cursor_starts_at_newest_stored_alarm(session):
+    for alarm_id, event_time in (('A1', T0), ('A2', T1), ('SYSTEM-EDS-OFFLINE', T1 + timedelta(hours=1))):
+        session.add(AlarmEvent(alarm_id=alarm_id, description='d', source='s', event_time=event_time,
+                               severity='HIGH', status='ACTIVE'))
+    session.commit()
+
+    cursor = poll_cursor.get_cursor()
+    assert cursor.last_timestamp == T1
+    assert poll_cursor.seen_ids(cursor) == set()
+
+def test_find_cursor_does_not_create_it(session):
+    assert poll_cursor.find_cursor('eds_backfill') is None
+    assert poll_cursor.find_cursor('eds_backfill') is None
+
+    poll_cursor.reset_cursor(T0, 'eds_backfill')
+    assert poll_cursor.find_cursor('eds_backfill').last_timestamp == T0
+
+def test_events_at_the_cursor_timestamp_are_returned_once(session):
+    # ts.from is inclusive: every poll returns the events at the cursor timestamp again
+    assert poll([event('A1', T0), event('A2', T0)]) == ['A1', 'A2']
+    assert poll([event('A1', T0), event('A2', T0), event('A3', T0)]) == ['A3']
+    assert poll([event('A1', T0), event('A2', T0), event('A3', T0), event('A4', T1)]) == ['A4']
+    assert poll([event('A4', T1)]) == []
+
+    cursor = poll_cursor.get_cursor()
+    assert cursor.last_timestamp == T1
+    assert poll_cursor.seen_ids(cursor) == {'A4'}
+
+def test_same_id_at_a_later_timestamp_is_not_skipped(session):
+    assert poll([event('A1', T0)]) == ['A1']
+    assert poll([event('A1', T0), event('A1', T1)]) == ['A1']
+
+def test_seen_ids_accumulate_at_an_equal_timestamp(session):
+    poll_cursor.advance_cursor([event('A1', T0)])
+    poll_cursor.advance_cursor([event('A2', T0)])
+    assert poll_cursor.seen_ids(poll_cursor.get_cursor()) == {'A1', 'A2'}
+
+def test_cursor_never_moves_back(session):
+    poll_cursor.advance_cursor([event('A2', T1)])
+    poll_cursor.advance_cursor([event('A1', T0)])
+    poll_cursor.advance_to(T0)
+
+    cursor = poll_cursor.get_cursor()
+    assert cursor.last_timestamp == T1
+    assert poll_cursor.seen_ids(cursor) == {'A2'}
+
+def test_advance_to_moves_forward_and_forgets_seen_ids(session):
+    poll_cursor.advance_cursor([event('A1', T0)])
+    poll_cursor.advance_to(T1)
+
+    cursor = poll_cursor.get_cursor()
+    assert cursor.last_timestamp == T1
+    assert poll_cursor.seen_ids(cursor) == set()
+
+def test_reset_cursor_rewinds(session):
+    poll_cursor.advance_cursor([event('A1', T1)])
+    poll_cursor.reset_cursor(T0)
+    assert poll([event('A1', T0)]) == ['A1']
+
+    poll_cursor.reset_cursor(None)
+    assert poll_cursor.filter_unseen(poll_cursor.position(poll_cursor.get_cursor()), [event('A1', T0)]) == [event('A1', T0)]
+
+def test_cursors_are_independent(session):
+    poll([event('A1', T1)])
+    assert poll([event('A1', T1)], 'eds_backfill') == ['A1']